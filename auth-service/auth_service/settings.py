@@ -5,9 +5,15 @@ Django settings for auth_service project.
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Repository root: packages shared with the other services (common/, tools/)
+REPO_DIR = BASE_DIR.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
 # SECURITY - LECTURE DEPUIS ENVIRONNEMENT
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-51n-i1obuyx^8!dex)y0%0)tfbi3@qy6(8*+pcs!49_#%y$5%0')
 DEBUG = os.environ.get('DEBUG', 'True') == 'True'
@@ -68,6 +74,8 @@ AUTH_USER_MODEL = 'comptes.Compte'
 
 # MIDDLEWARE
 MIDDLEWARE = [
+    'common.metrics.metrics_middleware',  # first: times the whole request
+    'common.profiling.profiling_middleware',  # profiles everything below
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -182,6 +190,11 @@ LOGIN_RATE_LIMIT = {
     'BLOCK_MINUTES': 15,
 }
 
+# ON-DEMAND PROFILER (see common/profiling.py) - empty token: disabled
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '30'))
+
 # CORS - Depuis variables d'environnement
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://localhost:8001').split(',')
 CORS_ALLOW_CREDENTIALS = True
@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView
 )
+from common.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,4 +13,7 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+
+    # Prometheus scrape endpoint (not routed by Traefik)
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,81 @@
+"""
+python manage.py bench [--save baseline.json] [--compare baseline.json]
+
+Micro-benchmarks of the auth-service hot paths (runner: tools/microbench.py),
+on a throwaway test database.
+"""
+import itertools
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from comptes.decorators import rate_limit_login
+from comptes.models import Compte
+from comptes.serializers import CustomTokenObtainPairSerializer
+from comptes.views import verify_token
+from tools import microbench
+
+suite = microbench.Suite()
+
+
+def client_addresses():
+    """A new client address per call: the throttles and the login limit count per IP"""
+    for n in itertools.count():
+        yield f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"
+
+
+@suite.case("verify_token")
+def bench_verify_token(options):
+    user = Compte.objects.create_user(email="bench@taxi.com", password="Bench123!", nom="Bench", prenom="Mark")
+    body = json.dumps({"token": str(CustomTokenObtainPairSerializer.get_token(user).access_token)})
+    factory = RequestFactory()
+
+    # A request body is read once: one request per call, built before timing
+    requests = iter([
+        factory.post("/accounts/api/verify/", body, content_type="application/json", REMOTE_ADDR=address)
+        for address in itertools.islice(client_addresses(), options["runs"] + options["runs"] // 10 + 1)
+    ])
+    return lambda: verify_token(next(requests))
+
+
+@suite.case("rate_limit_login")
+def bench_rate_limit_login(options):
+    cache.clear()
+    view = rate_limit_login(lambda request: HttpResponse())
+    request = RequestFactory().post("/accounts/api/login/")
+    addresses = client_addresses()
+
+    def call():
+        request.META["REMOTE_ADDR"] = next(addresses)
+        return view(request)
+    return call
+
+
+@suite.case("rate_limit_login.blocked")
+def bench_rate_limit_login_blocked(options):
+    cache.clear()
+    view = rate_limit_login(lambda request: HttpResponse())
+    request = RequestFactory().post("/accounts/api/login/", REMOTE_ADDR="10.255.255.255")
+    return lambda: view(request)
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks of the auth-service hot paths, with a stored baseline"
+
+    def add_arguments(self, parser):
+        microbench.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            regressions = microbench.execute(suite, options, self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
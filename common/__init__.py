@@ -0,0 +1,7 @@
+"""
+Modules shared by ride-service, auth-service and the matcher worker
+
+Imported as the `common` package: each service puts the repository root on
+sys.path first (ride_service/settings.py, auth_service/settings.py,
+matcher-worker/shared.py).
+"""
@@ -0,0 +1,558 @@
+"""
+In-process stand-in for RabbitMQ - the pika subset the workers and ride-service use
+
+Selected with RABBITMQ_URL=memory:// (or memory://<name>): connect(url)
+returns a BlockingConnection of this module instead of pika's, with the
+same methods, frames (pika.spec) and properties (pika.BasicProperties).
+Every connection of the process with the same URL shares one broker, so
+ride-service, the matcher and the notification consumer can run in one
+process - in threads, or pumped by hand with process_data_events().
+
+Supported:
+    default, direct, topic and fanout exchanges
+    durable / exclusive / server-named queues (durability is not kept)
+    basic_publish, basic_get, basic_consume, basic_ack / nack / reject,
+    basic_qos(prefetch_count), queue_purge
+    x-message-ttl + x-dead-letter-exchange / -routing-key (retry queues)
+    call_later / remove_timeout / add_callback_threadsafe
+    Broker.queue_stats(): the queue fields of the management API
+    (GET /api/queues) that queue_monitor.py reads
+
+Shared by ride-service (rides/rabbitmq.py) and the matcher worker: in one
+process both use this module's BROKERS.
+"""
+import collections
+import copy
+import heapq
+import itertools
+import threading
+import time
+
+import pika
+from pika import frame, spec
+from pika.exceptions import ChannelClosedByBroker
+
+MEMORY_SCHEME = "memory://"
+
+# URL -> Broker, shared by every connection of the process
+BROKERS = {}
+_BROKERS_LOCK = threading.Lock()
+
+
+def is_memory_url(url):
+    return bool(url) and url.startswith(MEMORY_SCHEME)
+
+
+def get_broker(url=MEMORY_SCHEME):
+    """Broker of a memory:// URL (created on first use)"""
+    name = url[len(MEMORY_SCHEME):].strip("/") or "default"
+    with _BROKERS_LOCK:
+        broker = BROKERS.get(name)
+        if broker is None:
+            broker = BROKERS[name] = Broker(name)
+        return broker
+
+
+def connect(url):
+    """BlockingConnection for a RabbitMQ URL: in-process broker for memory://, pika otherwise"""
+    if is_memory_url(url):
+        return BlockingConnection(get_broker(url))
+    return pika.BlockingConnection(pika.URLParameters(url))
+
+
+def topic_matches(binding_key, routing_key):
+    """AMQP topic match: '*' is exactly one word, '#' zero or more"""
+    return _match_words(binding_key.split("."), routing_key.split("."))
+
+
+def _match_words(pattern, words):
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == "#":
+        return any(_match_words(rest, words[i:]) for i in range(len(words) + 1))
+    return bool(words) and head in ("*", words[0]) and _match_words(rest, words[1:])
+
+
+class Message:
+    __slots__ = ("exchange", "routing_key", "body", "properties", "expires_at", "redelivered")
+
+    def __init__(self, exchange, routing_key, body, properties, expires_at=None):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.body = body
+        self.properties = properties
+        self.expires_at = expires_at
+        self.redelivered = False
+
+
+class Queue:
+    def __init__(self, name, arguments=None, owner=None):
+        arguments = arguments or {}
+        self.name = name
+        self.messages = collections.deque()
+        self.owner = owner
+        ttl = arguments.get("x-message-ttl")
+        self.ttl = None if ttl is None else ttl / 1000.0
+        # None = no dead-lettering ("" is the default exchange)
+        self.dead_letter_exchange = arguments.get("x-dead-letter-exchange")
+        self.dead_letter_routing_key = arguments.get("x-dead-letter-routing-key")
+        # Management API counters
+        self.published = 0
+        self.acked = 0
+        self.unacked = 0
+        self.consumers = 0
+
+
+class Broker:
+    """Exchanges, queues and bindings of one memory:// URL (thread-safe)"""
+
+    def __init__(self, name="default", clock=time.monotonic):
+        self.name = name
+        self._clock = clock
+        self._changed = threading.Condition()
+        self.queues = {}
+        # exchange -> type ("" = default exchange)
+        self.exchanges = {"": "direct"}
+        # exchange -> [(binding key, queue name)]
+        self.bindings = collections.defaultdict(list)
+        self._names = itertools.count(1)
+
+    # Topology
+
+    def declare_queue(self, name, arguments=None, owner=None, passive=False):
+        with self._changed:
+            if not name:
+                name = f"amq.gen-{self.name}-{next(self._names)}"
+            queue = self.queues.get(name)
+            if queue is None:
+                if passive:
+                    raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'")
+                queue = self.queues[name] = Queue(name, arguments, owner)
+            return queue.name, len(queue.messages)
+
+    def declare_exchange(self, name, exchange_type="direct"):
+        with self._changed:
+            self.exchanges.setdefault(name, exchange_type)
+
+    def bind(self, queue, exchange, routing_key):
+        with self._changed:
+            if exchange not in self.exchanges:
+                raise ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+            if queue not in self.queues:
+                raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+            binding = (routing_key, queue)
+            if binding not in self.bindings[exchange]:
+                self.bindings[exchange].append(binding)
+
+    def purge(self, queue):
+        with self._changed:
+            messages = self._queue(queue).messages
+            count = len(messages)
+            messages.clear()
+            return count
+
+    def delete_owned(self, owner):
+        """Drop the exclusive queues of a closed connection"""
+        with self._changed:
+            for name in [name for name, queue in self.queues.items() if queue.owner is owner]:
+                del self.queues[name]
+                for bindings in self.bindings.values():
+                    bindings[:] = [b for b in bindings if b[1] != name]
+
+    # Messages
+
+    def _route(self, exchange, routing_key):
+        if exchange == "":
+            return [routing_key] if routing_key in self.queues else []
+        exchange_type = self.exchanges.get(exchange)
+        if exchange_type is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+
+        queues = []
+        for key, queue in self.bindings[exchange]:
+            if (exchange_type == "fanout"
+                    or (exchange_type == "topic" and topic_matches(key, routing_key))
+                    or key == routing_key):
+                if queue not in queues:
+                    queues.append(queue)
+        return queues
+
+    def _enqueue(self, exchange, routing_key, body, properties):
+        now = self._clock()
+        for name in self._route(exchange, routing_key):
+            queue = self.queues[name]
+            expires_at = None if queue.ttl is None else now + queue.ttl
+            queue.messages.append(Message(exchange, routing_key, body, properties, expires_at))
+            queue.published += 1
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        with self._changed:
+            self._enqueue(exchange, routing_key, body, properties or pika.BasicProperties())
+            self._changed.notify_all()
+
+    def _dead_letter(self, queue, message, reason):
+        if queue.dead_letter_exchange is None:
+            return
+        properties = copy.copy(message.properties)
+        headers = dict(properties.headers or {})
+        headers["x-death"] = [{
+            "queue": queue.name,
+            "reason": reason,
+            "count": 1,
+            "exchange": message.exchange,
+            "routing-keys": [message.routing_key],
+        }] + list(headers.get("x-death") or [])
+        properties.headers = headers
+        routing_key = queue.dead_letter_routing_key or message.routing_key
+        self._enqueue(queue.dead_letter_exchange, routing_key, message.body, properties)
+
+    def _expire(self):
+        """Dead-letter the messages past their queue TTL; returns the next expiry time"""
+        now = self._clock()
+        next_expiry = None
+        for queue in list(self.queues.values()):
+            if queue.ttl is None:
+                continue
+            messages = queue.messages
+            while messages and messages[0].expires_at <= now:
+                self._dead_letter(queue, messages.popleft(), "expired")
+            if messages and (next_expiry is None or messages[0].expires_at < next_expiry):
+                next_expiry = messages[0].expires_at
+        return next_expiry
+
+    def _queue(self, name):
+        queue = self.queues.get(name)
+        if queue is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{name}'")
+        return queue
+
+    def get(self, queue):
+        """
+        Next message of a queue
+
+        Returns:
+            tuple: (Message or None, messages left)
+        """
+        with self._changed:
+            self._expire()
+            queue = self._queue(queue)
+            if not queue.messages:
+                return None, 0
+            queue.unacked += 1
+            return queue.messages.popleft(), len(queue.messages)
+
+    def ack(self, queue, count=1):
+        """Delivered messages acked (or delivered with auto_ack)"""
+        with self._changed:
+            if queue in self.queues:
+                self.queues[queue].unacked -= count
+                self.queues[queue].acked += count
+
+    def requeue(self, queue, message):
+        with self._changed:
+            if queue in self.queues:
+                message.redelivered = True
+                self.queues[queue].unacked -= 1
+                self.queues[queue].messages.appendleft(message)
+                self._changed.notify_all()
+
+    def reject(self, queue, message):
+        """Rejected without requeue: dead-lettered if the queue has a DLX"""
+        with self._changed:
+            if queue in self.queues:
+                self.queues[queue].unacked -= 1
+                self._dead_letter(self.queues[queue], message, "rejected")
+                self._changed.notify_all()
+
+    def add_consumer(self, queue, count=1):
+        with self._changed:
+            if queue in self.queues:
+                self.queues[queue].consumers += count
+
+    def wait(self, timeout):
+        """Block until something is published (or timeout); returns the next TTL expiry"""
+        with self._changed:
+            next_expiry = self._expire()
+            if next_expiry is not None:
+                timeout = max(0.0, min(timeout, next_expiry - self._clock()))
+            self._changed.wait(timeout)
+
+    def depth(self, queue):
+        with self._changed:
+            self._expire()
+            queue = self.queues.get(queue)
+            return len(queue.messages) if queue else 0
+
+    def notify(self):
+        """Wake up the connections waiting in process_data_events"""
+        with self._changed:
+            self._changed.notify_all()
+
+    def queue_stats(self):
+        """Queues as GET /api/queues/<vhost> of the management API returns them (subset)"""
+        with self._changed:
+            self._expire()
+            return [
+                {
+                    "name": queue.name,
+                    "messages": len(queue.messages) + queue.unacked,
+                    "messages_ready": len(queue.messages),
+                    "messages_unacknowledged": queue.unacked,
+                    "consumers": queue.consumers,
+                    "message_stats": {"publish": queue.published, "ack": queue.acked},
+                    # Like RabbitMQ: the timestamp property of the head message, if set
+                    "head_message_timestamp": (
+                        getattr(queue.messages[0].properties, "timestamp", None) if queue.messages else None
+                    ),
+                }
+                for queue in self.queues.values()
+            ]
+
+
+class Channel:
+    """pika BlockingChannel stand-in"""
+
+    def __init__(self, connection, channel_number):
+        self.connection = connection
+        self.channel_number = channel_number
+        self._broker = connection.broker
+        self._tags = itertools.count(1)
+        # delivery tag -> (queue, message)
+        self._unacked = {}
+        # consumer tag -> (queue, callback, auto_ack)
+        self._consumers = {}
+        self._consumer_tags = itertools.count(1)
+        self._prefetch = 0
+        self._consuming = False
+        self.is_open = True
+
+    @property
+    def is_closed(self):
+        return not self.is_open
+
+    def _frame(self, method):
+        return frame.Method(self.channel_number, method)
+
+    # Topology
+
+    def queue_declare(self, queue="", passive=False, durable=False, exclusive=False,
+                      auto_delete=False, arguments=None):
+        owner = self.connection if exclusive else None
+        name, count = self._broker.declare_queue(queue, arguments, owner, passive)
+        return self._frame(spec.Queue.DeclareOk(queue=name, message_count=count, consumer_count=0))
+
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False, durable=False,
+                         auto_delete=False, internal=False, arguments=None):
+        self._broker.declare_exchange(exchange, str(getattr(exchange_type, "value", exchange_type)))
+        return self._frame(spec.Exchange.DeclareOk())
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._broker.bind(queue, exchange, routing_key if routing_key is not None else queue)
+        return self._frame(spec.Queue.BindOk())
+
+    def queue_purge(self, queue):
+        return self._frame(spec.Queue.PurgeOk(message_count=self._broker.purge(queue)))
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._prefetch = prefetch_count
+
+    # Publish / get / ack
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._broker.publish(exchange, routing_key, body, properties)
+
+    def _delivery_tag(self, queue, message, auto_ack):
+        tag = next(self._tags)
+        if auto_ack:
+            self._broker.ack(queue)
+        else:
+            self._unacked[tag] = (queue, message)
+        return tag
+
+    def basic_get(self, queue, auto_ack=False):
+        message, left = self._broker.get(queue)
+        if message is None:
+            return None, None, None
+        method = spec.Basic.GetOk(
+            delivery_tag=self._delivery_tag(queue, message, auto_ack),
+            redelivered=message.redelivered,
+            exchange=message.exchange,
+            routing_key=message.routing_key,
+            message_count=left,
+        )
+        return method, message.properties, message.body
+
+    def _settle(self, delivery_tag, multiple):
+        if multiple:
+            tags = [tag for tag in self._unacked if delivery_tag == 0 or tag <= delivery_tag]
+        else:
+            tags = [delivery_tag] if delivery_tag in self._unacked else []
+        return [self._unacked.pop(tag) for tag in tags]
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        for queue, _ in self._settle(delivery_tag, multiple):
+            self._broker.ack(queue)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        for queue, message in reversed(self._settle(delivery_tag, multiple)):
+            if requeue:
+                self._broker.requeue(queue, message)
+            else:
+                self._broker.reject(queue, message)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag, requeue=requeue)
+
+    # Consume
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False,
+                      consumer_tag=None, arguments=None):
+        if queue not in self._broker.queues:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        consumer_tag = consumer_tag or f"ctag{self.channel_number}.{next(self._consumer_tags)}"
+        self._consumers[consumer_tag] = (queue, on_message_callback, auto_ack)
+        self._broker.add_consumer(queue)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        consumer = self._consumers.pop(consumer_tag, None)
+        if consumer:
+            self._broker.add_consumer(consumer[0], -1)
+
+    def _dispatch(self):
+        """Deliver what the consumers of this channel can take; returns the number delivered"""
+        delivered = 0
+        for consumer_tag, (queue, callback, auto_ack) in list(self._consumers.items()):
+            # Bounded by the depth now, so a callback re-publishing to its queue cannot spin
+            for _ in range(self._broker.depth(queue)):
+                if consumer_tag not in self._consumers or not self.is_open:
+                    break
+                if self._prefetch and len(self._unacked) >= self._prefetch:
+                    break
+                message, _ = self._broker.get(queue)
+                if message is None:
+                    break
+                method = spec.Basic.Deliver(
+                    consumer_tag=consumer_tag,
+                    delivery_tag=self._delivery_tag(queue, message, auto_ack),
+                    redelivered=message.redelivered,
+                    exchange=message.exchange,
+                    routing_key=message.routing_key,
+                )
+                callback(self, method, message.properties, message.body)
+                delivered += 1
+        return delivered
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and self.is_open:
+            self.connection.process_data_events(time_limit=1)
+
+    def stop_consuming(self, consumer_tag=None):
+        self._consuming = False
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        for queue, _, _ in self._consumers.values():
+            self._broker.add_consumer(queue, -1)
+        self._consumers.clear()
+        # Unacked messages go back to their queue, as on a broker
+        for queue, message in reversed(list(self._unacked.values())):
+            self._broker.requeue(queue, message)
+        self._unacked.clear()
+
+
+class BlockingConnection:
+    """pika BlockingConnection stand-in on an in-process Broker"""
+
+    def __init__(self, broker=None):
+        self.broker = broker or get_broker()
+        self._channels = []
+        self._numbers = itertools.count(1)
+        # (due, seq, callback) - call_later timers, run by process_data_events
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._cancelled = set()
+        self._threadsafe = collections.deque()
+        self.is_closed = False
+
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    def channel(self, channel_number=None):
+        channel = Channel(self, channel_number or next(self._numbers))
+        self._channels.append(channel)
+        return channel
+
+    # Timers
+
+    def call_later(self, delay, callback):
+        timer_id = next(self._timer_seq)
+        heapq.heappush(self._timers, (time.monotonic() + delay, timer_id, callback))
+        return timer_id
+
+    def remove_timeout(self, timeout_id):
+        self._cancelled.add(timeout_id)
+
+    def add_callback_threadsafe(self, callback):
+        self._threadsafe.append(callback)
+        self.broker.notify()
+
+    def _run_timers(self):
+        ran = 0
+        while self._threadsafe:
+            self._threadsafe.popleft()()
+            ran += 1
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, timer_id, callback = heapq.heappop(self._timers)
+            if timer_id in self._cancelled:
+                self._cancelled.discard(timer_id)
+                continue
+            callback()
+            ran += 1
+        return ran
+
+    # Event loop
+
+    def process_data_events(self, time_limit=0):
+        """
+        Run due timers and deliver queued messages to the consumers
+
+        time_limit: seconds to wait for something to do (0 = don't wait,
+        None = until at least one event was processed)
+        """
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        while True:
+            processed = self._run_timers()
+            for channel in list(self._channels):
+                processed += channel._dispatch()
+            if processed:
+                return
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return
+            timeout = 1.0 if deadline is None else deadline - now
+            if self._timers:
+                timeout = min(timeout, max(0.0, self._timers[0][0] - now))
+            self.broker.wait(timeout)
+
+    def sleep(self, duration):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            self.process_data_events(time_limit=deadline - time.monotonic())
+
+    def close(self):
+        if self.is_closed:
+            return
+        for channel in self._channels:
+            channel.close()
+        self.broker.delete_owned(self)
+        self.is_closed = True
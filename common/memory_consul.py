@@ -0,0 +1,171 @@
+"""
+In-process stand-in for the Consul HTTP API (agent + catalog + health)
+
+Selected with CONSUL_BACKEND=memory: consul_utils and consul_discovery send
+their requests to consul_http() - this registry - instead of requests, so a
+service registers, discovers and deregisters without a Consul agent.
+
+    PUT /v1/agent/service/register          service definition (JSON)
+    PUT /v1/agent/service/deregister/<id>
+    GET /v1/catalog/service/<name>
+    GET /v1/health/service/<name>[?passing=true]
+    GET /v1/status/leader
+
+CONSUL_MEMORY_SERVICES pre-registers the services another process would
+have registered ("auth-service=http://127.0.0.1:8000,..."). Health checks
+are not run: a service passes until set_passing(service_id, False).
+
+Shared by auth-service and ride-service (consul_utils, consul_discovery).
+"""
+import os
+import re
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+CONSUL_BACKEND = os.getenv('CONSUL_BACKEND', 'http')
+CONSUL_MEMORY_SERVICES = os.getenv('CONSUL_MEMORY_SERVICES', '')
+
+
+class ConsulResponse:
+    """requests.Response look-alike"""
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+        self.text = "" if data is None else str(data)
+
+    def json(self):
+        return self._data
+
+
+class MemoryConsul:
+    """Service registry answering the Consul endpoints used by the services"""
+
+    ROUTES = (
+        ('PUT', re.compile(r'^/v1/agent/service/register$'), '_register'),
+        ('PUT', re.compile(r'^/v1/agent/service/deregister/(?P<service_id>[^/]+)$'), '_deregister'),
+        ('GET', re.compile(r'^/v1/catalog/service/(?P<name>[^/]+)$'), '_catalog'),
+        ('GET', re.compile(r'^/v1/health/service/(?P<name>[^/]+)$'), '_health'),
+        ('GET', re.compile(r'^/v1/status/leader$'), '_leader'),
+    )
+
+    def __init__(self, services: str = ''):
+        self._lock = threading.Lock()
+        # service id -> definition, as sent to /v1/agent/service/register
+        self.services = {}
+        self.passing = {}
+        for entry in filter(None, (part.strip() for part in services.split(','))):
+            name, _, url = entry.partition('=')
+            address = urlsplit(url)
+            self.register({
+                'ID': f"{name}-{address.port}",
+                'Name': name,
+                'Address': address.hostname,
+                'Port': address.port,
+            })
+
+    def register(self, definition: dict):
+        with self._lock:
+            service_id = definition.get('ID') or definition['Name']
+            self.services[service_id] = dict(definition, ID=service_id)
+            self.passing[service_id] = True
+
+    def deregister(self, service_id: str):
+        with self._lock:
+            self.services.pop(service_id, None)
+            self.passing.pop(service_id, None)
+
+    def set_passing(self, service_id: str, passing: bool = True):
+        with self._lock:
+            if service_id in self.services:
+                self.passing[service_id] = passing
+
+    def _instances(self, name):
+        with self._lock:
+            return [
+                (definition, self.passing[service_id])
+                for service_id, definition in self.services.items()
+                if definition['Name'] == name
+            ]
+
+    # requests.get / requests.put stand-ins
+
+    def get(self, url, timeout=None, **kwargs):
+        return self._dispatch('GET', url, None)
+
+    def put(self, url, json=None, timeout=None, **kwargs):
+        return self._dispatch('PUT', url, json)
+
+    def _dispatch(self, method, url, body):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        for route_method, pattern, handler in self.ROUTES:
+            match = pattern.match(parts.path)
+            if match and route_method == method:
+                return getattr(self, handler)(body, query, **match.groupdict())
+        return ConsulResponse(404, None)
+
+    def _register(self, body, query):
+        if not body or not body.get('Name'):
+            return ConsulResponse(400, None)
+        self.register(body)
+        return ConsulResponse(200, None)
+
+    def _deregister(self, body, query, service_id):
+        self.deregister(service_id)
+        return ConsulResponse(200, None)
+
+    def _catalog(self, body, query, name):
+        return ConsulResponse(200, [
+            {
+                'Node': 'memory',
+                'Address': definition.get('Address') or '127.0.0.1',
+                'ServiceID': definition['ID'],
+                'ServiceName': definition['Name'],
+                'ServiceAddress': definition.get('Address', ''),
+                'ServicePort': definition.get('Port'),
+                'ServiceTags': definition.get('Tags', []),
+            }
+            for definition, _ in self._instances(name)
+        ])
+
+    def _health(self, body, query, name):
+        only_passing = query.get('passing', ['false'])[0].lower() in ('1', 'true')
+        return ConsulResponse(200, [
+            {
+                'Node': {'Node': 'memory', 'Address': definition.get('Address') or '127.0.0.1'},
+                'Service': {
+                    'ID': definition['ID'],
+                    'Service': definition['Name'],
+                    'Address': definition.get('Address', ''),
+                    'Port': definition.get('Port'),
+                    'Tags': definition.get('Tags', []),
+                },
+                'Checks': [{'Status': 'passing' if passing else 'critical'}],
+            }
+            for definition, passing in self._instances(name)
+            if passing or not only_passing
+        ])
+
+    def _leader(self, body, query):
+        return ConsulResponse(200, '127.0.0.1:8300')
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def consul_http():
+    """
+    HTTP client for the Consul API: the in-process registry with
+    CONSUL_BACKEND=memory, the requests module otherwise
+    """
+    global _registry
+    if CONSUL_BACKEND != 'memory':
+        return requests
+    with _registry_lock:
+        if _registry is None:
+            _registry = MemoryConsul(CONSUL_MEMORY_SERVICES)
+        return _registry
@@ -0,0 +1,104 @@
+"""
+Prometheus metrics of the service, served on GET /metrics
+
+metrics_middleware (first in MIDDLEWARE) records for every request its
+latency by view name, method and status, the requests in flight, and the
+SQL queries it ran and their total time.
+
+With gunicorn every worker process has its own metrics: set
+PROMETHEUS_MULTIPROC_DIR to an empty directory (wiped at each start) and
+/metrics aggregates all of them (prometheus_client multiprocess mode).
+
+Shared by ride-service and auth-service.
+"""
+import os
+import time
+
+from django.db import connection
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ["method", "view", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL queries per HTTP request",
+    ["view"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "SQL time per HTTP request",
+    ["view"],
+)
+
+
+class QueryTimer:
+    """connection.execute_wrapper counting the queries of one request and their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def view_name(request):
+    """
+    URL name of the view ("rides-accept"), bounded unlike the path
+    Requests answered by a middleware (401) were never resolved: resolve here
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "unmatched"
+    return match.view_name
+
+
+def metrics_middleware(get_response):
+    def middleware(request):
+        queries = QueryTimer()
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            with connection.execute_wrapper(queries):
+                response = get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+
+        view = view_name(request)
+        REQUEST_SECONDS.labels(request.method, view, response.status_code).observe(time.perf_counter() - start)
+        REQUEST_DB_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_SECONDS.labels(view).observe(queries.seconds)
+        return response
+
+    return middleware
+
+
+def metrics_view(request):
+    """GET /metrics - Prometheus text format"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
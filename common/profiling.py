@@ -0,0 +1,160 @@
+"""
+On-demand profiler: cProfile one request, in place, on any deployment
+
+A request carrying the PROFILE_TOKEN secret is run under cProfile:
+
+    curl -H "X-Profile: $PROFILE_TOKEN" .../api/rides/12/          # timings in Server-Timing
+    curl -H "X-Profile: $PROFILE_TOKEN" -H "X-Profile-Output: text" .../api/rides/12/
+    .../api/rides/12/?profile=<token>&profile_output=text          # same, from a browser
+
+Every profiled response gets a Server-Timing header splitting the request
+time into SQL (execute_wrapper, as metrics.py counts it), outbound HTTP
+(requests.Session.request: in ride-service, the auth-service verify call)
+and the rest:
+
+    Server-Timing: total;dur=41.2, sql;dur=6.3;desc="7 queries", http;dur=22.0;desc="1 calls", app;dur=12.9
+
+With output "text" the response body is replaced by that summary and the
+top PROFILE_TOP functions by cumulative time (original status in
+X-Profiled-Status). With PROFILE_DIR set the pstats dump is also written
+there (python -m pstats / snakeviz / flameprof read it) and named in
+X-Profile-File.
+
+PROFILE_TOKEN empty (default): the middleware removes itself
+(MiddlewareNotUsed), no cost at all. Set: one header lookup per request.
+One request is profiled at a time per process (a second one is served
+unprofiled, X-Profile: busy).
+
+Shared by ride-service and auth-service.
+"""
+import cProfile
+import hmac
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+
+from .metrics import QueryTimer, view_name
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_OUTPUT_HEADER = "X-Profile-Output"
+PROFILE_PARAM = "profile"
+PROFILE_OUTPUT_PARAM = "profile_output"
+
+# cProfile: one active profiler per process
+_profiling = threading.Lock()
+
+
+def outbound_http(stats):
+    """(seconds, calls) spent in requests.Session.request - every requests.get/post"""
+    seconds, calls = 0.0, 0
+    for (filename, _, function), (_, primitive_calls, _, cumulative, _) in stats.stats.items():
+        if function == "request" and filename.replace("\\", "/").endswith("requests/sessions.py"):
+            seconds += cumulative
+            calls += primitive_calls
+    return seconds, calls
+
+
+def wanted(request, token):
+    """Token of the header (or query parameter) matches PROFILE_TOKEN"""
+    value = request.headers.get(PROFILE_HEADER)
+    # Query string only parsed when it may carry the flag
+    if value is None and f"{PROFILE_PARAM}=" in request.META.get("QUERY_STRING", ""):
+        value = request.GET.get(PROFILE_PARAM)
+    return value is not None and hmac.compare_digest(value.encode(), token.encode())
+
+
+def output_format(request):
+    return request.headers.get(PROFILE_OUTPUT_HEADER) or request.GET.get(PROFILE_OUTPUT_PARAM, "")
+
+
+def profiling_middleware(get_response):
+    token = settings.PROFILE_TOKEN
+    if not token:
+        raise MiddlewareNotUsed
+
+    def middleware(request):
+        if not wanted(request, token):
+            return get_response(request)
+
+        if not _profiling.acquire(blocking=False):
+            response = get_response(request)
+            response[PROFILE_HEADER] = "busy"
+            return response
+
+        try:
+            return profile(request, get_response)
+        finally:
+            _profiling.release()
+
+    return middleware
+
+
+def profile(request, get_response):
+    profiler = cProfile.Profile()
+    queries = QueryTimer()
+    start = time.perf_counter()
+    with connection.execute_wrapper(queries):
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    total = time.perf_counter() - start
+
+    stats = pstats.Stats(profiler)
+    http_seconds, http_calls = outbound_http(stats)
+    app_seconds = max(0.0, total - queries.seconds - http_seconds)
+    view = view_name(request)
+
+    response["Server-Timing"] = (
+        f"total;dur={total * 1000:.1f}, "
+        f'sql;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries", '
+        f'http;dur={http_seconds * 1000:.1f};desc="{http_calls} calls", '
+        f"app;dur={app_seconds * 1000:.1f}"
+    )
+
+    filename = None
+    if settings.PROFILE_DIR:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        safe_view = re.sub(r"[^\w.-]", "_", view)
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{safe_view}-{total * 1000:.0f}ms.prof"
+        stats.dump_stats(os.path.join(settings.PROFILE_DIR, filename))
+        response["X-Profile-File"] = filename
+
+    logger.info(
+        "Profiled %s %s: %.1f ms, sql %.1f ms (%d queries), http %.1f ms (%d calls)%s",
+        request.method, view, total * 1000, queries.seconds * 1000, queries.count,
+        http_seconds * 1000, http_calls, f" -> {filename}" if filename else "",
+    )
+
+    if output_format(request) != "text":
+        return response
+
+    report = io.StringIO()
+    report.write(
+        f"{request.method} {request.path} -> {response.status_code} ({view})\n"
+        f"total {total * 1000:.1f} ms\n"
+        f"  sql   {queries.seconds * 1000:8.1f} ms  {queries.count} queries\n"
+        f"  http  {http_seconds * 1000:8.1f} ms  {http_calls} calls (requests)\n"
+        f"  app   {app_seconds * 1000:8.1f} ms\n\n"
+    )
+    stats.stream = report
+    stats.strip_dirs().sort_stats("cumulative").print_stats(settings.PROFILE_TOP)
+
+    text = HttpResponse(report.getvalue(), content_type="text/plain; charset=utf-8")
+    text["X-Profiled-Status"] = response.status_code
+    for header in ("Server-Timing", "X-Profile-File"):
+        if header in response:
+            text[header] = response[header]
+    return text
@@ -0,0 +1,196 @@
+"""
+Distributed tracing of a ride across HTTP and RabbitMQ
+
+A span is one timed operation (an HTTP request, a SQL query, a publish, a
+message callback). Spans of one ride share a trace id: the context travels
+in the W3C 'traceparent' header, of HTTP requests and of AMQP messages
+(BasicProperties.headers):
+
+    traceparent: 00-<trace id, 32 hex>-<parent span id, 16 hex>-01
+
+    with span("rabbitmq.publish", routing_key=key) as current:
+        properties.headers = inject({})              # producer
+    with span("on_ride_requested", parent=headers.get(TRACEPARENT)):
+        ...                                          # consumer
+
+TRACE_EXPORT selects where finished spans go:
+
+    (empty)         tracing off - span() and inject() do nothing
+    console         one line per span on stdout
+    <file>.ndjson   one JSON record per span, appended (several processes
+                    can share the file); read by matcher-worker/trace_report.py
+
+TRACE_SERVICE names the process in the records (defaults to the name the
+process passes to configure()).
+
+Shared by ride-service and the matcher worker.
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+TRACE_SERVICE = os.getenv("TRACE_SERVICE", "")
+
+TRACEPARENT = "traceparent"
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_lock = threading.Lock()
+_file = None
+
+
+class Span:
+    """One timed operation, exported when it ends"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "error")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class _NoSpan:
+    """What span() yields with tracing off"""
+
+    def set(self, **attributes):
+        pass
+
+    def traceparent(self):
+        return None
+
+
+NO_SPAN = _NoSpan()
+
+
+def configure(service, export=None):
+    """Name this process in the records; export overrides TRACE_EXPORT"""
+    global TRACE_SERVICE, TRACE_EXPORT
+    TRACE_SERVICE = TRACE_SERVICE or service
+    if export is not None:
+        TRACE_EXPORT = export
+
+
+def enabled():
+    return bool(TRACE_EXPORT)
+
+
+def parse_traceparent(value):
+    """(trace id, parent span id) of a traceparent header, None if malformed"""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+@contextlib.contextmanager
+def span(name, parent=None, **attributes):
+    """
+    Time the block as a span, child of parent (a traceparent received from
+    another process) or else of the current span; a new trace without either
+    """
+    if not TRACE_EXPORT:
+        yield NO_SPAN
+        return
+
+    remote = parse_traceparent(parent) if parent else None
+    local = _current.get()
+    if remote:
+        trace_id, parent_id = remote
+    elif local is not None:
+        trace_id, parent_id = local.trace_id, local.span_id
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    current = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        export(current, time.time())
+
+
+def inject(headers):
+    """Add the traceparent of the current span to a dict of HTTP / AMQP headers"""
+    current = _current.get()
+    if current is not None:
+        headers[TRACEPARENT] = current.traceparent()
+    return headers
+
+
+def amqp_traceparent(header_frame):
+    """traceparent of a consumed message (None without one)"""
+    headers = getattr(header_frame, "headers", None) or {}
+    value = headers.get(TRACEPARENT)
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def consumer(callback):
+    """Run a pika on_message_callback in a span continuing the producer's trace"""
+    @functools.wraps(callback)
+    def wrapper(channel, method_frame, header_frame, body):
+        with span(callback.__name__, parent=amqp_traceparent(header_frame), queue=method_frame.routing_key):
+            return callback(channel, method_frame, header_frame, body)
+    return wrapper
+
+
+# Exporters
+
+def export(finished, end):
+    record = {
+        "trace_id": finished.trace_id,
+        "span_id": finished.span_id,
+        "parent_id": finished.parent_id,
+        "service": TRACE_SERVICE,
+        "name": finished.name,
+        "start": finished.start,
+        "duration_ms": round((end - finished.start) * 1000, 3),
+        "attributes": finished.attributes,
+    }
+    if finished.error:
+        record["error"] = finished.error
+
+    if TRACE_EXPORT == "console":
+        attributes = " ".join(f"{key}={value}" for key, value in finished.attributes.items())
+        print(f" TRACE {finished.trace_id[:8]} {TRACE_SERVICE} {finished.name} "
+              f"{record['duration_ms']:.2f} ms {attributes}{' ERROR ' + finished.error if finished.error else ''}")
+        return
+
+    global _file
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if _file is None:
+            _file = open(TRACE_EXPORT, "a", buffering=1)
+        _file.write(line)
+
+
+def load(paths):
+    """Span records of NDJSON export files (incomplete last lines skipped)"""
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
@@ -0,0 +1,314 @@
+"""
+Concurrent load generator for the HTTP API (via Traefik or a service directly)
+
+Simulated users behave like the React dashboards:
+- passengers register + login, request a ride, then poll the ride list and
+  the ride status every --poll-interval (3s) and the notifications every
+  --notification-interval (5s) until the ride is completed or cancelled
+  (cancelled after --ride-timeout), think, and request the next one
+- drivers login (chauffeur accounts, see --driver-email), poll the ride list
+  every --poll-interval and accept (or reject, --reject-ratio) the rides
+  offered to them, then complete accepted rides after --trip-seconds
+
+Drivers are only offered rides if the matcher knows their user ids
+(DRIVERS_FILE / fake pool 101-105, see matcher-worker README).
+
+Reports, per endpoint: throughput, error rate (5xx, timeouts, connection
+errors), 4xx rate and latency percentiles. --out writes the same report as
+JSON for run-to-run comparison (--compare prints the deltas with a previous one).
+
+Usage:
+    pip install aiohttp
+    python load-test.py --passengers 50 --drivers 5 --duration 120
+    python load-test.py --auth-url http://localhost:8000 --ride-url http://localhost:8001 --out run.json
+    python load-test.py --duration 300 --out run2.json --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import aiohttp
+
+TRAEFIK_URL = "http://localhost:8080"
+PASSWORD = "LoadTest123!"
+
+# Ride status (rides.models.Ride)
+FINAL_STATUSES = ("completed", "cancelled")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Stats:
+    """Per-endpoint latencies and status codes"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.flows = Counter()
+        self.accept_seconds = []
+
+    def record(self, endpoint, status, seconds):
+        self.latencies[endpoint].append(seconds * 1000)
+        self.statuses[endpoint][status] += 1
+
+    def report(self, started_at, elapsed, config):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            statuses = self.statuses[endpoint]
+            requests = len(latencies)
+            errors = sum(n for code, n in statuses.items() if not isinstance(code, int) or code >= 500)
+            client_errors = sum(n for code, n in statuses.items() if isinstance(code, int) and 400 <= code < 500)
+            endpoints[endpoint] = {
+                "requests": requests,
+                "rps": requests / elapsed if elapsed else 0.0,
+                "error_rate": errors / requests,
+                "client_error_rate": client_errors / requests,
+                "statuses": {str(code): n for code, n in sorted(statuses.items(), key=str)},
+                "p50_ms": percentile(latencies, 0.50),
+                "p90_ms": percentile(latencies, 0.90),
+                "p99_ms": percentile(latencies, 0.99),
+                "max_ms": max(latencies),
+            }
+        return {
+            "config": config,
+            "started_at": started_at,
+            "duration_s": elapsed,
+            "endpoints": endpoints,
+            "flows": dict(self.flows),
+            "request_to_accept_s": {
+                "p50": percentile(self.accept_seconds, 0.50),
+                "p99": percentile(self.accept_seconds, 0.99),
+            },
+        }
+
+
+class Client:
+    """One simulated user: an aiohttp session + its bearer token"""
+
+    def __init__(self, session, stats, args):
+        self.session = session
+        self.stats = stats
+        self.args = args
+        self.token = None
+
+    async def call(self, method, base, path, endpoint=None, body=None):
+        """
+        Timed request; endpoint groups the paths with ids ("/api/rides/{id}/status/").
+        Returns (status, json or None); status is the exception name on failure
+        """
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        started = time.perf_counter()
+        try:
+            async with self.session.request(method, base + path, json=body, headers=headers) as response:
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, data = type(e).__name__, None
+        self.stats.record(f"{method} {endpoint or path}", status, time.perf_counter() - started)
+        return status, data
+
+
+class Passenger(Client):
+    async def run(self, deadline):
+        args = self.args
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@taxibook.test"
+        status, _ = await self.call("POST", args.auth_url, "/accounts/api/register/", body={
+            "email": email, "password": PASSWORD, "password2": PASSWORD, "nom": "Load", "prenom": "Test",
+        })
+        if status != 201:
+            return
+        status, data = await self.call("POST", args.auth_url, "/accounts/api/login/", body={
+            "email": email, "password": PASSWORD,
+        })
+        if status != 200:
+            return
+        self.token = data["tokens"]["access"]
+        since = datetime.now(timezone.utc).isoformat()
+
+        while time.monotonic() < deadline:
+            status, ride = await self.call("POST", args.ride_url, "/api/rides/", body={
+                "origin": f"{random.randint(1, 999)} Main St",
+                "destination": f"{random.randint(1, 999)} Oak Ave",
+            })
+            if status != 201:
+                await asyncio.sleep(args.poll_interval)
+                continue
+            self.stats.flows["rides_requested"] += 1
+            ride_id = ride["id"]
+            requested_at = time.monotonic()
+            accepted = False
+            next_notifications = time.monotonic()
+
+            while time.monotonic() < deadline:
+                await asyncio.sleep(args.poll_interval)
+                await self.call("GET", args.ride_url, "/api/rides/")
+                status, data = await self.call("GET", args.ride_url, f"/api/rides/{ride_id}/status/",
+                                               endpoint="/api/rides/{id}/status/")
+                if time.monotonic() >= next_notifications:
+                    next_notifications = time.monotonic() + args.notification_interval
+                    status_n, polled = await self.call("GET", args.ride_url, f"/api/notifications/poll/?since={quote(since)}",
+                                                       endpoint="/api/notifications/poll/")
+                    if status_n == 200 and polled.get("count"):
+                        since = polled["timestamp"]
+
+                ride_status = data["ride"]["status"] if status == 200 else None
+                if ride_status == "accepted" and not accepted:
+                    accepted = True
+                    self.stats.accept_seconds.append(time.monotonic() - requested_at)
+                if ride_status in FINAL_STATUSES:
+                    self.stats.flows[f"rides_{ride_status}"] += 1
+                    break
+                if not accepted and time.monotonic() - requested_at > args.ride_timeout:
+                    await self.call("POST", args.ride_url, f"/api/rides/{ride_id}/cancel/",
+                                    endpoint="/api/rides/{id}/cancel/", body={"reason": "load test timeout"})
+                    self.stats.flows["rides_timed_out"] += 1
+                    break
+
+            await asyncio.sleep(random.expovariate(1 / args.think_time) if args.think_time else 0)
+
+
+class Driver(Client):
+    def __init__(self, session, stats, args, email):
+        super().__init__(session, stats, args)
+        self.email = email
+        self.trips = {}
+
+    async def run(self, deadline):
+        args = self.args
+        status, data = await self.call("POST", args.auth_url, "/accounts/api/chauffeur/login/", body={
+            "email": self.email, "password": args.driver_password,
+        })
+        if status != 200:
+            self.stats.flows["driver_login_failed"] += 1
+            return
+        self.token = data["tokens"]["access"]
+
+        while time.monotonic() < deadline:
+            status, rides = await self.call("GET", args.ride_url, "/api/rides/")
+            for ride in rides if status == 200 and isinstance(rides, list) else []:
+                if ride.get("status") != "offered" or ride["id"] in self.trips:
+                    continue
+                if random.random() < args.reject_ratio:
+                    await self.call("POST", args.ride_url, f"/api/rides/{ride['id']}/reject/",
+                                    endpoint="/api/rides/{id}/reject/")
+                    self.stats.flows["offers_rejected"] += 1
+                    continue
+                status, _ = await self.call("POST", args.ride_url, f"/api/rides/{ride['id']}/accept/",
+                                            endpoint="/api/rides/{id}/accept/")
+                if status == 200:
+                    self.trips[ride["id"]] = asyncio.create_task(self.complete_later(ride["id"]))
+            await asyncio.sleep(args.poll_interval)
+
+        # Trips under way still end (before the session closes)
+        await asyncio.gather(*self.trips.values())
+
+    async def complete_later(self, ride_id):
+        await asyncio.sleep(self.args.trip_seconds)
+        await self.call("POST", self.args.ride_url, f"/api/rides/{ride_id}/complete/",
+                        endpoint="/api/rides/{id}/complete/")
+        self.trips.pop(ride_id, None)
+
+
+async def run(args):
+    stats = Stats()
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.max_connections)
+    started_at = datetime.now(timezone.utc).isoformat()
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        started = time.monotonic()
+        deadline = started + args.duration
+        users = [Driver(session, stats, args, args.driver_email.format(n))
+                 for n in range(args.driver_first, args.driver_first + args.drivers)]
+        users += [Passenger(session, stats, args) for _ in range(args.passengers)]
+
+        async def start(user, delay):
+            await asyncio.sleep(delay)
+            await user.run(deadline)
+
+        # Users start evenly over the ramp-up
+        ramp = args.ramp_up / max(1, len(users))
+        await asyncio.gather(*(start(user, i * ramp) for i, user in enumerate(users)))
+        elapsed = time.monotonic() - started
+
+    config = {key: value for key, value in vars(args).items() if key not in ("driver_password", "out", "compare")}
+    return stats.report(started_at, elapsed, config)
+
+
+def print_report(report, previous=None):
+    print("=" * 100)
+    print(f" LOAD TEST: {report['config']['passengers']} passengers, {report['config']['drivers']} drivers, "
+          f"{report['duration_s']:.0f} s")
+    print("=" * 100)
+    print(f"{'Endpoint':<40} {'req':>7} {'req/s':>7} {'err%':>6} {'4xx%':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for endpoint, m in report["endpoints"].items():
+        line = (f"{endpoint:<40} {m['requests']:>7} {m['rps']:>7.1f} {100 * m['error_rate']:>6.2f} "
+                f"{100 * m['client_error_rate']:>6.2f} {m['p50_ms']:>8.1f} {m['p90_ms']:>8.1f} {m['p99_ms']:>8.1f}")
+        before = (previous or {}).get("endpoints", {}).get(endpoint)
+        if before and before["p99_ms"]:
+            line += f"   p99 {100 * (m['p99_ms'] / before['p99_ms'] - 1):+.0f}%  req/s {m['rps'] - before['rps']:+.1f}"
+        print(line)
+    print()
+    print(" Flows: " + ", ".join(f"{name}={n}" for name, n in sorted(report["flows"].items())))
+    accept = report["request_to_accept_s"]
+    print(f" Request -> accepted: p50 {accept['p50']:.1f} s   p99 {accept['p99']:.1f} s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the taxi booking API")
+    parser.add_argument("--auth-url", default=TRAEFIK_URL, help="Auth service base URL (default: Traefik)")
+    parser.add_argument("--ride-url", default=TRAEFIK_URL, help="Ride service base URL (default: Traefik)")
+    parser.add_argument("--passengers", type=int, default=20)
+    parser.add_argument("--drivers", type=int, default=5)
+    parser.add_argument("--driver-email", default="driver{}@taxi.com",
+                        help="Chauffeur account emails, {} = 1..--drivers (from --driver-first)")
+    parser.add_argument("--driver-first", type=int, default=1)
+    parser.add_argument("--driver-password", default="SecurePass123!")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds to start every user")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="Ride polling, as the dashboards")
+    parser.add_argument("--notification-interval", type=float, default=5.0, help="Notification polling, as the bell")
+    parser.add_argument("--think-time", type=float, default=5.0, help="Mean seconds between a passenger's rides")
+    parser.add_argument("--ride-timeout", type=float, default=60.0, help="Cancel a ride not accepted after")
+    parser.add_argument("--trip-seconds", type=float, default=10.0, help="Accepted -> completed")
+    parser.add_argument("--reject-ratio", type=float, default=0.1, help="Share of offers drivers reject")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--out", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Previous JSON report to compare with")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(run(args))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Micro-benchmarks of the matcher hot paths, with a stored baseline
+
+Same runner and options as `python manage.py bench` in ride-service and
+auth-service (tools/microbench.py): --save writes a baseline, --compare fails
+(exit code 1) when a median grew by more than --threshold.
+
+Usage:
+    python bench_hotpaths.py --save baseline.json
+    python bench_hotpaths.py --drivers 2000 --compare baseline.json --threshold 0.1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import shared  # noqa: F401
+from tools import microbench
+
+# The matcher reads its configuration at import time
+os.environ.update(
+    MATCH_DELAY_SECONDS="0",
+    DRIVERS_FILE="",
+    DRIVER_STATS_FILE="",
+    MATCHER_SNAPSHOT_DIR="",
+    TRAFFIC_CAPTURE_DIR="",
+)
+
+CITY_CENTER = (48.8566, 2.3522)
+
+suite = microbench.Suite()
+
+
+def fill_driver_index(mw, drivers, seed):
+    """drivers idle drivers around the city center, no reservation"""
+    from driver_index import DriverIndex
+
+    rng = random.Random(seed)
+    mw.DRIVER_INDEX = DriverIndex()
+    mw.RESERVATIONS = mw.ReservationStore()
+    for driver_id in range(1, drivers + 1):
+        mw.DRIVER_INDEX.add(
+            driver_id,
+            lat=CITY_CENTER[0] + rng.uniform(-0.1, 0.1),
+            lng=CITY_CENTER[1] + rng.uniform(-0.1, 0.1),
+            rating=rng.uniform(3.5, 5.0),
+            acceptance_rate=rng.random(),
+            idle_since=time.time() - rng.uniform(0, 3600),
+        )
+
+
+def ride(ride_id=1):
+    return {"ride_id": ride_id, "origin": "Main St", "destination": "Oak Ave", "pickup": list(CITY_CENTER)}
+
+
+@suite.case("find_available_driver")
+def bench_find_available_driver(options):
+    with microbench.quiet():
+        import matcher_worker as mw
+    fill_driver_index(mw, options["drivers"], options["seed"])
+    return lambda: mw.find_available_driver(ride())
+
+
+@suite.case("find_available_drivers.k3")
+def bench_find_available_drivers(options):
+    with microbench.quiet():
+        import matcher_worker as mw
+    fill_driver_index(mw, options["drivers"], options["seed"])
+    return lambda: mw.find_available_drivers(ride(), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the matcher hot paths")
+    microbench.add_arguments(parser)
+    parser.add_argument("--drivers", type=int, default=500, help="Drivers in the pickup region")
+    parser.add_argument("--seed", type=int, default=42)
+    options = vars(parser.parse_args())
+
+    regressions = microbench.execute(suite, options)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Whole ride lifecycle in one process: ride-service + matcher + notification consumer
+
+No RabbitMQ, Consul or auth-service needed. ride-service publishes to the
+in-process broker (RABBITMQ_URL=memory://), the matcher and the notification
+consumer consume from it, Consul is the in-process registry
+(CONSUL_BACKEND=memory), the matcher reaches the internal API through
+Django's test client and bearer tokens "<role>:<id>" are verified by a
+stand-in. Everything else is the real code path:
+
+    passenger POST /api/rides/                -> ride.requested -> matcher -> ride.offer
+    driver    POST /api/rides/<id>/accept/    -> ride.accepted
+    driver    POST /api/rides/<id>/complete/  -> ride.completed
+
+The database is an in-memory SQLite one (--db for a file), migrated at start.
+
+Reported (wall time): each API call, one on_ride_requested, request -> offer
+(queue wait + matching) and completed rides per second.
+
+Usage:
+    python bench_lifecycle.py
+    python bench_lifecycle.py --rides 2000 --drivers 200 --concurrency 50 --k 3
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import shared  # noqa: F401
+
+RIDE_SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ride-service")
+BROKER_URL = "memory://lifecycle"
+
+# Stand-ins everywhere; read at import time by ride-service and the workers
+os.environ.update(
+    RABBITMQ_URL=BROKER_URL,
+    CONSUL_BACKEND="memory",
+    CONSUL_MEMORY_SERVICES="auth-service=http://127.0.0.1:8000",
+    DJANGO_SETTINGS_MODULE="ride_service.settings",
+    DB_ENGINE="django.db.backends.sqlite3",
+    MATCH_DELAY_SECONDS="0",
+    NOTIFICATION_DELAY_SECONDS="0",
+    DRIVERS_FILE="",
+    DRIVER_STATS_FILE="",
+    MATCHER_SNAPSHOT_DIR="",
+    TRAFFIC_CAPTURE_DIR="",
+)
+
+PASSENGER_ID_BASE = 100000
+
+
+class TestClientResponse:
+    """requests.Response look-alike over a Django test client response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.text = response.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class InternalAPI:
+    """requests stand-in for the matcher: the internal API served in-process"""
+
+    exceptions = requests.exceptions
+
+    def __init__(self, client):
+        self.client = client
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        response = self.client.post(urlsplit(url).path, data=json or {}, content_type="application/json",
+                                    headers=headers)
+        return TestClientResponse(response)
+
+
+class AuthService:
+    """requests stand-in for the auth middleware: token "<role>:<id>" is that user"""
+
+    exceptions = requests.exceptions
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        role, _, user_id = (json or {}).get("token", "").partition(":")
+        if role not in ("passenger", "driver") or not user_id.isdigit():
+            return _Response(401, {"detail": "invalid token"})
+        return _Response(200, {"id": int(user_id), "email": f"{role}{user_id}@example.com", "role": role})
+
+
+class _Response(TestClientResponse):
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.text = json.dumps(data)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Lifecycle:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+
+        self.api_ms = {"create": [], "accept": [], "complete": []}
+        self.match_ms = []
+        self.offer_ms = []
+        self.created_at = {}
+        self.completed = 0
+        self.conflicts = 0
+        self.in_flight = 0
+
+    # Setup
+
+    def _setup_ride_service(self):
+        os.environ["DB_NAME"] = self.args.db
+        sys.path.insert(0, os.path.abspath(RIDE_SERVICE_DIR))
+
+        import django
+        django.setup()
+        from django.core.management import call_command
+        from django.test import Client
+        call_command("migrate", verbosity=0)
+
+        import ride_service.auth_middleware
+        ride_service.auth_middleware.requests = AuthService()
+
+        self.client = Client()
+
+    def _setup_workers(self):
+        from common import memory_broker
+        import matcher_worker
+        import notification_consumer
+        from driver_index import DriverIndex
+
+        mw = self.mw = matcher_worker
+        mw.requests = InternalAPI(self.client)
+        mw.BROADCAST_OFFERS_K = self.args.k
+        mw.random.seed(self.args.seed)
+        mw.DRIVER_INDEX = DriverIndex()
+        for driver_id in range(1, self.args.drivers + 1):
+            mw.DRIVER_INDEX.add(driver_id, rating=self.rng.uniform(4.0, 5.0))
+        # TRACE_EXPORT set: both workers share tracing.py, ride-service has its own copy
+        mw.tracing.configure("workers")
+
+        self.matcher_connection = memory_broker.connect(BROKER_URL)
+        self.matcher_channel, self.scheduler = mw.setup_worker(self.matcher_connection)
+        self.notification_connection = memory_broker.connect(BROKER_URL)
+        notification_consumer.setup_worker(self.notification_connection)
+        self.driver_channel = memory_broker.connect(BROKER_URL).channel()
+
+    # Actors
+
+    def _call(self, name, path, token):
+        started = time.perf_counter()
+        response = self.client.post(path, data={} if name != "create" else {
+            "origin": f"{self.rng.randint(1, 999)} Main Street",
+            "destination": f"{self.rng.randint(1, 999)} Station Road",
+        }, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.api_ms[name].append((time.perf_counter() - started) * 1000)
+        return response
+
+    def _request_ride(self, passenger_id):
+        response = self._call("create", "/api/rides/", f"passenger:{passenger_id}")
+        if response.status_code != 201:
+            raise RuntimeError(f"create ride: {response.status_code} {response.content[:200]}")
+        self.created_at[response.json()["id"]] = time.perf_counter()
+        self.in_flight += 1
+
+    def _match(self):
+        """What the matcher loop does until its lanes are empty"""
+        def on_ride_requested(*args):
+            started = time.perf_counter()
+            self.mw.on_ride_requested(*args)
+            self.match_ms.append((time.perf_counter() - started) * 1000)
+
+        matched = 0
+        while self.scheduler.poll(self.matcher_channel, on_ride_requested):
+            self.matcher_connection.process_data_events(time_limit=0)
+            matched += 1
+        self.matcher_connection.process_data_events(time_limit=0)
+        self.notification_connection.process_data_events(time_limit=0)
+        return matched
+
+    def _answer_offers(self):
+        """Offered drivers accept at once (first one of a broadcast) and complete the ride"""
+        answered = 0
+        while True:
+            method, _, body = self.driver_channel.basic_get(queue="ride.offer", auto_ack=True)
+            if method is None:
+                return answered
+            offer = json.loads(body)
+            ride_id = offer["ride_id"]
+            if ride_id in self.created_at:
+                self.offer_ms.append((time.perf_counter() - self.created_at[ride_id]) * 1000)
+
+            for driver_id in offer.get("driver_ids") or [offer.get("driver_id")]:
+                token = f"driver:{driver_id}"
+                response = self._call("accept", f"/api/rides/{ride_id}/accept/", token)
+                if response.status_code != 200:
+                    self.conflicts += 1
+                    continue
+                if self._call("complete", f"/api/rides/{ride_id}/complete/", token).status_code == 200:
+                    # The matcher holds an accepted driver until the offer TTL;
+                    # here the trip is over at once, so the driver is free again
+                    self.mw.RESERVATIONS.release_driver(driver_id)
+                    self.completed += 1
+                    self.in_flight -= 1
+                    self.created_at.pop(ride_id, None)
+                break
+            answered += 1
+
+    # Run
+
+    def run(self):
+        logging.disable(logging.INFO)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            self._setup_ride_service()
+            self._setup_workers()
+
+            requested = 0
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            idle_since = None
+            while self.completed < requested or requested < self.args.rides:
+                while self.in_flight < self.args.concurrency and requested < self.args.rides:
+                    self._request_ride(PASSENGER_ID_BASE + requested)
+                    requested += 1
+
+                if self._match() + self._answer_offers():
+                    idle_since = None
+                    continue
+
+                # Nothing to do: wait for retry queues / offer timers
+                idle_since = idle_since or time.perf_counter()
+                if time.perf_counter() - idle_since > self.args.stall_seconds:
+                    break
+                self.matcher_connection.process_data_events(time_limit=0.01)
+
+            self.elapsed = time.perf_counter() - started
+            self.cpu = time.process_time() - cpu_started
+        logging.disable(logging.NOTSET)
+        return self.report(requested)
+
+    def report(self, requested):
+        metrics = {
+            "rides": requested,
+            "completed": self.completed,
+            "stalled": requested - self.completed,
+            "accept_conflicts": self.conflicts,
+            "seconds": self.elapsed,
+            "rides_per_s": self.completed / self.elapsed if self.elapsed else 0.0,
+            "cpu_ms_per_ride": 1000 * self.cpu / self.completed if self.completed else 0.0,
+            "match_ms_p50": percentile(self.match_ms, 0.50),
+            "match_ms_p99": percentile(self.match_ms, 0.99),
+            "request_to_offer_ms_p50": percentile(self.offer_ms, 0.50),
+            "request_to_offer_ms_p99": percentile(self.offer_ms, 0.99),
+        }
+        for name, values in self.api_ms.items():
+            metrics[f"{name}_ms_p50"] = percentile(values, 0.50)
+            metrics[f"{name}_ms_p99"] = percentile(values, 0.99)
+        return metrics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ride lifecycle benchmark, everything in one process")
+    parser.add_argument("--rides", type=int, default=500)
+    parser.add_argument("--drivers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="Rides in flight at once")
+    parser.add_argument("--k", type=int, default=1, help="Drivers per offer (BROADCAST_OFFERS_K)")
+    parser.add_argument("--db", default=":memory:", help="SQLite database file (default: in memory)")
+    parser.add_argument("--stall-seconds", type=float, default=10.0, help="Give up after this long without progress")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the metrics as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    metrics = Lifecycle(args).run()
+
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+
+    print(f"Rides:           {metrics['completed']}/{metrics['rides']} completed in {metrics['seconds']:.1f} s "
+          f"({metrics['rides_per_s']:.1f} rides/s), {metrics['accept_conflicts']} accept conflicts")
+    for name in ("create", "accept", "complete"):
+        print(f"{'POST ' + name + ':':<16} p50 {metrics[name + '_ms_p50']:.2f} ms   p99 {metrics[name + '_ms_p99']:.2f} ms")
+    print(f"Match:           p50 {metrics['match_ms_p50']:.2f} ms   p99 {metrics['match_ms_p99']:.2f} ms")
+    print(f"Request->offer:  p50 {metrics['request_to_offer_ms_p50']:.2f} ms   p99 {metrics['request_to_offer_ms_p99']:.2f} ms")
+    print(f"CPU per ride:    {metrics['cpu_ms_per_ride']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Driver scoring latency benchmark
+
+Scores N random candidates (location, rating, acceptance rate, idle time)
+against a pickup point and selects the top K, as find_available_drivers does.
+The target is well under 1 ms for a few hundred candidates.
+
+Usage:
+    python bench_scoring.py
+    python bench_scoring.py --candidates 100 300 1000 --k 3 --runs 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from scoring import DriverFeatures, top_k
+
+
+def build_table(rng, drivers, center=(48.8566, 2.3522), spread=0.1):
+    table = DriverFeatures(capacity=drivers)
+    for driver_id in range(drivers):
+        table.update(
+            driver_id,
+            lat=center[0] + rng.uniform(-spread, spread),
+            lng=center[1] + rng.uniform(-spread, spread),
+            rating=rng.uniform(3.5, 5.0),
+            acceptance_rate=rng.random(),
+            idle_since=time.time() - rng.uniform(0, 3600),
+        )
+    return table
+
+
+def run(table, candidates, k, runs, rng):
+    driver_ids = list(range(candidates))
+    ride = {"pickup": [48.8566, 2.3522]}
+    timings = []
+
+    for _ in range(runs):
+        rng.shuffle(driver_ids)
+        start = time.perf_counter()
+        top_k(table, driver_ids, ride, k)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized driver scoring latency")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[50, 200, 500, 1000])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    table = build_table(rng, max(args.candidates))
+
+    print(f"{'candidates':>10} {'median (us)':>12} {'p99 (us)':>10}")
+    for candidates in args.candidates:
+        median, p99 = run(table, candidates, args.k, args.runs, rng)
+        print(f"{candidates:>10} {median:>12.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Traffic capture - a tap on the consumers, written as compressed NDJSON
+
+With TRAFFIC_CAPTURE_DIR set, every message a worker consumes is appended
+to a gzip NDJSON file before it is processed:
+
+    matcher_worker.py        ride.requested (all lanes), ride.events (ride.offer, ...)
+    notification_consumer.py notifications
+
+    TRAFFIC_CAPTURE_DIR/
+        ride.requested-20260301-170000.ndjson.gz
+        ride.events-20260301-170000.ndjson.gz
+        notifications-20260301-170000.ndjson.gz
+
+One record per line:
+
+    {"t": 1772384400.12, "stream": "ride.requested",
+     "routing_key": "ride.requested.priority", "enqueued_at": 1772384399,
+     "headers": {...}, "body": "{\"ride_id\": 12, ...}"}
+
+Files rotate every TRAFFIC_CAPTURE_ROTATE_SECONDS and are flushed every
+TRAFFIC_CAPTURE_FLUSH_SECONDS, so a file being written can already be read
+(replay.py stops at its last complete record).
+"""
+import base64
+import glob
+import gzip
+import heapq
+import json
+import os
+import time
+import zlib
+
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "")
+TRAFFIC_CAPTURE_ROTATE_SECONDS = float(os.getenv("TRAFFIC_CAPTURE_ROTATE_SECONDS", "3600"))
+TRAFFIC_CAPTURE_FLUSH_SECONDS = float(os.getenv("TRAFFIC_CAPTURE_FLUSH_SECONDS", "5"))
+
+
+class TrafficCapture:
+    """
+    Append-only gzip NDJSON writer for one stream
+
+        capture = TrafficCapture("captures", "ride.requested")
+        capture.record(method_frame.routing_key, body, header_frame)
+        capture.close()
+    """
+
+    def __init__(self, directory, stream, rotate=TRAFFIC_CAPTURE_ROTATE_SECONDS,
+                 flush=TRAFFIC_CAPTURE_FLUSH_SECONDS, clock=time.time):
+        self.directory = directory
+        self.stream = stream
+        self.rotate = rotate
+        self.flush_interval = flush
+        self._clock = clock
+        self._file = None
+        self._opened_at = 0.0
+        self._flushed_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, now):
+        self.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+        path = os.path.join(self.directory, f"{self.stream}-{stamp}.ndjson.gz")
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._opened_at = self._flushed_at = now
+
+    def record(self, routing_key, body, properties=None):
+        """Append one consumed message"""
+        now = self._clock()
+        if self._file is None or now - self._opened_at >= self.rotate:
+            self._open(now)
+
+        entry = {
+            "t": now,
+            "stream": self.stream,
+            "routing_key": routing_key,
+            "enqueued_at": getattr(properties, "timestamp", None),
+            "headers": getattr(properties, "headers", None) or {},
+        }
+        if isinstance(body, bytes):
+            try:
+                entry["body"] = body.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["body_b64"] = base64.b64encode(body).decode("ascii")
+        else:
+            entry["body"] = body
+
+        # x-death and friends may hold values JSON does not know
+        self._file.write(json.dumps(entry, default=str) + "\n")
+
+        if now - self._flushed_at >= self.flush_interval:
+            self._file.flush()
+            self._flushed_at = now
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def capture_for(stream):
+    """TrafficCapture of the stream, or None when TRAFFIC_CAPTURE_DIR is not set"""
+    return TrafficCapture(TRAFFIC_CAPTURE_DIR, stream) if TRAFFIC_CAPTURE_DIR else None
+
+
+def record_body(record):
+    """Message body of a record, as bytes"""
+    if "body_b64" in record:
+        return base64.b64decode(record["body_b64"])
+    return record["body"].encode("utf-8")
+
+
+def _read_file(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Torn last line
+                    return
+    except (EOFError, zlib.error):
+        # File still being written: stop at the last flushed record
+        return
+
+
+def capture_files(paths):
+    """Capture files from file and directory arguments"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.ndjson.gz"))))
+        else:
+            files.append(path)
+    return files
+
+
+def read_records(paths):
+    """Records of every capture file, merged in time order"""
+    return heapq.merge(*(_read_file(path) for path in capture_files(paths)), key=lambda r: r["t"])
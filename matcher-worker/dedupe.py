@@ -0,0 +1,91 @@
+"""
+Idempotency layer for the matcher worker
+
+Remembers, per ride, the highest ride version already matched. A message
+whose (ride_id, version) is not newer is a redelivery or a stale re-publish
+and is dropped before any matching work or internal API call.
+
+Bounded in time (DEDUPE_TTL_SECONDS) and in size (DEDUPE_MAX_ENTRIES);
+all operations are O(1) amortized.
+"""
+import os
+import time
+from collections import OrderedDict
+
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", "3600"))
+DEDUPE_MAX_ENTRIES = int(os.getenv("DEDUPE_MAX_ENTRIES", "100000"))
+
+
+class DedupeStore:
+    """
+    ride_id -> (version, expires_at), ordered by last update
+
+    With a constant TTL the insertion order is also the expiry order,
+    so expired entries are always at the front.
+    """
+
+    def __init__(self, ttl=DEDUPE_TTL_SECONDS, max_entries=DEDUPE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            ride_id, (_, expires_at) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def seen(self, ride_id, version=0):
+        """True if this ride version (or a newer one) was already processed"""
+        entry = self._entries.get(ride_id)
+        if entry is None:
+            return False
+        processed_version, expires_at = entry
+        if expires_at <= self._clock():
+            return False
+        return version <= processed_version
+
+    def mark(self, ride_id, version=0):
+        """Record that a ride version has been processed"""
+        now = self._clock()
+        entry = self._entries.pop(ride_id, None)
+        if entry is not None and entry[1] > now:
+            version = max(version, entry[0])
+        self._entries[ride_id] = (version, now + self.ttl)
+        self._evict(now)
+
+    def dump(self):
+        """[(ride_id, version, seconds left)] in expiry order, for a snapshot"""
+        now = self._clock()
+        return [
+            (ride_id, version, expires_at - now)
+            for ride_id, (version, expires_at) in self._entries.items()
+            if expires_at > now
+        ]
+
+    def restore(self, entries):
+        """Reload dump() entries (must be in expiry order)"""
+        now = self._clock()
+        for ride_id, version, ttl in entries:
+            if ttl > 0:
+                self._entries[ride_id] = (version, now + ttl)
+        self._evict(now)
+
+
+class ClosedRides(DedupeStore):
+    """
+    Rides that were cancelled or accepted - never worth matching again
+    Same bounded TTL storage, with every version considered processed.
+    """
+
+    def add(self, ride_id):
+        self.mark(ride_id, float("inf"))
+
+    def __contains__(self, ride_id):
+        return self.seen(ride_id)
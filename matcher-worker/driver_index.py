@@ -0,0 +1,122 @@
+"""
+Driver index for the matcher worker
+Holds the drivers of the regions owned by this matcher instance only,
+so per-instance memory stays flat as the city grows.
+
+Drivers are loaded from DRIVERS_FILE (JSON list):
+    [{"id": 101, "region": "downtown"}, {"id": 102, "region": "uptown"}, ...]
+
+Optional scoring features per driver: "lat", "lng", "rating",
+"acceptance_rate" (kept in a columnar table, see scoring.py).
+
+Drivers without a region (or in the "default" region) form a shared
+fallback pool loaded by every instance.
+"""
+import json
+import os
+
+import numpy as np
+
+from sharding import DEFAULT_REGION, owns_region
+from scoring import DriverFeatures
+
+DRIVERS_FILE = os.getenv("DRIVERS_FILE", "")
+
+# Fake driver pool used when no DRIVERS_FILE is configured
+# In production: requests.get(f"{DRIVER_SERVICE_URL}/available")
+FAKE_DRIVER_POOL = [101, 102, 103, 104, 105]
+
+
+class DriverIndex:
+    """
+    Region -> driver ids, restricted to the regions this instance owns
+    Scoring features of the same drivers in `features`
+    """
+
+    def __init__(self):
+        self._by_region = {}
+        self.features = DriverFeatures()
+
+    def __len__(self):
+        return sum(len(drivers) for drivers in self._by_region.values())
+
+    def regions(self):
+        return list(self._by_region)
+
+    def add(self, driver_id, region=DEFAULT_REGION, **features):
+        drivers = self._by_region.setdefault(region or DEFAULT_REGION, [])
+        if driver_id not in drivers:
+            drivers.append(driver_id)
+        self.features.update(driver_id, **features)
+
+    def remove(self, driver_id, region=DEFAULT_REGION):
+        drivers = self._by_region.get(region or DEFAULT_REGION, [])
+        if driver_id in drivers:
+            drivers.remove(driver_id)
+
+    def candidates(self, region):
+        """
+        Drivers able to serve a pickup region
+        Falls back to the shared pool when the region has no drivers
+        """
+        drivers = self._by_region.get(region)
+        if drivers:
+            return list(drivers)
+        return list(self._by_region.get(DEFAULT_REGION, []))
+
+    def to_arrays(self):
+        """
+        Index as arrays for a snapshot: driver_ids + region code per driver,
+        region names in code order, plus the feature table ("features.*")
+        """
+        regions = list(self._by_region)
+        driver_ids = [d for region in regions for d in self._by_region[region]]
+        codes = [code for code, region in enumerate(regions) for _ in self._by_region[region]]
+
+        arrays = {
+            "driver_ids": np.array(driver_ids, dtype=np.int64),
+            "region_codes": np.array(codes, dtype=np.int32),
+        }
+        for name, array in self.features.to_arrays().items():
+            arrays[f"features.{name}"] = array
+        return arrays, regions
+
+    @classmethod
+    def from_arrays(cls, arrays, regions):
+        """Index from to_arrays() output (arrays may be memory-mapped)"""
+        index = cls()
+        for driver_id, code in zip(arrays["driver_ids"].tolist(), arrays["region_codes"].tolist()):
+            index._by_region.setdefault(regions[code], []).append(driver_id)
+        index.features = DriverFeatures.from_arrays({
+            name.split(".", 1)[1]: array
+            for name, array in arrays.items()
+            if name.startswith("features.")
+        })
+        return index
+
+    @classmethod
+    def load(cls, path=DRIVERS_FILE, owns=owns_region):
+        """
+        Build the index for this instance's slice of the city
+
+        Args:
+            path: JSON drivers file (empty -> fake driver pool)
+            owns: predicate telling whether a region belongs to this instance
+        """
+        index = cls()
+
+        if not path:
+            for driver_id in FAKE_DRIVER_POOL:
+                index.add(driver_id)
+            return index
+
+        with open(path, encoding="utf-8") as f:
+            drivers = json.load(f)
+
+        for driver in drivers:
+            region = " ".join(str(driver.get("region") or DEFAULT_REGION).lower().split())
+            if region == DEFAULT_REGION or owns(region):
+                features = {name: driver.get(name) for name in ("lat", "lng", "rating", "acceptance_rate")}
+                index.add(driver["id"], region, **features)
+
+        return index
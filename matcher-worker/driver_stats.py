@@ -0,0 +1,188 @@
+"""
+Streaming per-driver statistics for the matcher worker
+
+Fed by ride.offer / ride.accepted / ride.cancelled / ride.completed events,
+never recomputed from the Ride table. Every counter is exponentially
+decayed (half-life DRIVER_STATS_HALF_LIFE_SECONDS) so recent behaviour
+counts more than last month's:
+
+    acceptance_rate   = accepts / offers
+    cancellation_rate = cancels by the driver / accepts
+    rating            = decayed running mean of the ratings received
+
+Stored column-wise (one NumPy array per counter, one row per driver):
+O(1) update and lookup, 7 floats per driver. With DRIVER_STATS_FILE set
+the whole store is checkpointed to that .npz file and reloaded at startup
+(empty, the default: in memory only).
+"""
+import os
+import time
+
+import numpy as np
+
+DRIVER_STATS_FILE = os.getenv("DRIVER_STATS_FILE", "")
+DRIVER_STATS_HALF_LIFE_SECONDS = float(os.getenv("DRIVER_STATS_HALF_LIFE_SECONDS", str(7 * 24 * 3600)))
+DRIVER_STATS_CHECKPOINT_SECONDS = float(os.getenv("DRIVER_STATS_CHECKPOINT_SECONDS", "300"))
+# Decayed offers needed before the acceptance rate is trusted
+DRIVER_STATS_MIN_OFFERS = float(os.getenv("DRIVER_STATS_MIN_OFFERS", "3"))
+
+
+class DriverStats:
+    """
+    driver_id -> decayed counters
+
+        stats.record_offer(101)
+        stats.record_accept(101)
+        stats.acceptance_rate(101)   # 1.0
+    """
+
+    COUNTERS = ("offers", "accepts", "cancels", "completes", "rating_sum", "rating_count")
+
+    def __init__(self, half_life=DRIVER_STATS_HALF_LIFE_SECONDS, capacity=256, clock=time.time):
+        self.half_life = half_life
+        self._clock = clock
+        self._rows = {}
+        self.columns = {name: np.zeros(capacity) for name in self.COUNTERS}
+        self.updated_at = np.zeros(capacity)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def _grow(self, capacity):
+        for name, column in self.columns.items():
+            grown = np.zeros(capacity)
+            grown[:len(column)] = column
+            self.columns[name] = grown
+        grown = np.zeros(capacity)
+        grown[:len(self.updated_at)] = self.updated_at
+        self.updated_at = grown
+
+    def _row(self, driver_id, now):
+        """Row of the driver with its counters decayed up to now"""
+        row = self._rows.get(driver_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self.updated_at):
+                self._grow(len(self.updated_at) * 2)
+            self._rows[driver_id] = row
+            self.updated_at[row] = now
+            return row
+
+        elapsed = now - self.updated_at[row]
+        if elapsed > 0:
+            factor = 0.5 ** (elapsed / self.half_life)
+            for column in self.columns.values():
+                column[row] *= factor
+            self.updated_at[row] = now
+        return row
+
+    def _add(self, driver_id, **increments):
+        row = self._row(driver_id, self._clock())
+        for name, value in increments.items():
+            self.columns[name][row] += value
+
+    # Event handlers
+
+    def record_offer(self, driver_id):
+        self._add(driver_id, offers=1)
+
+    def record_accept(self, driver_id):
+        self._add(driver_id, accepts=1)
+
+    def record_withdrawn(self, driver_id):
+        """Broadcast offer lost to the first accept: not held against the driver"""
+        row = self._row(driver_id, self._clock())
+        offers = self.columns["offers"]
+        offers[row] = max(0.0, offers[row] - 1)
+
+    def record_cancel(self, driver_id):
+        """Ride cancelled by the driver"""
+        self._add(driver_id, cancels=1)
+
+    def record_complete(self, driver_id, rating=None):
+        if rating is None:
+            self._add(driver_id, completes=1)
+        else:
+            self._add(driver_id, completes=1, rating_sum=float(rating), rating_count=1)
+
+    # O(1) lookups - decay cancels out in every ratio, no need to decay on read
+
+    def _value(self, driver_id, name):
+        row = self._rows.get(driver_id)
+        return None if row is None else float(self.columns[name][row])
+
+    def acceptance_rate(self, driver_id):
+        """None until the driver got DRIVER_STATS_MIN_OFFERS (decayed) offers"""
+        offers = self._value(driver_id, "offers")
+        if offers is None or offers < DRIVER_STATS_MIN_OFFERS:
+            return None
+        return min(1.0, self._value(driver_id, "accepts") / offers)
+
+    def cancellation_rate(self, driver_id):
+        accepts = self._value(driver_id, "accepts")
+        if not accepts:
+            return None
+        return min(1.0, self._value(driver_id, "cancels") / accepts)
+
+    def rating(self, driver_id):
+        count = self._value(driver_id, "rating_count")
+        if not count:
+            return None
+        return self._value(driver_id, "rating_sum") / count
+
+    def features(self, driver_id):
+        """Scoring features derived from the stats (None = unknown)"""
+        return {
+            "acceptance_rate": self.acceptance_rate(driver_id),
+            "cancellation_rate": self.cancellation_rate(driver_id),
+            "rating": self.rating(driver_id),
+        }
+
+    # Checkpoint
+
+    def to_arrays(self):
+        """Every driver row as name -> array (driver_ids, updated_at, counters)"""
+        size = len(self._rows)
+        driver_ids = np.fromiter(self._rows, dtype=np.int64, count=size)
+        rows = np.fromiter(self._rows.values(), dtype=np.intp, count=size)
+
+        arrays = {name: column[rows] for name, column in self.columns.items()}
+        arrays.update(driver_ids=driver_ids, updated_at=self.updated_at[rows])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs):
+        """Store from to_arrays() output (arrays may be memory-mapped)"""
+        stats = cls(**kwargs)
+        driver_ids = arrays["driver_ids"]
+        size = len(driver_ids)
+        stats._grow(max(len(stats.updated_at), size * 2))
+        stats._rows = {int(driver_id): row for row, driver_id in enumerate(driver_ids)}
+        stats.updated_at[:size] = arrays["updated_at"]
+        for name in cls.COUNTERS:
+            stats.columns[name][:size] = arrays[name]
+        return stats
+
+    def save(self, path=DRIVER_STATS_FILE):
+        """Write every driver row to a .npz file (atomic replace), no-op without a path"""
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **self.to_arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DRIVER_STATS_FILE, **kwargs):
+        """Store from a checkpoint, or an empty one if there is none"""
+        if not path or not os.path.exists(path):
+            return cls(**kwargs)
+
+        with np.load(path) as data:
+            return cls.from_arrays(data, **kwargs)
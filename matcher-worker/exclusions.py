@@ -0,0 +1,79 @@
+"""
+Per-ride driver exclusion list
+Drivers who rejected (or let expire) an offer for a ride are never offered
+that ride again, so a rematch never bounces straight back to them.
+
+Fed by the 'excluded_drivers' field of ride.requested and by offer timeouts;
+bounded by EXCLUSION_TTL_SECONDS / EXCLUSION_MAX_RIDES like the dedupe store.
+"""
+import os
+import time
+from collections import OrderedDict
+
+EXCLUSION_TTL_SECONDS = float(os.getenv("EXCLUSION_TTL_SECONDS", "3600"))
+EXCLUSION_MAX_RIDES = int(os.getenv("EXCLUSION_MAX_RIDES", "100000"))
+
+
+class ExclusionStore:
+    """
+    ride_id -> (frozenset of driver ids, expires_at), ordered by last update
+    """
+
+    def __init__(self, ttl=EXCLUSION_TTL_SECONDS, max_rides=EXCLUSION_MAX_RIDES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_rides = max_rides
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            _, (_, expires_at) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_rides:
+                break
+            entries.popitem(last=False)
+
+    def get(self, ride_id):
+        """Drivers excluded for a ride (empty frozenset if none)"""
+        entry = self._entries.get(ride_id)
+        if entry is None or entry[1] <= self._clock():
+            return frozenset()
+        return entry[0]
+
+    def add(self, ride_id, *driver_ids):
+        """
+        Exclude drivers for a ride
+
+        Returns:
+            frozenset: All drivers now excluded for the ride
+        """
+        now = self._clock()
+        drivers = self.get(ride_id).union(d for d in driver_ids if d is not None)
+        self._entries.pop(ride_id, None)
+        self._entries[ride_id] = (drivers, now + self.ttl)
+        self._evict(now)
+        return drivers
+
+    def discard(self, ride_id):
+        """Forget a ride (accepted / cancelled)"""
+        self._entries.pop(ride_id, None)
+
+    def dump(self):
+        """[(ride_id, [driver ids], seconds left)] in expiry order, for a snapshot"""
+        now = self._clock()
+        return [
+            (ride_id, sorted(drivers), expires_at - now)
+            for ride_id, (drivers, expires_at) in self._entries.items()
+            if expires_at > now
+        ]
+
+    def restore(self, entries):
+        """Reload dump() entries (must be in expiry order)"""
+        now = self._clock()
+        for ride_id, drivers, ttl in entries:
+            if ttl > 0:
+                self._entries[ride_id] = (frozenset(drivers), now + ttl)
+        self._evict(now)
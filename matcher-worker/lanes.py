@@ -0,0 +1,101 @@
+"""
+Priority lanes for ride.requested
+
+Every ride.requested queue has a priority lane ('<queue>.priority') carrying
+rematches (reject, offer timeout) and retried requests, so a passenger who
+was already turned down - or kept waiting - is not queued behind fresh
+requests:
+
+    ride.requested.priority  <- rematches + retries      weight PRIORITY_LANE_WEIGHT
+    ride.requested           <- fresh requests            weight 1
+
+The matcher pulls with basic_get in weighted round robin: while both lanes
+have a backlog it serves PRIORITY_LANE_WEIGHT priority messages per fresh
+one, so fresh requests are never starved. Each pull also exports the lane
+depth (message_count), and the AMQP timestamp gives the wait time per lane.
+"""
+import os
+import time
+
+from metrics import LANE_DEPTH, LANE_WAIT_SECONDS
+from sharding import priority_lane
+
+PRIORITY_LANE_WEIGHT = max(1, int(os.getenv("PRIORITY_LANE_WEIGHT", "3")))
+# Wait before polling again when every lane is empty
+LANE_IDLE_SECONDS = float(os.getenv("LANE_IDLE_SECONDS", "0.2"))
+
+
+def lane_queues(queues):
+    """Every lane of the given ride.requested queues (priority lane first)"""
+    lanes = []
+    for queue in queues:
+        lanes.extend([priority_lane(queue), queue])
+    return lanes
+
+
+class LaneStats:
+    """
+    Per lane: depth (matcher_lane_depth gauge) and wait time of the served
+    messages (matcher_lane_wait_seconds histogram), see metrics.py
+    """
+
+    def __init__(self, lanes, clock=time.time):
+        self._clock = clock
+        self.depth = {lane: LANE_DEPTH.labels(lane) for lane in lanes}
+        self.wait = {lane: LANE_WAIT_SECONDS.labels(lane) for lane in lanes}
+        for gauge in self.depth.values():
+            gauge.set(0)
+
+    def record_depth(self, lane, depth):
+        self.depth[lane].set(depth)
+
+    def record_served(self, lane, enqueued_at):
+        """enqueued_at: AMQP timestamp (seconds) of the message, if set"""
+        if enqueued_at:
+            self.wait[lane].observe(max(0.0, self._clock() - enqueued_at))
+
+
+class LaneScheduler:
+    """
+    Weighted round robin over the lanes of the owned ride.requested queues
+
+        scheduler = LaneScheduler(owned_queues())
+        while True:
+            if not scheduler.poll(channel, on_ride_requested):
+                connection.process_data_events(time_limit=LANE_IDLE_SECONDS)
+    """
+
+    def __init__(self, queues, weight=PRIORITY_LANE_WEIGHT):
+        self.lanes = lane_queues(queues)
+        self.stats = LaneStats(self.lanes)
+        self._order = []
+        for queue in queues:
+            self._order.extend([priority_lane(queue)] * weight + [queue])
+        self._cursor = 0
+
+    def poll(self, channel, callback):
+        """
+        Deliver at most one message to callback(channel, method, properties, body)
+
+        Returns:
+            bool: True if a message was delivered, False if every lane is empty
+        """
+        empty = set()
+        for _ in range(len(self._order)):
+            lane = self._order[self._cursor]
+            self._cursor = (self._cursor + 1) % len(self._order)
+            if lane in empty:
+                continue
+
+            method_frame, header_frame, body = channel.basic_get(queue=lane, auto_ack=False)
+            if method_frame is None:
+                empty.add(lane)
+                self.stats.record_depth(lane, 0)
+                continue
+
+            self.stats.record_depth(lane, method_frame.message_count + 1)
+            self.stats.record_served(lane, getattr(header_frame, "timestamp", None))
+            callback(channel, method_frame, header_frame, body)
+            return True
+
+        return False
@@ -0,0 +1,75 @@
+"""
+Prometheus metrics of the workers
+
+With METRICS_PORT set, a worker serves its metrics on
+http://<host>:METRICS_PORT/metrics (prometheus_client HTTP server thread):
+
+    worker_messages_total{queue}                messages consumed, by routing key
+    worker_message_processing_seconds{queue}    callback duration
+    worker_message_retries_total{queue}         failed deliveries scheduled for a retry
+    worker_messages_dead_lettered_total{queue}  messages parked in the dead-letter queue
+    worker_message_waits_total{queue}           redeliveries delayed for lack of a free driver
+    matcher_lane_depth{lane}                    ride.requested lane depth, at each pull
+    matcher_lane_wait_seconds{lane}             time served messages waited in their lane
+
+Failed messages are never nacked (see retry.py): retries and dead-letters
+are the failure counts.
+"""
+import functools
+import os
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+
+MESSAGES = Counter(
+    "worker_messages_total", "Messages consumed",
+    ["queue"],
+)
+PROCESSING_SECONDS = Histogram(
+    "worker_message_processing_seconds", "Message callback duration",
+    ["queue"],
+)
+RETRIES = Counter(
+    "worker_message_retries_total", "Failed deliveries scheduled for a delayed retry",
+    ["queue"],
+)
+DEAD_LETTERED = Counter(
+    "worker_messages_dead_lettered_total", "Messages parked in the dead-letter queue",
+    ["queue"],
+)
+WAITS = Counter(
+    "worker_message_waits_total", "Redeliveries delayed because no driver was free (not failures)",
+    ["queue"],
+)
+LANE_DEPTH = Gauge(
+    "matcher_lane_depth", "Messages in a ride.requested lane, seen at the last pull",
+    ["lane"],
+)
+LANE_WAIT_SECONDS = Histogram(
+    "matcher_lane_wait_seconds", "Time from publish (AMQP timestamp) to the matcher pull",
+    ["lane"], buckets=(0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 600),
+)
+
+
+def start_metrics_server():
+    """Serve /metrics on METRICS_PORT (no-op when unset)"""
+    if not METRICS_PORT:
+        return
+    start_http_server(int(METRICS_PORT))
+    print(f" Metrics on :{METRICS_PORT}/metrics")
+
+
+def observe(callback):
+    """Count and time a pika on_message_callback by routing key"""
+    @functools.wraps(callback)
+    def wrapper(channel, method_frame, header_frame, body):
+        queue = method_frame.routing_key
+        MESSAGES.labels(queue).inc()
+        start = time.perf_counter()
+        try:
+            return callback(channel, method_frame, header_frame, body)
+        finally:
+            PROCESSING_SECONDS.labels(queue).observe(time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,195 @@
+"""
+Ride pooling for the matcher worker
+
+A ride requested with pool=true (pickup and drop-off coordinates known)
+waits up to POOL_WINDOW_SECONDS for a compatible ride before being matched
+alone. Two rides are compatible when:
+
+    - their pickups are at most POOL_PICKUP_RADIUS_KM apart
+    - they head the same way (bearings within POOL_MAX_BEARING_DEG)
+    - sharing the vehicle makes no trip more than POOL_MAX_DETOUR longer
+      than going direct (best of the 4 pickup / drop-off orders)
+
+Waiting rides are bucketed in a grid of POOL_CELL_KM cells keyed by pickup,
+so finding a partner only looks at the cells within the pickup radius
+instead of every waiting ride.
+"""
+import math
+import os
+import time
+
+POOL_WINDOW_SECONDS = float(os.getenv("POOL_WINDOW_SECONDS", "30"))
+POOL_CELL_KM = float(os.getenv("POOL_CELL_KM", "1.0"))
+POOL_PICKUP_RADIUS_KM = float(os.getenv("POOL_PICKUP_RADIUS_KM", "1.5"))
+POOL_MAX_BEARING_DEG = float(os.getenv("POOL_MAX_BEARING_DEG", "30"))
+# 0.4 = a passenger's trip may be at most 40% longer than the direct one
+POOL_MAX_DETOUR = float(os.getenv("POOL_MAX_DETOUR", "0.4"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(a, b):
+    """Haversine distance between two [lat, lng] points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def bearing_deg(a, b):
+    """Initial bearing from a to b, 0..360 degrees (0 = north)"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    x = math.sin(lng2 - lng1) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(lng2 - lng1)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def can_pool(ride_data):
+    """Ride opted in and has the coordinates pooling needs"""
+    return bool(ride_data.get('pool') and ride_data.get('pickup') and ride_data.get('dropoff'))
+
+
+class PoolRequest:
+    """A pool ride waiting for a partner (message kept unacked meanwhile)"""
+
+    def __init__(self, ride_data, message, requested_at):
+        self.ride_id = ride_data['ride_id']
+        self.ride = ride_data
+        self.message = message
+        self.requested_at = requested_at
+        self.pickup = ride_data['pickup']
+        self.dropoff = ride_data['dropoff']
+        self.direct_km = distance_km(self.pickup, self.dropoff)
+        self.bearing = bearing_deg(self.pickup, self.dropoff)
+
+
+def shared_route(first, second, max_detour=POOL_MAX_DETOUR):
+    """
+    Best shared route for two requests, or None if every order makes a
+    passenger's trip more than max_detour longer than going direct
+
+    Returns:
+        tuple: (total km, requests in pickup order)
+    """
+    best = None
+    for a, b in ((first, second), (second, first)):
+        pickups = distance_km(a.pickup, b.pickup)
+        to_a_drop = distance_km(b.pickup, a.dropoff)
+        to_b_drop = distance_km(b.pickup, b.dropoff)
+        between_drops = distance_km(a.dropoff, b.dropoff)
+        # (km ridden by a, km ridden by b, route km) with a picked up first:
+        # a dropped first (a -> b -> a' -> b'), then b dropped first (a -> b -> b' -> a')
+        orders = (
+            (pickups + to_a_drop, to_a_drop + between_drops, pickups + to_a_drop + between_drops),
+            (pickups + to_b_drop + between_drops, to_b_drop, pickups + to_b_drop + between_drops),
+        )
+        for a_km, b_km, total in orders:
+            if a_km > a.direct_km * (1 + max_detour) or b_km > b.direct_km * (1 + max_detour):
+                continue
+            if best is None or total < best[0]:
+                best = (total, [a, b])
+    return best
+
+
+class PoolIndex:
+    """
+    Waiting pool requests, bucketed by pickup grid cell
+
+        pool = PoolIndex()
+        match = pool.find_partner(request)   # (partner, pickup order) or None
+        if match is None:
+            pool.add(request)
+        ...
+        for request in pool.expire(): ...    # waited POOL_WINDOW_SECONDS
+    """
+
+    def __init__(self, window=POOL_WINDOW_SECONDS, cell_km=POOL_CELL_KM,
+                 radius_km=POOL_PICKUP_RADIUS_KM, max_bearing=POOL_MAX_BEARING_DEG,
+                 max_detour=POOL_MAX_DETOUR, clock=time.time):
+        self.window = window
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.radius_km = radius_km
+        self.max_bearing = max_bearing
+        self.max_detour = max_detour
+        self._clock = clock
+        self._cells = {}
+        # ride_id -> request, in arrival order (oldest first) for expiry
+        self._waiting = {}
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def __contains__(self, ride_id):
+        return ride_id in self._waiting
+
+    def request(self, ride_data, message=None):
+        """New PoolRequest stamped with the index clock"""
+        return PoolRequest(ride_data, message, self._clock())
+
+    def _cell(self, point):
+        return (math.floor(point[0] / self.cell_deg), math.floor(point[1] / self.cell_deg))
+
+    def add(self, request):
+        self.remove(request.ride_id)
+        self._waiting[request.ride_id] = request
+        self._cells.setdefault(self._cell(request.pickup), {})[request.ride_id] = request
+
+    def remove(self, ride_id):
+        """Stop waiting for a partner (returns the request, or None)"""
+        request = self._waiting.pop(ride_id, None)
+        if request is not None:
+            cell = self._cell(request.pickup)
+            bucket = self._cells[cell]
+            del bucket[ride_id]
+            if not bucket:
+                del self._cells[cell]
+        return request
+
+    def _nearby(self, point):
+        """Waiting requests in the cells within radius_km of the point"""
+        lat_cells = math.ceil(self.radius_km / (self.cell_deg * KM_PER_DEGREE))
+        # A degree of longitude shrinks with the latitude
+        lng_km = self.cell_deg * KM_PER_DEGREE * max(math.cos(math.radians(point[0])), 0.01)
+        lng_cells = math.ceil(self.radius_km / lng_km)
+
+        row, col = self._cell(point)
+        for d_row in range(-lat_cells, lat_cells + 1):
+            for d_col in range(-lng_cells, lng_cells + 1):
+                yield from self._cells.get((row + d_row, col + d_col), {}).values()
+
+    def find_partner(self, request):
+        """
+        Best compatible waiting request (shortest shared route)
+
+        Returns:
+            tuple: (partner, requests in pickup order) or None
+        """
+        now = self._clock()
+        best = None
+        for other in self._nearby(request.pickup):
+            if other.ride_id == request.ride_id or now - other.requested_at > self.window:
+                continue
+            if distance_km(request.pickup, other.pickup) > self.radius_km:
+                continue
+            angle = abs(request.bearing - other.bearing) % 360
+            if min(angle, 360 - angle) > self.max_bearing:
+                continue
+
+            route = shared_route(other, request, self.max_detour)
+            if route is not None and (best is None or route[0] < best[0]):
+                best = (route[0], other, route[1])
+
+        return None if best is None else (best[1], best[2])
+
+    def expire(self):
+        """Remove and return the requests that waited the whole window"""
+        now = self._clock()
+        expired = []
+        for request in self._waiting.values():
+            if now - request.requested_at < self.window:
+                break
+            expired.append(request)
+        for request in expired:
+            self.remove(request.ride_id)
+        return expired
@@ -0,0 +1,353 @@
+"""
+Replay captured traffic (capture.py) through the matcher and the notification consumer
+
+Records of every capture file are fed to the real callbacks in capture
+order, against the in-process stand-ins of simulate.py (SimChannel,
+SimRideService):
+
+    ride.requested   matcher_worker.on_ride_requested (through the channel, so
+                     retries and rematches of the replayed matcher follow)
+    ride.events      matcher_worker.on_ride_event for accepted / cancelled /
+                     completed; captured ride.offer events are not fed back,
+                     they are the reference the replayed offers are compared to
+    notifications    notification_consumer.on_notification_message
+
+--speed paces the records: 1 = as captured, 10 = ten times faster,
+max = as fast as the callbacks return. The matcher stores run on the
+capture clock, so offer expiry and pool windows behave the same at any
+speed; at 1x / 10x the schedule lag tells whether the consumers keep up
+with the traced peak.
+
+Drivers are the ones seen in the capture (offers, accepts, completions),
+in the region of their rides; --drivers-file adds a DRIVERS_FILE export
+with positions and ratings.
+
+Usage:
+    python replay.py captures/ --speed 10
+    python replay.py captures/ride.requested-*.ndjson.gz --speed max --json
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import time
+
+from capture import read_records, record_body
+from simulate import SimChannel, SimMethod, SimRideService, VirtualClock, install_stores, percentile
+
+# Notification delivery is a stand-in too, unless a delay is asked for
+os.environ.setdefault("NOTIFICATION_DELAY_SECONDS", "0")
+
+STREAMS = ("ride.requested", "ride.events", "notifications")
+FED_EVENTS = ("ride.accepted", "ride.cancelled", "ride.completed")
+
+
+def parse_speed(value):
+    """Replay speed factor, None for max"""
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be > 0 or 'max'")
+    return speed
+
+
+class Replay:
+    def __init__(self, args):
+        self.args = args
+        self.clock = VirtualClock()
+        self._events = []
+        self._seq = itertools.count()
+
+        self.channel = SimChannel(self)
+        self.service = SimRideService(self)
+        # ride_id -> last ride.requested body seen (rebuilds rematch messages)
+        self.messages = {}
+
+        self.latency = {stream: [] for stream in STREAMS}
+        self.counts = dict.fromkeys(STREAMS, 0)
+        self.lag = []
+        self.cpu = 0.0
+        self.consumer_wall = 0.0
+        # ride_id -> drivers of the last offer, replayed and captured
+        self.offers = 0
+        self.replayed_offers = {}
+        self.captured_offers = {}
+
+    # Event loop (what simulate.Simulation does, plus the capture records)
+
+    def at(self, t, func, *args):
+        heapq.heappush(self._events, (t, next(self._seq), func, args))
+
+    def run(self):
+        records = read_records(self.args.files)
+        record = next(records, None)
+        if record is None:
+            raise SystemExit("No capture records found")
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            import matcher_worker
+            import notification_consumer
+            self.mw = matcher_worker
+            self.nc = notification_consumer
+
+            self.clock.t = self.first_t = record["t"]
+            self._setup_matcher()
+            self.at(self.clock.t, self._tick_timers)
+
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            while record is not None:
+                # Timers due before the next record fire first
+                if self._events and self._events[0][0] < record["t"]:
+                    t, _, func, args = heapq.heappop(self._events)
+                else:
+                    t, func, args = record["t"], self._feed, (record,)
+                    record = next(records, None)
+
+                self._pace(started, t, func == self._feed)
+                self.clock.t = t
+                func(*args)
+                self._dispatch()
+
+            self.elapsed = time.perf_counter() - started
+            self.process_cpu = time.process_time() - cpu_started
+            self.last_t = self.clock.t
+
+        return self.report()
+
+    def _pace(self, started, t, is_record):
+        if self.args.speed is None:
+            return
+        due = started + (t - self.first_t) / self.args.speed
+        late = time.perf_counter() - due
+        if late < 0:
+            time.sleep(-late)
+        if is_record:
+            self.lag.append(max(0.0, late))
+
+    def _call(self, stream, func, *args):
+        wall, cpu = time.perf_counter(), time.process_time()
+        func(*args)
+        self.cpu += time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        self.consumer_wall += wall
+        if stream:
+            self.latency[stream].append(wall)
+            self.counts[stream] += 1
+        return wall
+
+    def _dispatch(self):
+        """Deliver what the replayed matcher published (its offers, retries, rematches)"""
+        mw = self.mw
+        while self.channel.requested or self.channel.events:
+            while self.channel.events:
+                routing_key, body = self.channel.events.pop(0)
+                self._call(None, mw.on_ride_event, self.channel, SimMethod(0, routing_key), None, body)
+
+            if self.channel.requested:
+                queue, body, properties = self.channel.requested.pop(0)
+                method = self.channel.deliver(queue)
+                self._call("ride.requested", mw.on_ride_requested, self.channel, method, properties, body)
+
+    def _tick_timers(self):
+        mw = self.mw
+
+        def tick():
+            for ride_id, offer in mw.OFFER_TIMERS.advance():
+                mw.expire_offer(self.channel, ride_id, offer)
+            for request in mw.POOL.expire():
+                mw.match_alone(self.channel, request)
+
+        self._call(None, tick)
+        self.at(self.clock.t + mw.OFFER_TIMER_TICK_SECONDS, self._tick_timers)
+
+    # Matcher wiring
+
+    def _setup_matcher(self):
+        from driver_index import DriverIndex
+        from scoring import DriverFeatures
+
+        mw, now = self.mw, self.clock.now
+        install_stores(mw, now)
+        mw.requests = self.service
+        if self.args.k:
+            mw.BROADCAST_OFFERS_K = self.args.k
+        mw.random.seed(self.args.seed)
+
+        if self.args.drivers_file:
+            mw.DRIVER_INDEX = DriverIndex.load(self.args.drivers_file, owns=lambda region: True)
+            mw.DRIVER_INDEX.features = DriverFeatures.from_arrays(mw.DRIVER_INDEX.features.to_arrays(), clock=now)
+
+        self._seed_drivers()
+
+    def _ride_region(self, ride):
+        return ride.get("region") or self.mw.pickup_region(ride.get("origin"))
+
+    def _seed_drivers(self):
+        """Drivers seen in the capture, in the region of their rides (one pass over the files)"""
+        regions = {}
+        drivers = set()
+        for record in read_records(self.args.files):
+            try:
+                data = json.loads(record_body(record))
+            except ValueError:
+                continue
+            if record["stream"] == "ride.requested":
+                regions[data.get("ride_id")] = self._ride_region(data)
+            elif record["stream"] == "ride.events":
+                region = regions.get(data.get("ride_id")) or self._ride_region(data)
+                for driver_id in data.get("driver_ids") or [data.get("driver_id")]:
+                    if driver_id is not None:
+                        drivers.add((driver_id, region))
+
+        for driver_id, region in sorted(drivers, key=str):
+            self.mw.DRIVER_INDEX.add(driver_id, region)
+
+    # Capture records
+
+    def _feed(self, record):
+        stream = record["stream"]
+        body = record_body(record)
+        properties = self.mw.pika.BasicProperties(
+            content_type="application/json",
+            timestamp=record.get("enqueued_at"),
+            headers=record.get("headers") or None,
+        )
+
+        if stream == "ride.requested":
+            self._feed_requested(record["routing_key"], body, properties)
+        elif stream == "ride.events":
+            self._feed_event(record["routing_key"], body)
+        elif stream == "notifications":
+            method = self.channel.deliver(record["routing_key"])
+            self._call(stream, self.nc.on_notification_message, self.channel, method, properties, body)
+
+    def _feed_requested(self, queue, body, properties):
+        """Published by ride-service: the ride is (again) requested at that version"""
+        try:
+            data = json.loads(body)
+            ride_id, version = data["ride_id"], data.get("version", 0)
+        except (ValueError, KeyError, TypeError):
+            data = None
+
+        if data is not None:
+            self.messages[ride_id] = data
+            ride = self.service.rides.get(ride_id)
+            if ride is None:
+                self.service.create(data, ride_id=ride_id, version=version)
+            elif ride["published"] < version and ride["status"] != "requested":
+                self.service.reopen(ride_id, version)
+            self.service.rides[ride_id]["published"] = version
+
+        # Poison messages go through too: the matcher dead-letters them
+        self.channel.publish_requested(queue, body, properties)
+
+    def _feed_event(self, routing_key, body):
+        try:
+            event = json.loads(body)
+        except ValueError:
+            return
+
+        if routing_key == "ride.offer":
+            self.captured_offers[event.get("ride_id")] = set(event.get("driver_ids") or [event.get("driver_id")])
+            return
+        if routing_key not in FED_EVENTS:
+            return
+
+        ride_id = event.get("ride_id")
+        if ride_id in self.service.rides:
+            if routing_key == "ride.accepted":
+                self.service.record_accept(ride_id, event.get("driver_id"))
+            else:
+                self.service.complete(ride_id, status=routing_key.split(".", 1)[1])
+        self._call("ride.events", self.mw.on_ride_event, self.channel, SimMethod(0, routing_key), None, body)
+
+    # SimRideService callbacks
+
+    def offered(self, ride, driver_ids, pool=None):
+        """Nobody answers a replayed offer: captured events decide, or the offer expires"""
+        self.offers += len(driver_ids)
+        for offered_ride in pool or [ride]:
+            self.replayed_offers[offered_ride["id"]] = set(driver_ids)
+
+    def publish_request(self, ride, excluded):
+        message = dict(self.messages[ride["id"]], version=ride["version"], excluded_drivers=excluded)
+        queue = self.mw.ride_requested_queue(self._ride_region(message), rematch=bool(excluded))
+        self.channel.publish_requested(queue, json.dumps(message), self.mw.pika.BasicProperties(
+            content_type="application/json", timestamp=int(self.clock.t)
+        ))
+
+    # Report
+
+    def report(self):
+        captured = [ride_id for ride_id in self.captured_offers if ride_id in self.service.rides]
+        same = sum(1 for ride_id in captured if self.replayed_offers.get(ride_id) == self.captured_offers[ride_id])
+        offered = sum(1 for ride_id in captured if ride_id in self.replayed_offers)
+        messages = sum(self.counts.values())
+        lag_ms = [lag * 1000 for lag in self.lag]
+
+        metrics = {
+            "records": messages,
+            "capture_seconds": self.last_t - self.first_t,
+            "replay_seconds": self.elapsed,
+            "speed": self.args.speed or "max",
+            "lag_ms_p99": percentile(lag_ms, 0.99),
+            "lag_ms_max": max(lag_ms, default=0.0),
+            "messages_per_s": messages / self.consumer_wall if self.consumer_wall else 0.0,
+            "cpu_seconds": self.process_cpu,
+            "offers": self.offers,
+            "captured_offer_rides": len(captured),
+            "offered_pct": 100 * offered / len(captured) if captured else 0.0,
+            "same_drivers_pct": 100 * same / len(captured) if captured else 0.0,
+            "retries": self.channel.published["retries"],
+            "dead_letters": self.channel.published["dead_letters"],
+        }
+        for stream in STREAMS:
+            latency_ms = [wall * 1000 for wall in self.latency[stream]]
+            metrics[stream] = {
+                "messages": self.counts[stream],
+                "ms_p50": percentile(latency_ms, 0.50),
+                "ms_p99": percentile(latency_ms, 0.99),
+            }
+        return metrics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured traffic through the matcher and notification consumer")
+    parser.add_argument("files", nargs="+", help="Capture files or directories (TRAFFIC_CAPTURE_DIR)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1 = as captured, 10 = ten times faster, max")
+    parser.add_argument("--drivers-file", default="", help="DRIVERS_FILE export with positions and ratings")
+    parser.add_argument("--k", type=int, default=0, help="Override BROADCAST_OFFERS_K")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the metrics as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    metrics = Replay(args).run()
+
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+
+    speed = f"{metrics['speed']:g}x" if args.speed else "max"
+    print(f"Capture:     {metrics['records']} records over {metrics['capture_seconds']:.0f} s, "
+          f"replayed in {metrics['replay_seconds']:.1f} s ({speed})")
+    if args.speed:
+        print(f"Lag:         p99 {metrics['lag_ms_p99']:.1f} ms   max {metrics['lag_ms_max']:.1f} ms behind schedule")
+    for stream in STREAMS:
+        stats = metrics[stream]
+        print(f"{stream + ':':<16} {stats['messages']:>7} messages   "
+              f"p50 {stats['ms_p50']:.2f} ms   p99 {stats['ms_p99']:.2f} ms")
+    print(f"Throughput:  {metrics['messages_per_s']:.0f} messages/s of consumer time, CPU {metrics['cpu_seconds']:.1f} s")
+    print(f"Offers:      {metrics['offers']} replayed; of {metrics['captured_offer_rides']} rides offered in the capture, "
+          f"{metrics['offered_pct']:.1f}% offered again, {metrics['same_drivers_pct']:.1f}% to the same drivers")
+    print(f"Retries:     {metrics['retries']} retries, {metrics['dead_letters']} dead-lettered")
+
+
+if __name__ == "__main__":
+    main()
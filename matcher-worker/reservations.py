@@ -0,0 +1,109 @@
+"""
+Local driver reservations for the matcher worker
+Compare-and-set store so this matcher never offers a driver two rides at once.
+
+The ride-service reservation (unique driver row) stays the source of truth
+across matchers; this store only avoids wasting an internal API call on a
+driver we already know is busy. Entries expire after OFFER_TIMEOUT_SECONDS,
+matching the offer timeout, so a lost release never pins a driver forever.
+"""
+import os
+import threading
+import time
+
+OFFER_TIMEOUT_SECONDS = float(os.getenv("OFFER_TIMEOUT_SECONDS", "60"))
+
+
+class ReservationStore:
+    """
+    driver_id -> (ride_id, expires_at) with atomic try_reserve/release
+    """
+
+    def __init__(self, ttl=OFFER_TIMEOUT_SECONDS, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._by_driver = {}
+        self._by_ride = {}
+
+    def __len__(self):
+        return len(self._by_driver)
+
+    def _expire(self, driver_id, now):
+        entry = self._by_driver.get(driver_id)
+        if entry and entry[1] <= now:
+            self._drop(driver_id)
+            return None
+        return entry
+
+    def _drop(self, driver_id):
+        ride_id, _ = self._by_driver.pop(driver_id)
+        drivers = self._by_ride.get(ride_id)
+        if drivers:
+            drivers.discard(driver_id)
+            if not drivers:
+                del self._by_ride[ride_id]
+
+    def try_reserve(self, driver_id, ride_id):
+        """
+        Reserve a driver for a ride if free (or already reserved for that ride)
+
+        Returns:
+            bool: True if the driver is now reserved for ride_id
+        """
+        with self._lock:
+            now = self._clock()
+            entry = self._expire(driver_id, now)
+
+            if entry and entry[0] != ride_id:
+                return False
+
+            self._by_driver[driver_id] = (ride_id, now + self.ttl)
+            self._by_ride.setdefault(ride_id, set()).add(driver_id)
+            return True
+
+    def is_reserved(self, driver_id):
+        with self._lock:
+            return self._expire(driver_id, self._clock()) is not None
+
+    def reserved_drivers(self):
+        """Drivers currently holding a reservation"""
+        with self._lock:
+            now = self._clock()
+            for driver_id in list(self._by_driver):
+                self._expire(driver_id, now)
+            return set(self._by_driver)
+
+    def release_driver(self, driver_id):
+        with self._lock:
+            if driver_id in self._by_driver:
+                self._drop(driver_id)
+
+    def dump(self):
+        """[(driver_id, ride_id, seconds left)] for a snapshot"""
+        with self._lock:
+            now = self._clock()
+            return [
+                (driver_id, ride_id, expires_at - now)
+                for driver_id, (ride_id, expires_at) in self._by_driver.items()
+                if expires_at > now
+            ]
+
+    def restore(self, entries):
+        """Reload dump() entries"""
+        with self._lock:
+            now = self._clock()
+            for driver_id, ride_id, ttl in entries:
+                if ttl > 0:
+                    self._by_driver[driver_id] = (ride_id, now + ttl)
+                    self._by_ride.setdefault(ride_id, set()).add(driver_id)
+
+    def release_ride(self, ride_id, keep=None):
+        """
+        Release every driver reserved for a ride (reject, cancel, timeout)
+        `keep` stays reserved - the winner of a broadcast offer
+        """
+        with self._lock:
+            for driver_id in list(self._by_ride.get(ride_id, ())):
+                if driver_id != keep:
+                    self._drop(driver_id)
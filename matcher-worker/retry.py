@@ -0,0 +1,188 @@
+"""
+Delayed retry and dead-letter topology shared by both workers
+
+Instead of basic_nack(requeue=True) - which redelivers a failing message
+immediately and forever - a failed message is acked and re-published to a
+retry queue whose TTL dead-letters it back to the work queue later:
+
+    ride.requested --fail--> ride.requested.retry.1s  --TTL--> ride.requested
+                   --fail--> ride.requested.retry.5s  --TTL--> ride.requested
+                   --fail--> ride.requested.retry.30s --TTL--> ride.requested
+                   --fail--> ride.requested.dlq  (inspect / replay with dlq.py)
+
+The attempt count travels in the 'x-attempt' message header.
+
+A message that is fine but cannot be handled yet (no driver free for a
+ride) is not a failure: wait_and_retry() backs it off through wait queues
+without counting an attempt, and it is never dead-lettered:
+
+    ride.requested.priority --no driver--> ride.requested.priority.wait.5s  --TTL--> ...
+                            --no driver--> ride.requested.priority.wait.30s --TTL--> ... (repeats)
+"""
+import json
+import os
+
+import pika
+
+from metrics import DEAD_LETTERED, RETRIES, WAITS
+
+# Delay before each retry, in seconds (the last one is reused if attempts > delays)
+RETRY_DELAYS = [int(d) for d in os.getenv("RETRY_DELAYS", "1,5,30").split(",") if d.strip()]
+# Deliveries before a message is dead-lettered
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+# Delay before each redelivery of a message waiting for a driver (the last one repeats)
+WAIT_DELAYS = [int(d) for d in os.getenv("NO_DRIVER_DELAYS", "5,15,30").split(",") if d.strip()] or [30]
+
+ATTEMPT_HEADER = "x-attempt"
+WAIT_HEADER = "x-wait"
+ERROR_HEADER = "x-last-error"
+ORIGIN_HEADER = "x-original-queue"
+
+
+def retry_queue_name(queue, delay):
+    return f"{queue}.retry.{delay}s"
+
+
+def dead_letter_queue_name(queue):
+    return f"{queue}.dlq"
+
+
+def wait_queue_name(queue, delay):
+    return f"{queue}.wait.{delay}s"
+
+
+def declare_retry_topology(channel, queue):
+    """
+    Declare the retry queues and the dead-letter queue of a work queue
+    Idempotent - safe to call at every worker start
+    """
+    for delay in RETRY_DELAYS:
+        channel.queue_declare(
+            queue=retry_queue_name(queue, delay),
+            durable=True,
+            arguments={
+                "x-message-ttl": delay * 1000,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue,
+            }
+        )
+    channel.queue_declare(queue=dead_letter_queue_name(queue), durable=True)
+
+
+def declare_wait_topology(channel, queue):
+    """Declare the wait queues of a work queue (see wait_and_retry)"""
+    for delay in WAIT_DELAYS:
+        channel.queue_declare(
+            queue=wait_queue_name(queue, delay),
+            durable=True,
+            arguments={
+                "x-message-ttl": delay * 1000,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue,
+            }
+        )
+
+
+def get_attempt(header_frame):
+    """Number of failed deliveries so far (0 for a fresh message)"""
+    headers = getattr(header_frame, "headers", None) or {}
+    try:
+        return int(headers.get(ATTEMPT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _publish(channel, queue, header_frame, body, headers):
+    merged = dict(getattr(header_frame, "headers", None) or {})
+    merged.pop("x-death", None)
+    merged.update(headers)
+
+    channel.basic_publish(
+        exchange="",
+        routing_key=queue,
+        body=body,
+        properties=pika.BasicProperties(
+            content_type=getattr(header_frame, "content_type", None) or "application/json",
+            delivery_mode=2,
+            # Original enqueue time - wait time keeps counting across retries
+            timestamp=getattr(header_frame, "timestamp", None),
+            headers=merged
+        )
+    )
+
+
+def dead_letter(channel, method_frame, header_frame, body, error, queue=None):
+    """
+    Park a message in the dead-letter queue and ack the original
+    Used directly for poison messages that can never succeed
+    """
+    queue = queue or method_frame.routing_key
+    _publish(channel, dead_letter_queue_name(queue), header_frame, body, {
+        ATTEMPT_HEADER: get_attempt(header_frame) + 1,
+        ERROR_HEADER: str(error)[:500],
+        ORIGIN_HEADER: queue,
+    })
+    channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+    DEAD_LETTERED.labels(queue).inc()
+    print(f" DEAD-LETTERED: {dead_letter_queue_name(queue)} ({error})")
+
+
+def retry_later(channel, method_frame, header_frame, body, error, queue=None):
+    """
+    Schedule a delayed redelivery, or dead-letter after MAX_ATTEMPTS
+    The original delivery is acked either way, so it never loops hot.
+
+    Args:
+        queue: work queue the message belongs to (defaults to its routing key)
+    """
+    queue = queue or method_frame.routing_key
+    attempt = get_attempt(header_frame) + 1
+
+    if attempt >= MAX_ATTEMPTS or not RETRY_DELAYS:
+        dead_letter(channel, method_frame, header_frame, body, error, queue)
+        return
+
+    delay = RETRY_DELAYS[min(attempt, len(RETRY_DELAYS)) - 1]
+    _publish(channel, retry_queue_name(queue, delay), header_frame, body, {
+        ATTEMPT_HEADER: attempt,
+        ERROR_HEADER: str(error)[:500],
+        ORIGIN_HEADER: queue,
+    })
+    channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+    RETRIES.labels(queue).inc()
+    print(f" RETRY {attempt}/{MAX_ATTEMPTS - 1} in {delay}s: {queue} ({error})")
+
+
+def wait_and_retry(channel, method_frame, header_frame, body, reason, queue=None):
+    """
+    Redeliver later without counting a failed attempt - the message is fine,
+    it just cannot be handled yet (no driver free). Backs off through
+    WAIT_DELAYS with no cap, so it is never dead-lettered; the original
+    delivery is acked.
+
+    Args:
+        queue: work queue the message belongs to (defaults to its routing key)
+    """
+    queue = queue or method_frame.routing_key
+    headers = getattr(header_frame, "headers", None) or {}
+    try:
+        waits = int(headers.get(WAIT_HEADER, 0)) + 1
+    except (TypeError, ValueError):
+        waits = 1
+
+    delay = WAIT_DELAYS[min(waits, len(WAIT_DELAYS)) - 1]
+    _publish(channel, wait_queue_name(queue, delay), header_frame, body, {
+        WAIT_HEADER: waits,
+        ORIGIN_HEADER: queue,
+    })
+    channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+    WAITS.labels(queue).inc()
+    print(f" WAIT {waits} in {delay}s: {queue} ({reason})")
+
+
+def describe(body):
+    """Short human readable form of a message body for the CLI"""
+    try:
+        return json.dumps(json.loads(body))
+    except (TypeError, ValueError):
+        return repr(body[:200])
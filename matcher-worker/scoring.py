@@ -0,0 +1,223 @@
+"""
+Vectorized driver scoring for the matcher worker
+
+Driver features live in a columnar table (one NumPy array per feature,
+one row per driver) so a few hundred candidates are scored with a handful
+of array operations instead of a Python loop:
+
+    score = sum(weight[f] * feature[f](candidates, ride))
+
+Features are pluggable: a function decorated with @feature("name") gets
+(table, rows, ride) and returns one value per candidate row. Weights come
+from SCORING_WEIGHTS ("distance=-1,rating=0.5,..."); a feature with a zero
+or missing weight is not computed.
+"""
+import os
+import time
+
+import numpy as np
+
+# Fallbacks for drivers with unknown features
+DEFAULT_RATING = float(os.getenv("DEFAULT_RATING", "4.5"))
+DEFAULT_ACCEPTANCE_RATE = float(os.getenv("DEFAULT_ACCEPTANCE_RATE", "0.8"))
+DEFAULT_CANCELLATION_RATE = float(os.getenv("DEFAULT_CANCELLATION_RATE", "0.0"))
+# Distance used for a driver whose location is unknown
+MAX_DISTANCE_KM = float(os.getenv("MAX_DISTANCE_KM", "50"))
+# Idle time is capped so a long-idle driver does not outweigh distance
+IDLE_CAP_SECONDS = float(os.getenv("IDLE_CAP_SECONDS", "1800"))
+
+DEFAULT_WEIGHTS = "distance=-1.0,rating=0.5,acceptance_rate=1.0,cancellation_rate=-1.0,idle_time=0.5"
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_weights(value):
+    """Parse "name=weight,..." into a dict"""
+    weights = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+SCORING_WEIGHTS = parse_weights(os.getenv("SCORING_WEIGHTS", DEFAULT_WEIGHTS))
+
+FEATURES = {}
+
+
+def feature(name):
+    """Register a feature function(table, rows, ride) -> np.ndarray"""
+    def register(func):
+        FEATURES[name] = func
+        return func
+    return register
+
+
+class DriverFeatures:
+    """
+    Columnar per-driver features, rows grow by doubling
+
+    Columns: lat, lng, rating, acceptance_rate, cancellation_rate,
+    idle_since (epoch seconds).
+    Unknown values are NaN and replaced by the defaults when scored.
+    """
+
+    COLUMNS = ("lat", "lng", "rating", "acceptance_rate", "cancellation_rate", "idle_since")
+
+    def __init__(self, capacity=256, clock=time.time):
+        self._clock = clock
+        self._rows = {}
+        self.columns = {name: np.full(capacity, np.nan) for name in self.COLUMNS}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._rows
+
+    def _row(self, driver_id):
+        row = self._rows.get(driver_id)
+        if row is not None:
+            return row
+
+        row = len(self._rows)
+        capacity = len(self.columns["lat"])
+        if row >= capacity:
+            for name, column in self.columns.items():
+                grown = np.full(capacity * 2, np.nan)
+                grown[:capacity] = column
+                self.columns[name] = grown
+        self._rows[driver_id] = row
+        self.columns["idle_since"][row] = self._clock()
+        return row
+
+    def update(self, driver_id, **values):
+        """Set some features of a driver (unknown names are ignored)"""
+        row = self._row(driver_id)
+        for name, value in values.items():
+            if name in self.columns and value is not None:
+                self.columns[name][row] = float(value)
+
+    def now(self):
+        """Current time of the table clock (epoch seconds)"""
+        return self._clock()
+
+    def mark_busy(self, driver_id):
+        """Driver got a ride - idle time starts again from now"""
+        self.update(driver_id, idle_since=self._clock())
+
+    def rows(self, driver_ids):
+        """Row numbers of the drivers (added with unknown features if new)"""
+        return np.fromiter((self._row(d) for d in driver_ids), dtype=np.intp, count=len(driver_ids))
+
+    def to_arrays(self):
+        """Every driver row as name -> array (driver_ids + one array per column)"""
+        size = len(self._rows)
+        arrays = {name: column[:size].copy() for name, column in self.columns.items()}
+        arrays["driver_ids"] = np.fromiter(self._rows, dtype=np.int64, count=size)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, **kwargs):
+        """Table from to_arrays() output (arrays may be memory-mapped)"""
+        driver_ids = arrays["driver_ids"]
+        size = len(driver_ids)
+        table = cls(capacity=max(256, size * 2), **kwargs)
+        table._rows = {int(driver_id): row for row, driver_id in enumerate(driver_ids)}
+        for name in cls.COLUMNS:
+            table.columns[name][:size] = arrays[name]
+        return table
+
+    def get(self, driver_id):
+        """Features of one driver as a dict (for logs / debugging)"""
+        row = self._rows.get(driver_id)
+        if row is None:
+            return None
+        return {name: float(column[row]) for name, column in self.columns.items()}
+
+
+@feature("distance")
+def distance_km(table, rows, ride):
+    """Haversine distance to the pickup point (MAX_DISTANCE_KM if unknown)"""
+    pickup = ride.get("pickup")
+    if not pickup:
+        return np.zeros(len(rows))
+
+    lat = np.radians(table.columns["lat"][rows])
+    lng = np.radians(table.columns["lng"][rows])
+    pickup_lat, pickup_lng = np.radians(pickup[0]), np.radians(pickup[1])
+
+    a = (np.sin((lat - pickup_lat) / 2) ** 2
+         + np.cos(lat) * np.cos(pickup_lat) * np.sin((lng - pickup_lng) / 2) ** 2)
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    return np.where(np.isnan(distance), MAX_DISTANCE_KM, distance)
+
+
+@feature("rating")
+def rating(table, rows, ride):
+    """Rating scaled to 0..1 (5 stars = 1)"""
+    values = table.columns["rating"][rows]
+    return np.where(np.isnan(values), DEFAULT_RATING, values) / 5.0
+
+
+@feature("acceptance_rate")
+def acceptance_rate(table, rows, ride):
+    values = table.columns["acceptance_rate"][rows]
+    return np.where(np.isnan(values), DEFAULT_ACCEPTANCE_RATE, values)
+
+
+@feature("cancellation_rate")
+def cancellation_rate(table, rows, ride):
+    """Share of accepted rides the driver cancelled"""
+    values = table.columns["cancellation_rate"][rows]
+    return np.where(np.isnan(values), DEFAULT_CANCELLATION_RATE, values)
+
+
+@feature("idle_time")
+def idle_time(table, rows, ride):
+    """Time since the last ride, scaled to 0..1 (IDLE_CAP_SECONDS = 1)"""
+    now = ride.get("now") or table.now()
+    idle = now - table.columns["idle_since"][rows]
+    return np.clip(np.nan_to_num(idle), 0.0, IDLE_CAP_SECONDS) / IDLE_CAP_SECONDS
+
+
+def score(table, driver_ids, ride, weights=None):
+    """
+    Score every candidate at once
+
+    Returns:
+        np.ndarray: one score per driver id (higher is better)
+    """
+    weights = SCORING_WEIGHTS if weights is None else weights
+    rows = table.rows(driver_ids)
+    total = np.zeros(len(rows))
+
+    for name, weight in weights.items():
+        if weight and name in FEATURES:
+            total += weight * FEATURES[name](table, rows, ride)
+
+    return total
+
+
+def top_k(table, driver_ids, ride, k, weights=None):
+    """
+    Best k candidates, best first
+
+    argpartition keeps selection O(n); only the k winners are sorted.
+    Ties are not broken randomly - shuffle the candidates for that.
+    """
+    if not driver_ids:
+        return []
+
+    scores = score(table, driver_ids, ride, weights)
+    k = min(k, len(driver_ids))
+
+    if k < len(driver_ids):
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(driver_ids))
+    best = best[np.argsort(-scores[best], kind="stable")]
+
+    return [driver_ids[i] for i in best]
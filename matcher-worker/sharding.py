@@ -0,0 +1,109 @@
+"""
+Region sharding for the matcher worker
+Same consistent hash ring as ride-service (rides/sharding.py): keep both in sync.
+
+Each matcher instance owns a subset of shards (MATCHER_SHARDS) and only
+consumes the matching 'ride.requested.<shard>' queues.
+"""
+import os
+import bisect
+import hashlib
+
+RIDE_REQUEST_SHARDS = int(os.getenv("RIDE_REQUEST_SHARDS", "1"))
+# Comma-separated shard numbers owned by this instance, or "all"
+MATCHER_SHARDS = os.getenv("MATCHER_SHARDS", "all")
+RIDE_REQUESTED_QUEUE = "ride.requested"
+# Lane served first: rematches (reject / offer timeout) and retried requests
+PRIORITY_LANE_SUFFIX = "priority"
+DEFAULT_REGION = "default"
+
+# Virtual nodes per shard - smooths the distribution of regions
+VIRTUAL_NODES = 64
+
+
+def pickup_region(origin):
+    """
+    Derive the pickup region from an origin address
+
+    The last comma-separated part is the neighbourhood/district:
+        "123 Main Street, Downtown" -> "downtown"
+    """
+    if not origin:
+        return DEFAULT_REGION
+
+    region = origin.rsplit(",", 1)[-1] if "," in origin else ""
+    region = " ".join(region.lower().split())
+    return region or DEFAULT_REGION
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping regions to shard numbers
+    Adding a shard only moves ~1/N of the regions.
+    """
+
+    def __init__(self, shards, virtual_nodes=VIRTUAL_NODES):
+        self.shards = max(1, shards)
+        points = sorted(
+            (_hash(f"shard-{shard}#{vnode}"), shard)
+            for shard in range(self.shards)
+            for vnode in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, region):
+        if self.shards == 1:
+            return 0
+        index = bisect.bisect(self._keys, _hash(region)) % len(self._keys)
+        return self._shards[index]
+
+
+RING = HashRing(RIDE_REQUEST_SHARDS)
+
+
+def parse_owned_shards(value=MATCHER_SHARDS, shards=RIDE_REQUEST_SHARDS):
+    """Parse MATCHER_SHARDS ("all" or "0,2,5") into a set of shard numbers"""
+    if not value or value.strip().lower() == "all":
+        return set(range(max(1, shards)))
+
+    owned = {int(part) for part in value.split(",") if part.strip()}
+    invalid = [shard for shard in owned if not 0 <= shard < max(1, shards)]
+    if invalid:
+        raise ValueError(f"MATCHER_SHARDS {invalid} out of range for {shards} shards")
+    return owned
+
+
+OWNED_SHARDS = parse_owned_shards()
+
+
+def owns_region(region):
+    """True if this matcher instance is responsible for the region"""
+    return RING.shard_for(region) in OWNED_SHARDS
+
+
+def priority_lane(queue):
+    """Priority lane of a ride.requested queue (the lane itself if already one)"""
+    if queue.endswith(f".{PRIORITY_LANE_SUFFIX}"):
+        return queue
+    return f"{queue}.{PRIORITY_LANE_SUFFIX}"
+
+
+def ride_requested_queue(region, rematch=False):
+    """Queue name carrying ride.requested messages for a region"""
+    if RIDE_REQUEST_SHARDS <= 1:
+        queue = RIDE_REQUESTED_QUEUE
+    else:
+        queue = f"{RIDE_REQUESTED_QUEUE}.{RING.shard_for(region)}"
+    return priority_lane(queue) if rematch else queue
+
+
+def owned_queues():
+    """ride.requested queues of this matcher instance (each also has a priority lane)"""
+    if RIDE_REQUEST_SHARDS <= 1:
+        return [RIDE_REQUESTED_QUEUE]
+    return [f"{RIDE_REQUESTED_QUEUE}.{shard}" for shard in sorted(OWNED_SHARDS)]
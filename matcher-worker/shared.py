@@ -0,0 +1,13 @@
+"""
+Puts the repository root on sys.path, for the `common` and `tools` packages
+shared with ride-service and auth-service
+
+    import shared  # noqa: F401 - before any `from common ...` / `from tools ...`
+"""
+import os
+import sys
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
@@ -0,0 +1,626 @@
+"""
+Offline city simulator for the matching pipeline
+
+Runs the real matcher code (on_ride_requested, on_ride_event, offer expiry,
+pooling) in one process against in-process stand-ins:
+
+    SimChannel      RabbitMQ channel: queues, ride.events, retry delays
+    SimRideService  ride-service internal API: reservations, offers,
+                    accept / decline / complete with the same rules
+
+Time is virtual (seeded discrete-event loop): N drivers move block by
+block on a square city grid, passengers arrive following an arrival curve,
+offered drivers answer after a random delay, accepted drivers drive to the
+pickup then the drop-off. The matcher stores run on the virtual clock, so
+an hour of traffic takes seconds and the same seed gives the same rides.
+
+Reported:
+    match latency   wall time of one on_ride_requested call (p50 / p99)
+    time to accept  virtual time from request to accepted ride (p50 / p99)
+    pickup distance driver -> pickup when the ride is accepted
+    throughput      ride.requested messages per second of matcher time
+    CPU per match   process time of every matcher callback / accepted rides
+
+Usage:
+    python simulate.py
+    python simulate.py --drivers 2000 --duration 3600 --rate 120 --arrival peak --k 3
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import re
+import statistics
+import time
+
+# The matcher reads its configuration at import time
+os.environ.update(
+    MATCH_DELAY_SECONDS="0",
+    DRIVERS_FILE="",
+    DRIVER_STATS_FILE="",
+    MATCHER_SNAPSHOT_DIR="",
+    TRAFFIC_CAPTURE_DIR="",
+)
+
+CITY_CENTER = (48.8566, 2.3522)
+KM_PER_DEGREE = 111.2
+SIM_REGION = "sim"
+START_TIME = 1_700_000_000.0
+
+
+class VirtualClock:
+    def __init__(self, start=START_TIME):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+
+class SimMethod:
+    """pika method frame stand-in"""
+
+    def __init__(self, delivery_tag, routing_key, message_count=0):
+        self.delivery_tag = delivery_tag
+        self.routing_key = routing_key
+        self.message_count = message_count
+
+
+class SimResponse:
+    """requests.Response stand-in"""
+
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data or {}
+        self.text = json.dumps(self._data)
+
+    def json(self):
+        return self._data
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def to_latlng(x_km, y_km):
+    lat = CITY_CENTER[0] + y_km / KM_PER_DEGREE
+    lng = CITY_CENTER[1] + x_km / (KM_PER_DEGREE * math.cos(math.radians(CITY_CENTER[0])))
+    return [lat, lng]
+
+
+def grid_km(a, b):
+    """Manhattan distance on the grid (km)"""
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def install_stores(mw, now):
+    """Fresh, empty matcher stores running on the clock `now`"""
+    from driver_index import DriverIndex
+    from driver_stats import DriverStats
+    from scoring import DriverFeatures
+    from reservations import ReservationStore
+    from dedupe import DedupeStore, ClosedRides
+    from exclusions import ExclusionStore
+    from timer_wheel import TimerWheel
+    from pooling import PoolIndex
+
+    mw.DRIVER_INDEX = DriverIndex()
+    mw.DRIVER_INDEX.features = DriverFeatures(clock=now)
+    mw.DRIVER_STATS = DriverStats(clock=now)
+    mw.RESERVATIONS = ReservationStore(clock=now)
+    mw.PROCESSED = DedupeStore(clock=now)
+    mw.CLOSED_RIDES = ClosedRides(clock=now)
+    mw.EXCLUSIONS = ExclusionStore(clock=now)
+    mw.OFFER_TIMERS = TimerWheel(tick=mw.OFFER_TIMER_TICK_SECONDS, clock=now)
+    mw.POOL = PoolIndex(clock=now)
+
+
+class SimChannel:
+    """
+    In-process channel: published messages are queued and delivered by the
+    simulation loop; retry queues hold a message for their delay
+    """
+
+    RETRY_QUEUE = re.compile(r"\.(retry|wait)\.(\d+)s$")
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.requested = []
+        self.events = []
+        self.unacked = set()
+        self.published = {"notifications": 0, "dead_letters": 0, "retries": 0, "waits": 0}
+        self._tags = itertools.count(1)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        if exchange:
+            self.events.append((routing_key, body))
+            return
+
+        retry = self.RETRY_QUEUE.search(routing_key)
+        if retry:
+            self.published["retries" if retry.group(1) == "retry" else "waits"] += 1
+            origin = properties.headers.get("x-original-queue")
+            self.sim.at(self.sim.clock.t + int(retry.group(2)), self.publish_requested, origin, body, properties)
+        elif routing_key.endswith(".dlq"):
+            self.published["dead_letters"] += 1
+        elif routing_key == "notifications":
+            self.published["notifications"] += 1
+        else:
+            self.publish_requested(routing_key, body, properties)
+
+    def publish_requested(self, queue, body, properties=None):
+        self.requested.append((queue, body, properties))
+
+    def basic_ack(self, delivery_tag):
+        self.unacked.discard(delivery_tag)
+
+    def deliver(self, queue):
+        tag = next(self._tags)
+        self.unacked.add(tag)
+        return SimMethod(tag, queue)
+
+
+class SimRideService:
+    """
+    ride-service stand-in: the internal endpoints the matcher calls, and the
+    driver actions (accept, decline, complete) with the same reservation rules
+    """
+
+    ROUTE = re.compile(r"/rides/(?:(\d+)/)?([a-z-]+)/$")
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.rides = {}
+        # driver_id -> ride_id (one reservation per driver)
+        self.reservations = {}
+        self.ride_ids = itertools.count(1)
+
+    def create(self, data, ride_id=None, version=1):
+        ride_id = next(self.ride_ids) if ride_id is None else ride_id
+        self.rides[ride_id] = dict(data, id=ride_id, status="requested", driver=None,
+                                   offered=set(), pool_id=None, version=version)
+        return self.rides[ride_id]
+
+    def _reserve(self, driver_id, ride_id):
+        self.reservations[driver_id] = ride_id
+
+    def _release_ride(self, ride_id):
+        for driver_id in [d for d, r in self.reservations.items() if r == ride_id]:
+            del self.reservations[driver_id]
+
+    def _requeue(self, ride, excluded):
+        ride.update(status="requested", driver=None, offered=set(), pool_id=None)
+        ride["version"] += 1
+        self.sim.publish_request(ride, excluded)
+
+    # requests.post stand-in
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        match = self.ROUTE.search(url)
+        ride_id, action = (int(match.group(1)) if match.group(1) else None), match.group(2)
+        handler = getattr(self, "_" + action.replace("-", "_"))
+        return handler(ride_id, json or {})
+
+    def _unavailable(self, ride):
+        return SimResponse(400, {"reason": "ride_unavailable", "current_status": ride["status"]})
+
+    def _assign_driver(self, ride_id, data):
+        ride, driver_id = self.rides[ride_id], data["driver_id"]
+        if driver_id in self.reservations:
+            return SimResponse(409, {"reason": "driver_busy"})
+        if ride["status"] != "requested":
+            return self._unavailable(ride)
+        self._reserve(driver_id, ride_id)
+        ride.update(status="offered", driver=driver_id)
+        ride["version"] += 1
+        self.sim.offered(ride, [driver_id])
+        return SimResponse(200, {"success": True})
+
+    def _broadcast_offer(self, ride_id, data):
+        ride = self.rides[ride_id]
+        free = [d for d in data["driver_ids"] if d not in self.reservations]
+        if not free:
+            return SimResponse(409, {"reason": "driver_busy"})
+        if ride["status"] != "requested":
+            return self._unavailable(ride)
+        for driver_id in free:
+            self._reserve(driver_id, ride_id)
+        ride.update(status="offered", driver=None, offered=set(free))
+        ride["version"] += 1
+        self.sim.offered(ride, free)
+        return SimResponse(200, {"success": True, "driver_ids": free})
+
+    def _pool_offer(self, ride_id, data):
+        ride_ids, driver_id = data["ride_ids"], data["driver_id"]
+        if driver_id in self.reservations:
+            return SimResponse(409, {"reason": "driver_busy"})
+        rides = [self.rides[r] for r in ride_ids]
+        if any(ride["status"] != "requested" for ride in rides):
+            return SimResponse(400, {"current_status": {r["id"]: r["status"] for r in rides}})
+        self._reserve(driver_id, ride_ids[0])
+        for ride in rides:
+            ride.update(status="offered", driver=driver_id, pool_id=ride_ids[0])
+            ride["version"] += 1
+        self.sim.offered(rides[0], [driver_id], pool=rides)
+        return SimResponse(200, {"success": True, "pool_id": ride_ids[0]})
+
+    def _pool_of(self, ride):
+        if ride["pool_id"] is None:
+            return [ride]
+        return [r for r in self.rides.values() if r["pool_id"] == ride["pool_id"]]
+
+    def _offered_to(self, ride, driver_ids):
+        return ride["status"] == "offered" and (
+            ride["driver"] in driver_ids or (ride["driver"] is None and ride["offered"] & set(driver_ids))
+        )
+
+    def _release_driver(self, ride_id, data):
+        driver_ids = data.get("driver_ids") or [data.get("driver_id")]
+        released = [r for r in self._pool_of(self.rides[ride_id]) if self._offered_to(r, driver_ids)]
+        if not released:
+            return SimResponse(409, {"current_status": self.rides[ride_id]["status"]})
+        for ride in released:
+            self._release_ride(ride["id"])
+            ride.update(status="requested", driver=None, offered=set(), pool_id=None)
+            ride["version"] += 1
+        versions = {str(r["id"]): r["version"] for r in released}
+        return SimResponse(200, {"version": self.rides[ride_id]["version"], "versions": versions})
+
+    # Driver actions
+
+    def accept(self, ride_id, driver_id):
+        """Accepted rides (first writer wins), empty if the offer is gone"""
+        ride = self.rides[ride_id]
+        if ride["pool_id"] is None:
+            rides = [ride] if self._offered_to(ride, [driver_id]) else []
+        else:
+            rides = [r for r in self._pool_of(ride) if r["status"] == "offered" and r["driver"] == driver_id]
+        for accepted in rides:
+            accepted.update(status="accepted", driver=driver_id)
+            accepted["withdrawn"] = [d for d, r in self.reservations.items() if r == accepted["id"] and d != driver_id]
+            for loser in accepted["withdrawn"]:
+                del self.reservations[loser]
+        return rides
+
+    def decline(self, ride_id, driver_id):
+        ride = self.rides[ride_id]
+        if not self._offered_to(ride, [driver_id]):
+            return
+        self.reservations.pop(driver_id, None)
+        if ride["pool_id"] is not None:
+            for pooled in [r for r in self._pool_of(ride) if r["status"] == "offered"]:
+                self._requeue(pooled, [driver_id])
+        elif ride["driver"] is None:
+            # Broadcast: rematch once every driver declined
+            ride["offered"].discard(driver_id)
+            if not ride["offered"]:
+                self._requeue(ride, [driver_id])
+        else:
+            self._requeue(ride, [driver_id])
+
+    def reopen(self, ride_id, version):
+        """Ride requested again at `version` (rematch published by ride-service)"""
+        ride = self.rides[ride_id]
+        self._release_ride(ride_id)
+        ride.update(status="requested", driver=None, offered=set(), pool_id=None, version=version)
+
+    def record_accept(self, ride_id, driver_id):
+        """Ride accepted outside the simulation: the driver holds it, every other offer is gone"""
+        ride = self.rides[ride_id]
+        self._release_ride(ride_id)
+        ride.update(status="accepted", driver=driver_id)
+        if driver_id is not None:
+            self._reserve(driver_id, ride_id)
+
+    def complete(self, ride_id, status="completed"):
+        ride = self.rides[ride_id]
+        ride["status"] = status
+        remaining = [r for r in self._pool_of(ride) if r["status"] in ("offered", "accepted")]
+        for driver_id, held in list(self.reservations.items()):
+            if held == ride_id:
+                if remaining:
+                    self.reservations[driver_id] = remaining[0]["id"]
+                else:
+                    del self.reservations[driver_id]
+
+
+class Simulation:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.clock = VirtualClock()
+        self._events = []
+        self._seq = itertools.count()
+
+        self.channel = SimChannel(self)
+        self.service = SimRideService(self)
+        self.drivers = {}
+        self.busy = set()
+
+        self.match_wall = []
+        self.cpu = 0.0
+        self.matcher_wall = 0.0
+        self.requested_at = {}
+        self.accepted_after = []
+        self.pickup_km = []
+        self.offers = 0
+        self.messages = 0
+
+    # Event loop
+
+    def at(self, t, func, *args):
+        heapq.heappush(self._events, (t, next(self._seq), func, args))
+
+    def run(self):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            import matcher_worker
+            self.mw = matcher_worker
+            self._setup_matcher()
+
+            end = self.clock.t + self.args.duration
+            self._schedule_arrivals(end)
+            self.at(self.clock.t, self._move_drivers)
+            self.at(self.clock.t, self._tick_timers)
+
+            started = time.perf_counter()
+            # Keep going after the last arrival so pending offers get answered
+            while self._events and self._events[0][0] <= end + self.args.drain:
+                t, _, func, args = heapq.heappop(self._events)
+                self.clock.t = t
+                func(*args)
+                self._dispatch()
+            self.elapsed = time.perf_counter() - started
+
+        return self.report()
+
+    def _matcher_call(self, func, *args):
+        wall, cpu = time.perf_counter(), time.process_time()
+        func(*args)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        self.cpu += cpu
+        self.matcher_wall += wall
+        return wall
+
+    def _dispatch(self):
+        """Deliver everything published so far (events first, as the broker interleaves them)"""
+        mw = self.mw
+        while self.channel.requested or self.channel.events:
+            while self.channel.events:
+                routing_key, body = self.channel.events.pop(0)
+                self._matcher_call(mw.on_ride_event, self.channel, SimMethod(0, routing_key), None, body)
+
+            if self.channel.requested:
+                queue, body, properties = self.channel.requested.pop(0)
+                method = self.channel.deliver(queue)
+                self.messages += 1
+                self.match_wall.append(self._matcher_call(
+                    mw.on_ride_requested, self.channel, method, properties, body
+                ))
+
+    # Matcher wiring
+
+    def _setup_matcher(self):
+        mw = self.mw
+        install_stores(mw, self.clock.now)
+        mw.requests = self.service
+        mw.BROADCAST_OFFERS_K = self.args.k
+        # random.shuffle of equally scored candidates
+        mw.random.seed(self.args.seed)
+
+        half = self.args.city_km / 2
+        for driver_id in range(1, self.args.drivers + 1):
+            position = (self._snap(self.rng.uniform(-half, half)), self._snap(self.rng.uniform(-half, half)))
+            self.drivers[driver_id] = position
+            lat, lng = to_latlng(*position)
+            mw.DRIVER_INDEX.add(driver_id, SIM_REGION, lat=lat, lng=lng,
+                                rating=self.rng.uniform(4.0, 5.0))
+
+    def _snap(self, km):
+        return round(km / self.args.block_km) * self.args.block_km
+
+    def _tick_timers(self):
+        """What start_offer_timers / start_pool_timers do on the broker connection"""
+        mw = self.mw
+
+        def tick():
+            for ride_id, offer in mw.OFFER_TIMERS.advance():
+                mw.expire_offer(self.channel, ride_id, offer)
+            for request in mw.POOL.expire():
+                mw.match_alone(self.channel, request)
+
+        self._matcher_call(tick)
+        self.at(self.clock.t + mw.OFFER_TIMER_TICK_SECONDS, self._tick_timers)
+
+    # City
+
+    def _arrival_rate(self, t):
+        """Requests per second at time t (offset from the start)"""
+        base = self.args.rate / 60
+        if self.args.arrival == "peak":
+            # Rush hour centred on the middle of the run
+            middle, width = self.args.duration / 2, self.args.duration / 6
+            return base * (1 + (self.args.peak_factor - 1) * math.exp(-((t - middle) / width) ** 2))
+        if self.args.arrival == "ramp":
+            return base * (1 + (self.args.peak_factor - 1) * t / self.args.duration)
+        return base
+
+    def _schedule_arrivals(self, end):
+        """Non-homogeneous Poisson arrivals (thinning)"""
+        peak = self.args.rate / 60 * max(1.0, self.args.peak_factor)
+        t = self.clock.t
+        while True:
+            t += self.rng.expovariate(peak)
+            if t > end:
+                return
+            if self.rng.random() * peak <= self._arrival_rate(t - self.clock.t):
+                self.at(t, self._request_ride)
+
+    def _request_ride(self):
+        half = self.args.city_km / 2
+        pickup = (self.rng.uniform(-half, half), self.rng.uniform(-half, half))
+        dropoff = (self.rng.uniform(-half, half), self.rng.uniform(-half, half))
+        pool = self.rng.random() < self.args.pool_share
+
+        ride = self.service.create({"pickup_km": pickup, "dropoff_km": dropoff, "pool": pool})
+        self.requested_at[ride["id"]] = self.clock.t
+        self.publish_request(ride, [])
+
+    def publish_request(self, ride, excluded):
+        """What ride-service publish_ride_requested sends (rematches to the priority lane)"""
+        mw = self.mw
+        message = {
+            "ride_id": ride["id"],
+            "passenger_id": ride["id"],
+            "origin": f"Street {ride['id']}, {SIM_REGION}",
+            "destination": "Somewhere",
+            "region": SIM_REGION,
+            "pickup": to_latlng(*ride["pickup_km"]),
+            "dropoff": to_latlng(*ride["dropoff_km"]),
+            "pool": ride["pool"],
+            "version": ride["version"],
+            "excluded_drivers": excluded,
+            "event": "ride_requested",
+        }
+        queue = mw.ride_requested_queue(SIM_REGION, rematch=bool(excluded))
+        self.channel.publish_requested(queue, json.dumps(message), mw.pika.BasicProperties(
+            content_type="application/json", timestamp=int(self.clock.t)
+        ))
+
+    def offered(self, ride, driver_ids, pool=None):
+        """Offered drivers answer after a random delay (or never, past the offer timeout)"""
+        self.offers += len(driver_ids)
+        for driver_id in driver_ids:
+            delay = self.rng.expovariate(1 / self.args.response_mean)
+            if delay >= self.mw.OFFER_TIMEOUT_SECONDS:
+                continue
+            accepts = self.rng.random() < self.args.accept_prob
+            self.at(self.clock.t + delay, self._answer, ride["id"], driver_id, accepts)
+
+    def _answer(self, ride_id, driver_id, accepts):
+        if not accepts:
+            self.service.decline(ride_id, driver_id)
+            return
+
+        accepted = self.service.accept(ride_id, driver_id)
+        if not accepted:
+            return
+
+        position = self.drivers[driver_id]
+        self.busy.add(driver_id)
+        for ride in accepted:
+            self.pickup_km.append(grid_km(position, ride["pickup_km"]))
+            self.accepted_after.append(self.clock.t - self.requested_at[ride["id"]])
+            self.channel.basic_publish(self.mw.RIDE_EVENTS_EXCHANGE, "ride.accepted", json.dumps({
+                "ride_id": ride["id"], "driver_id": driver_id, "withdrawn": ride["withdrawn"],
+                "event": "ride_accepted"
+            }))
+
+        # Every pickup, then every drop-off (pooled rides share the route)
+        stops = [position] + [r["pickup_km"] for r in accepted] + [r["dropoff_km"] for r in accepted]
+        route_km = sum(grid_km(a, b) for a, b in zip(stops, stops[1:]))
+        trip = route_km / self.args.speed_kmh * 3600
+        self.at(self.clock.t + trip, self._complete, [r["id"] for r in accepted], driver_id, stops[-1])
+
+    def _complete(self, ride_ids, driver_id, position):
+        for ride_id in ride_ids:
+            self.service.complete(ride_id)
+            self.channel.basic_publish(self.mw.RIDE_EVENTS_EXCHANGE, "ride.completed", json.dumps({
+                "ride_id": ride_id, "driver_id": driver_id,
+                "rating": round(self.rng.uniform(3.5, 5.0), 1), "event": "ride_completed"
+            }))
+        self.busy.discard(driver_id)
+        self._move_to(driver_id, (self._snap(position[0]), self._snap(position[1])))
+
+    def _move_to(self, driver_id, position):
+        self.drivers[driver_id] = position
+        lat, lng = to_latlng(*position)
+        self.mw.DRIVER_INDEX.features.update(driver_id, lat=lat, lng=lng)
+
+    def _move_drivers(self):
+        """Idle drivers move one block in a random direction"""
+        half = self.args.city_km / 2
+        block = self.args.block_km
+        for driver_id, (x, y) in self.drivers.items():
+            if driver_id in self.busy:
+                continue
+            dx, dy = self.rng.choice(((block, 0), (-block, 0), (0, block), (0, -block)))
+            self._move_to(driver_id, (min(half, max(-half, x + dx)), min(half, max(-half, y + dy))))
+        self.at(self.clock.t + self.args.move_seconds, self._move_drivers)
+
+    # Report
+
+    def report(self):
+        rides = len(self.service.rides)
+        matched = len(self.accepted_after)
+        match_ms = [w * 1000 for w in self.match_wall]
+        return {
+            "rides": rides,
+            "matched": matched,
+            "unmatched_pct": 100 * (rides - matched) / rides if rides else 0.0,
+            "offers": self.offers,
+            "messages": self.messages,
+            "retries": self.channel.published["retries"],
+            "waits": self.channel.published["waits"],
+            "dead_letters": self.channel.published["dead_letters"],
+            "match_ms_p50": percentile(match_ms, 0.50),
+            "match_ms_p99": percentile(match_ms, 0.99),
+            "accept_s_p50": percentile(self.accepted_after, 0.50),
+            "accept_s_p99": percentile(self.accepted_after, 0.99),
+            "pickup_km_mean": statistics.fmean(self.pickup_km) if self.pickup_km else 0.0,
+            "pickup_km_p90": percentile(self.pickup_km, 0.90),
+            "messages_per_s": self.messages / self.matcher_wall if self.matcher_wall else 0.0,
+            "cpu_ms_per_match": 1000 * self.cpu / matched if matched else 0.0,
+            "sim_seconds": self.elapsed,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seeded city simulation of the matching pipeline")
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=3600, help="Simulated seconds of arrivals")
+    parser.add_argument("--drain", type=float, default=1800, help="Simulated seconds after the last arrival")
+    parser.add_argument("--rate", type=float, default=20, help="Base requests per minute")
+    parser.add_argument("--arrival", choices=("constant", "peak", "ramp"), default="constant")
+    parser.add_argument("--peak-factor", type=float, default=3.0, help="Peak rate / base rate")
+    parser.add_argument("--city-km", type=float, default=10.0, help="Side of the square city")
+    parser.add_argument("--block-km", type=float, default=0.2, help="Grid block size")
+    parser.add_argument("--move-seconds", type=float, default=60, help="Idle drivers move one block per period")
+    parser.add_argument("--speed-kmh", type=float, default=25.0)
+    parser.add_argument("--k", type=int, default=1, help="Drivers per offer (BROADCAST_OFFERS_K)")
+    parser.add_argument("--pool-share", type=float, default=0.0, help="Share of requests opting in to pooling")
+    parser.add_argument("--accept-prob", type=float, default=0.7)
+    parser.add_argument("--response-mean", type=float, default=10.0, help="Mean driver answer time (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the metrics as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    metrics = Simulation(args).run()
+
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+
+    print(f"Rides:           {metrics['rides']} requested, {metrics['matched']} matched "
+          f"({metrics['unmatched_pct']:.1f}% unmatched), {metrics['offers']} offers")
+    print(f"Messages:        {metrics['messages']} ride.requested, {metrics['retries']} retries, "
+          f"{metrics['waits']} waits for a driver, {metrics['dead_letters']} dead-lettered")
+    print(f"Match latency:   p50 {metrics['match_ms_p50']:.2f} ms   p99 {metrics['match_ms_p99']:.2f} ms")
+    print(f"Time to accept:  p50 {metrics['accept_s_p50']:.1f} s    p99 {metrics['accept_s_p99']:.1f} s (simulated)")
+    print(f"Pickup distance: mean {metrics['pickup_km_mean']:.2f} km   p90 {metrics['pickup_km_p90']:.2f} km")
+    print(f"Throughput:      {metrics['messages_per_s']:.0f} ride.requested/s of matcher time")
+    print(f"CPU per match:   {metrics['cpu_ms_per_match']:.2f} ms")
+    print(f"Wall time:       {metrics['sim_seconds']:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
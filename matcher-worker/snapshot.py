@@ -0,0 +1,243 @@
+"""
+Matcher state snapshots and event journal - warm restart
+
+Every MATCHER_SNAPSHOT_SECONDS the matcher writes its in-memory state
+(driver index + features, driver stats, reservations, dedupe, closed rides,
+exclusions, offer timers) to MATCHER_SNAPSHOT_DIR. Every state change after
+that is appended to a journal. At startup the latest snapshot is loaded
+(arrays memory-mapped) and only the journal is replayed:
+
+    MATCHER_SNAPSHOT_DIR/
+        CURRENT                      name of the latest complete snapshot
+        snapshot-000042/
+            header.json              metadata, region names, ragged state
+            index.*.npy              driver index and scoring features
+            stats.*.npy              driver stats counters
+            processed.npy            (ride_id, version, ttl)
+            closed.npy               (ride_id, version, ttl)
+            reservations.npy         (driver_id, ride_id, ttl)
+        journal-000042.ndjson        changes since snapshot 42
+
+Expiry times are stored as seconds left and re-based on load, so the
+monotonic clocks of the stores never leave the process.
+
+A snapshot is complete once CURRENT points to it; the journal of a new
+snapshot is opened before the state is dumped, so a crash while writing
+only costs replaying one more journal.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Empty = snapshots disabled (cold start from DRIVERS_FILE)
+MATCHER_SNAPSHOT_DIR = os.getenv("MATCHER_SNAPSHOT_DIR", "")
+MATCHER_SNAPSHOT_SECONDS = float(os.getenv("MATCHER_SNAPSHOT_SECONDS", "60"))
+
+SNAPSHOT_FORMAT = 1
+
+RIDE_ENTRY_DTYPE = np.dtype([("ride_id", np.int64), ("version", np.float64), ("ttl", np.float64)])
+RESERVATION_DTYPE = np.dtype([("driver_id", np.int64), ("ride_id", np.int64), ("ttl", np.float64)])
+
+
+def _save(directory, name, array):
+    np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+
+
+def _load(directory, name):
+    path = os.path.join(directory, f"{name}.npy")
+    try:
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path, allow_pickle=False)
+
+
+class SnapshotStore:
+    """
+    Snapshots + journal in one directory
+
+        store = SnapshotStore(MATCHER_SNAPSHOT_DIR)
+        state = store.load(meta)             # None -> cold start
+        for record in store.replay(): ...
+        store.append("offer", ride_id=1, ...)
+        store.write(state, meta)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.seq = self._current_seq()
+        self._journal = None
+
+    # Paths
+
+    def _snapshot_dir(self, seq):
+        return os.path.join(self.directory, f"snapshot-{seq:06d}")
+
+    def _journal_path(self, seq):
+        return os.path.join(self.directory, f"journal-{seq:06d}.ndjson")
+
+    def _current_seq(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT"), encoding="utf-8") as f:
+                return int(f.read().strip().rsplit("-", 1)[-1])
+        except (OSError, ValueError):
+            return 0
+
+    def _journal_seqs(self):
+        seqs = []
+        for name in os.listdir(self.directory):
+            if name.startswith("journal-") and name.endswith(".ndjson"):
+                try:
+                    seqs.append(int(name[len("journal-"):-len(".ndjson")]))
+                except ValueError:
+                    continue
+        return sorted(seqs)
+
+    # Load
+
+    def load(self, meta):
+        """
+        Latest snapshot as a dict of plain values / arrays, or None
+        None as well when it was written with another configuration (meta)
+        """
+        if not self.seq:
+            return None
+
+        directory = self._snapshot_dir(self.seq)
+        try:
+            with open(os.path.join(directory, "header.json"), encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f" Snapshot {self.seq} unreadable, cold start ({e})")
+            return None
+
+        if header.get("format") != SNAPSHOT_FORMAT or header.get("meta") != meta:
+            print(f" Snapshot {self.seq} written with another configuration, cold start")
+            return None
+
+        elapsed = max(0.0, time.time() - header["created_at"])
+
+        def rebase(entries):
+            return [entry[:-1] + (entry[-1] - elapsed,) for entry in entries]
+
+        index_arrays = {
+            name[len("index."):-len(".npy")]: _load(directory, name[:-len(".npy")])
+            for name in os.listdir(directory) if name.startswith("index.")
+        }
+        stats_arrays = {
+            name[len("stats."):-len(".npy")]: _load(directory, name[:-len(".npy")])
+            for name in os.listdir(directory) if name.startswith("stats.")
+        }
+
+        def ride_entries(name):
+            return [(int(r), float(v), float(t)) for r, v, t in _load(directory, name).tolist()]
+
+        return {
+            "created_at": header["created_at"],
+            "index": (index_arrays, header["regions"]),
+            "stats": stats_arrays,
+            "processed": rebase(ride_entries("processed")),
+            "closed": rebase(ride_entries("closed")),
+            "reservations": rebase([
+                (int(d), int(r), float(t)) for d, r, t in _load(directory, "reservations").tolist()
+            ]),
+            "exclusions": rebase([tuple(entry) for entry in header["exclusions"]]),
+            "timers": [(key, delay - elapsed, payload) for key, delay, payload in header["timers"]],
+        }
+
+    def replay(self):
+        """Journal records written since the loaded snapshot, oldest first"""
+        for seq in self._journal_seqs():
+            if seq < self.seq:
+                continue
+            with open(self._journal_path(seq), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash
+                        continue
+
+    # Journal
+
+    def append(self, kind, **data):
+        """Record one state change (flushed, not fsynced)"""
+        if self._journal is None:
+            self._journal = open(self._journal_path(max(self.seq, self._last_journal_seq())), "a", encoding="utf-8")
+        data.update(k=kind, t=time.time())
+        self._journal.write(json.dumps(data) + "\n")
+        self._journal.flush()
+
+    def _last_journal_seq(self):
+        seqs = self._journal_seqs()
+        return seqs[-1] if seqs else 0
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    # Write
+
+    def write(self, state, meta):
+        """
+        Write a new snapshot of `state`
+
+        state: dict with index (arrays, regions), stats (arrays) and the
+               dump() lists of processed, closed, reservations, exclusions, timers
+        """
+        seq = max(self.seq, self._last_journal_seq()) + 1
+
+        # New journal first: changes from now on belong to the new snapshot
+        self.close()
+        self._journal = open(self._journal_path(seq), "a", encoding="utf-8")
+
+        directory = self._snapshot_dir(seq)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+        index_arrays, regions = state["index"]
+        for name, array in index_arrays.items():
+            _save(directory, f"index.{name}", array)
+        for name, array in state["stats"].items():
+            _save(directory, f"stats.{name}", array)
+
+        def ride_entries(entries):
+            return np.array([e for e in entries if isinstance(e[0], int)], dtype=RIDE_ENTRY_DTYPE)
+
+        _save(directory, "processed", ride_entries(state["processed"]))
+        _save(directory, "closed", ride_entries(state["closed"]))
+        _save(directory, "reservations", np.array(
+            [e for e in state["reservations"] if isinstance(e[0], int) and isinstance(e[1], int)],
+            dtype=RESERVATION_DTYPE
+        ))
+
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "created_at": time.time(),
+            "meta": meta,
+            "regions": regions,
+            "exclusions": state["exclusions"],
+            "timers": state["timers"],
+        }
+        with open(os.path.join(directory, "header.json"), "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+        current_tmp = os.path.join(self.directory, "CURRENT.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(directory))
+        os.replace(current_tmp, os.path.join(self.directory, "CURRENT"))
+
+        # Older snapshots and journals are no longer needed
+        previous, self.seq = self.seq, seq
+        for old in range(previous, seq):
+            shutil.rmtree(self._snapshot_dir(old), ignore_errors=True)
+        for old in self._journal_seqs():
+            if old < seq:
+                os.remove(self._journal_path(old))
+
+        return seq
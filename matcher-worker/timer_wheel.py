@@ -0,0 +1,96 @@
+"""
+Hashed timer wheel
+O(1) schedule and cancel, expiry cost proportional to the timers that
+actually fire - sized for hundreds of thousands of pending offers.
+
+A timer due in N ticks goes to slot (current + N) % slots with
+N // slots remaining rounds; each tick only visits one slot.
+"""
+import time
+
+
+class TimerWheel:
+    """
+    Timers are identified by a hashable key (one timer per key)
+
+        wheel = TimerWheel(tick=1.0, slots=512)
+        wheel.schedule(ride_id, 60, payload)
+        wheel.cancel(ride_id)
+        for key, payload in wheel.advance():
+            ...
+    """
+
+    def __init__(self, tick=1.0, slots=512, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self._clock = clock
+        self._wheel = [{} for _ in range(slots)]
+        self._slot_of = {}
+        self._cursor = 0
+        self._last_tick = clock()
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def schedule(self, key, delay, payload=None):
+        """Schedule (or reschedule) the timer for key to fire after delay seconds"""
+        self.cancel(key)
+
+        # Account for time already elapsed since the last processed tick
+        elapsed = self._clock() - self._last_tick
+        ticks = max(1, int(-(-(delay + elapsed) // self.tick)))
+        slot = (self._cursor + ticks) % self.slots
+        rounds = (ticks - 1) // self.slots
+
+        self._wheel[slot][key] = [rounds, payload]
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        """Cancel a pending timer - returns its payload, or None if not pending"""
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return None
+        return self._wheel[slot].pop(key)[1]
+
+    def dump(self):
+        """[(key, seconds left, payload)] of every pending timer, for a snapshot"""
+        elapsed = self._clock() - self._last_tick
+        entries = []
+        for key, slot in self._slot_of.items():
+            rounds, payload = self._wheel[slot][key]
+            ticks = (slot - self._cursor - 1) % self.slots + 1 + rounds * self.slots
+            entries.append((key, max(0.0, ticks * self.tick - elapsed), payload))
+        return entries
+
+    def restore(self, entries):
+        """Reschedule dump() entries"""
+        for key, delay, payload in entries:
+            self.schedule(key, delay, payload)
+
+    def advance(self, now=None):
+        """
+        Process every tick elapsed up to now
+
+        Returns:
+            list: (key, payload) of the timers that fired
+        """
+        now = self._clock() if now is None else now
+        fired = []
+
+        while now - self._last_tick >= self.tick:
+            self._last_tick += self.tick
+            self._cursor = (self._cursor + 1) % self.slots
+            bucket = self._wheel[self._cursor]
+
+            for key, entry in list(bucket.items()):
+                if entry[0] > 0:
+                    entry[0] -= 1
+                    continue
+                del bucket[key]
+                del self._slot_of[key]
+                fired.append((key, entry[1]))
+
+        return fired
@@ -0,0 +1,128 @@
+"""
+Trace report - span trees of the TRACE_EXPORT files (see tracing.py)
+
+Shows where the time of a ride went, across ride-service, the matcher and
+the notification consumer: every span with its offset from the start of
+the trace and its duration, children indented under their parent. A
+consumer span under a publish span also shows the time the message waited
+in the queue.
+
+Usage:
+    python trace_report.py traces.ndjson --ride 12
+    python trace_report.py ride-service.ndjson matcher.ndjson --slowest 5
+    python trace_report.py traces.ndjson --ride 12 --no-sql
+
+Offsets compare clocks of different processes: across hosts they are only
+as good as the clock synchronization.
+"""
+import argparse
+from collections import defaultdict
+
+import shared  # noqa: F401
+from common import tracing
+
+
+def group_traces(records):
+    """{trace id: [span records]}"""
+    traces = defaultdict(list)
+    for record in records:
+        traces[record["trace_id"]].append(record)
+    return traces
+
+
+def end_of(record):
+    return record["start"] + record["duration_ms"] / 1000
+
+
+def trace_duration_ms(spans):
+    return (max(end_of(s) for s in spans) - min(s["start"] for s in spans)) * 1000
+
+
+def ride_ids(spans):
+    ids = set()
+    for s in spans:
+        attributes = s.get("attributes") or {}
+        if attributes.get("ride_id") is not None:
+            ids.add(attributes["ride_id"])
+        ids.update(attributes.get("ride_ids") or [])
+    return ids
+
+
+def describe(record):
+    attributes = " ".join(
+        f"{key}={value}" for key, value in (record.get("attributes") or {}).items()
+        if key != "sql"
+    )
+    sql = (record.get("attributes") or {}).get("sql")
+    text = f"{record['name']} {attributes}".rstrip()
+    if sql:
+        text += f"  {sql[:80]}"
+    if record.get("error"):
+        text += f"  ERROR {record['error']}"
+    return text
+
+
+def render(spans, show_sql=True):
+    """Lines of one trace, children under their parent by start time"""
+    by_id = {s["span_id"]: s for s in spans}
+    children = defaultdict(list)
+    roots = []
+    for s in spans:
+        # Parent in another process without export (auth-service) or lost: a root
+        if s.get("parent_id") in by_id:
+            children[s["parent_id"]].append(s)
+        else:
+            roots.append(s)
+
+    origin = min(s["start"] for s in spans)
+    lines = []
+
+    def walk(record, depth):
+        if not show_sql and record["name"] == "db.query":
+            return
+        offset = (record["start"] - origin) * 1000
+        line = f"{offset:>10.1f} ms {record['duration_ms']:>10.1f} ms  {'  ' * depth}{record['service']:<22} {describe(record)}"
+        parent = by_id.get(record.get("parent_id"))
+        if parent and parent["name"] == "rabbitmq.publish":
+            line += f"  (queued {(record['start'] - end_of(parent)) * 1000:.1f} ms)"
+        lines.append(line)
+        for child in sorted(children[record["span_id"]], key=lambda s: s["start"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s["start"]):
+        walk(root, 0)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Span trees of exported traces")
+    parser.add_argument("files", nargs="+", help="TRACE_EXPORT NDJSON files")
+    parser.add_argument("--ride", type=int, help="Traces of this ride")
+    parser.add_argument("--slowest", type=int, default=0, help="Longest N traces")
+    parser.add_argument("--no-sql", action="store_true", help="Hide db.query spans")
+    args = parser.parse_args()
+
+    traces = group_traces(tracing.load(args.files))
+    selected = list(traces.values())
+    if args.ride is not None:
+        selected = [spans for spans in selected if args.ride in ride_ids(spans)]
+    selected.sort(key=lambda spans: min(s["start"] for s in spans))
+    if args.slowest:
+        selected = sorted(selected, key=trace_duration_ms, reverse=True)[:args.slowest]
+
+    if not selected:
+        print("No matching trace")
+        return
+
+    for spans in selected:
+        services = sorted({s["service"] for s in spans})
+        rides = ", ".join(str(r) for r in sorted(ride_ids(spans)))
+        print(f"\nTrace {spans[0]['trace_id']}  rides [{rides}]  {trace_duration_ms(spans):.1f} ms  "
+              f"{len(spans)} spans  {', '.join(services)}")
+        print(f"{'offset':>13} {'duration':>13}")
+        for line in render(spans, show_sql=not args.no_sql):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 import requests
 from django.http import JsonResponse
 from django.conf import settings
+from prometheus_client import Counter, Histogram
+
+from common import tracing
 
 AUTH_VERIFY_URL = settings.AUTH_VERIFY_URL
 
+# Every authenticated request costs one Auth-Service call
+AUTH_VERIFY_SECONDS = Histogram(
+    "auth_verify_duration_seconds", "Auth-Service token verification call latency"
+)
+AUTH_VERIFY_RESULTS = Counter(
+    "auth_verify_results_total", "Auth-Service token verifications",
+    ["outcome"],  # valid, invalid, timeout, unreachable, error
+)
+
 EXCLUDED_PATHS = [
     "/admin",
     "/admin/",
@@ -70,22 +82,28 @@ def jwt_verification_middleware(get_response):
 
         # 6. Call Auth-Service to verify
         try:
-            response = requests.post(
-                AUTH_VERIFY_URL,
-                json={"token": token},
-                timeout=5
-            )
+            with AUTH_VERIFY_SECONDS.time(), tracing.span("auth-service verify") as current:
+                response = requests.post(
+                    AUTH_VERIFY_URL,
+                    json={"token": token},
+                    headers=tracing.inject({}),
+                    timeout=5
+                )
+                current.set(status=response.status_code)
         except requests.exceptions.Timeout:
+            AUTH_VERIFY_RESULTS.labels("timeout").inc()
             return JsonResponse({
                 "error": "Auth-Service timeout",
                 "detail": "Authentication service is not responding"
             }, status=503)
         except requests.exceptions.ConnectionError:
+            AUTH_VERIFY_RESULTS.labels("unreachable").inc()
             return JsonResponse({
                 "error": "Auth-Service unreachable",
                 "detail": "Cannot connect to authentication service"
             }, status=503)
         except Exception as e:
+            AUTH_VERIFY_RESULTS.labels("error").inc()
             return JsonResponse({
                 "error": "Auth-Service error",
                 "detail": str(e)
@@ -93,12 +111,14 @@ def jwt_verification_middleware(get_response):
 
         # 7. Token invalid
         if response.status_code != 200:
+            AUTH_VERIFY_RESULTS.labels("invalid").inc()
             return JsonResponse({
                 "error": "Invalid or expired token",
                 "detail": "Your authentication token is not valid"
             }, status=401)
 
         # 8. Attach user data from auth-service
+        AUTH_VERIFY_RESULTS.labels("valid").inc()
         user_data = response.json()
         request.user_data = user_data
         request.user_id = user_data.get("id")
@@ -0,0 +1,41 @@
+"""
+Tracing middleware: one span per request, one child span per SQL query
+
+The request span continues the trace of the caller's traceparent header
+(the matcher's internal API calls), so a ride's match shows up in the
+trace of the POST that created it. See common/tracing.py; off unless
+TRACE_EXPORT is set.
+"""
+from django.db import connection
+
+from common import tracing
+from common.metrics import view_name
+
+
+def query_span(execute, sql, params, many, context):
+    """connection.execute_wrapper: a span per query"""
+    with tracing.span("db.query", sql=sql[:200]):
+        return execute(sql, params, many, context)
+
+
+def tracing_middleware(get_response):
+    tracing.configure("ride-service")
+
+    def middleware(request):
+        if not tracing.enabled():
+            return get_response(request)
+
+        with tracing.span(f"{request.method} {request.path_info}",
+                          parent=request.headers.get(tracing.TRACEPARENT)) as current:
+            with connection.execute_wrapper(query_span):
+                response = get_response(request)
+
+            current.name = f"{request.method} {view_name(request)}"
+            current.set(status=response.status_code)
+            match = getattr(request, "resolver_match", None)
+            ride_id = str(match and (match.kwargs.get("ride_id") or match.kwargs.get("pk")))
+            if ride_id.isdigit():
+                current.set(ride_id=int(ride_id))
+        return response
+
+    return middleware
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from common.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -14,4 +15,7 @@ urlpatterns = [
     
     # Internal API routes (NO JWT required - for microservices)
     path("api/internal/", include("rides.internal_urls")),
+    
+    # Prometheus scrape endpoint (not routed by Traefik)
+    path("metrics", metrics_view, name="metrics"),
 ]
\ No newline at end of file
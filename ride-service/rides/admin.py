@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ride, Notification
+from .models import Ride, Notification, DriverReservation
 
 @admin.register(Ride)
 class RideAdmin(admin.ModelAdmin):
@@ -13,4 +13,10 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ("id", "user_id", "notification_type", "is_read", "created_at")
     list_filter = ("notification_type", "is_read")
     search_fields = ("user_id", "title", "message")
-    readonly_fields = ("created_at",)
\ No newline at end of file
+    readonly_fields = ("created_at",)
+
+@admin.register(DriverReservation)
+class DriverReservationAdmin(admin.ModelAdmin):
+    list_display = ("id", "driver", "ride", "created_at")
+    search_fields = ("driver",)
+    readonly_fields = ("created_at",)
@@ -8,6 +8,8 @@ import logging
 from functools import lru_cache
 from typing import Optional
 
+from common.memory_consul import consul_http
+
 logger = logging.getLogger(__name__)
 
 CONSUL_HOST = os.getenv('CONSUL_HOST', 'localhost')
@@ -44,7 +46,7 @@ def discover_service(service_name: str, fallback_url: Optional[str] = None) -> s
         
         logger.debug(f" Discovering service: {service_name}")
         
-        response = requests.get(catalog_url, timeout=3)
+        response = consul_http().get(catalog_url, timeout=3)
         
         if response.status_code == 200:
             services = response.json()
@@ -59,7 +61,7 @@ def discover_service(service_name: str, fallback_url: Optional[str] = None) -> s
                     health_url = f"{consul_url}/v1/health/service/{service_name}?passing=true"
                     
                     try:
-                        health_resp = requests.get(health_url, timeout=2)
+                        health_resp = consul_http().get(health_url, timeout=2)
                         if health_resp.status_code == 200:
                             health_data = health_resp.json()
                             
@@ -125,7 +127,7 @@ def discover_all_instances(service_name: str) -> list:
         consul_url = _get_consul_url()
         catalog_url = f"{consul_url}/v1/catalog/service/{service_name}"
         
-        response = requests.get(catalog_url, timeout=3)
+        response = consul_http().get(catalog_url, timeout=3)
         
         if response.status_code == 200:
             services = response.json()
@@ -154,7 +156,7 @@ def is_consul_available() -> bool:
     """
     try:
         consul_url = _get_consul_url()
-        response = requests.get(f"{consul_url}/v1/status/leader", timeout=2)
+        response = consul_http().get(f"{consul_url}/v1/status/leader", timeout=2)
         return response.status_code == 200
     except:
         return False
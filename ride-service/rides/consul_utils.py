@@ -2,10 +2,11 @@
 Consul Service Registry pour Ride-Service
 """
 import os
-import requests
 import atexit
 import logging
 
+from common.memory_consul import consul_http
+
 logger = logging.getLogger(__name__)
 
 CONSUL_HOST = os.getenv('CONSUL_HOST', 'localhost')
@@ -41,7 +42,7 @@ def register_service():
     
     try:
         url = f"http://{CONSUL_HOST}:{CONSUL_PORT}/v1/agent/service/register"
-        response = requests.put(url, json=service_data, timeout=5)
+        response = consul_http().put(url, json=service_data, timeout=5)
         
         if response.status_code == 200:
             logger.info(f"Ride-Service enregistré dans Consul: {service_id}")
@@ -62,7 +63,7 @@ def deregister_service(service_id):
     """
     try:
         url = f"http://{CONSUL_HOST}:{CONSUL_PORT}/v1/agent/service/deregister/{service_id}"
-        requests.put(url, timeout=3)
+        consul_http().put(url, timeout=3)
         logger.info(f" Ride-Service désenregistré de Consul: {service_id}")
     except Exception as e:
         logger.warning(f" Erreur désenregistrement: {e}")
\ No newline at end of file
@@ -4,12 +4,22 @@ Internal API routes for microservice-to-microservice communication
 from django.urls import path
 from .internal_views import (
     internal_assign_driver,
+    internal_assign_drivers_bulk,
+    internal_broadcast_offer,
+    internal_pool_offer,
     internal_get_ride,
-    internal_update_status
+    internal_update_status,
+    internal_release_driver,
+    internal_latency_report
 )
 
 urlpatterns = [
+    path('rides/assign-drivers/', internal_assign_drivers_bulk, name='internal-assign-drivers-bulk'),
+    path('rides/pool-offer/', internal_pool_offer, name='internal-pool-offer'),
+    path('rides/latency/', internal_latency_report, name='internal-latency-report'),
     path('rides/<int:ride_id>/assign-driver/', internal_assign_driver, name='internal-assign-driver'),
     path('rides/<int:ride_id>/', internal_get_ride, name='internal-get-ride'),
     path('rides/<int:ride_id>/update-status/', internal_update_status, name='internal-update-status'),
+    path('rides/<int:ride_id>/broadcast-offer/', internal_broadcast_offer, name='internal-broadcast-offer'),
+    path('rides/<int:ride_id>/release-driver/', internal_release_driver, name='internal-release-driver'),
 ]
\ No newline at end of file
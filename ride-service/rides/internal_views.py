@@ -7,14 +7,46 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
 
 from .models import Ride
 from .serializers import RideSerializer
 from .notification_service import NotificationService
+from .latency import latency_report
+from .reservations import (
+    RESERVE_OK,
+    RESERVE_DRIVER_BUSY,
+    ACTIVE_STATUSES,
+    reserve_driver,
+    reserve_drivers,
+    broadcast_offer,
+    offer_pool,
+    release_finished_ride,
+    release_expired_offer,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upper bound for one bulk assignment request
+MAX_BULK_ASSIGNMENTS = 500
+# Upper bound for the drivers of one broadcast offer
+MAX_BROADCAST_DRIVERS = 20
+# Upper bound for the rides sharing one vehicle
+MAX_POOL_RIDES = 4
+
+
+def _id_list(value):
+    """Distinct ids of a JSON list of integers, in order; [] if value is not one"""
+    if not isinstance(value, list):
+        return []
+    try:
+        return list(dict.fromkeys(int(item) for item in value))
+    except (TypeError, ValueError):
+        return []
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])  # No JWT required for internal calls
@@ -25,46 +57,256 @@ def internal_assign_driver(request, ride_id):
     POST /api/internal/rides/{ride_id}/assign-driver/
     Body: {"driver_id": 105}
     
+    The driver is reserved atomically: 409 "driver_busy" if the driver already
+    holds a reservation, 400 "ride_unavailable" if the ride left 'requested'.
+    
     This bypasses authentication for internal microservice communication
     """
     logger.info(f" Internal API call: assign driver to ride {ride_id}")
     
-    # Get ride
+    # Get driver_id from request
+    try:
+        driver_id = int(request.data.get('driver_id'))
+    except (TypeError, ValueError):
+        return Response(
+            {"detail": "driver_id must be an integer"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Reserve driver + conditional update requested -> offered
+    outcome = reserve_driver(ride_id, driver_id)
+    
+    if outcome == RESERVE_DRIVER_BUSY:
+        return Response(
+            {
+                "detail": f"Driver {driver_id} is already reserved",
+                "reason": RESERVE_DRIVER_BUSY
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
     ride = get_object_or_404(Ride, pk=ride_id)
     
-    # Validate ride status
-    if ride.status != Ride.STATUS_REQUESTED:
+    if outcome != RESERVE_OK:
         return Response(
             {
                 "detail": "Ride is not in requested state",
+                "reason": outcome,
                 "current_status": ride.status
             },
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get driver_id from request
-    driver_id = request.data.get('driver_id')
-    if not driver_id:
+    logger.info(f" Ride {ride_id} assigned to driver {driver_id}")
+    
+    # Create notification for driver
+    NotificationService.notify_ride_offered(ride)
+    
+    return Response(
+        {
+            "success": True,
+            "ride": RideSerializer(ride).data,
+            "message": f"Driver {driver_id} assigned to ride {ride_id}"
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def internal_assign_drivers_bulk(request):
+    """
+    Internal endpoint for a batched matcher: many assignments, one round trip
+    
+    POST /api/internal/rides/assign-drivers/
+    Body: {"assignments": [{"ride_id": 1, "driver_id": 105}, ...]}
+    
+    Applied in one transaction with conditional updates; each ride gets its
+    own outcome: assigned, driver_busy, ride_unavailable, not_found,
+    duplicate (ride or driver already in the batch) or invalid.
+    Driver notifications are written with a single bulk insert.
+    """
+    assignments = request.data.get('assignments')
+    if not isinstance(assignments, list) or not assignments:
         return Response(
-            {"detail": "driver_id is required"},
+            {"detail": "assignments must be a non-empty list"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Update ride
-    ride.driver = driver_id
-    ride.status = Ride.STATUS_OFFERED
-    ride.save()
+    if len(assignments) > MAX_BULK_ASSIGNMENTS:
+        return Response(
+            {"detail": f"At most {MAX_BULK_ASSIGNMENTS} assignments per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    logger.info(f" Ride {ride_id} assigned to driver {driver_id}")
+    logger.info(f" Internal API call: bulk assign {len(assignments)} rides")
     
-    # Create notification for driver
-    NotificationService.notify_ride_offered(ride)
+    # Validate entries - one assignment per ride and per driver
+    results = []
+    valid = []
+    seen_rides, seen_drivers = set(), set()
+    for item in assignments:
+        try:
+            ride_id = int(item.get('ride_id'))
+            driver_id = int(item.get('driver_id'))
+        except (AttributeError, TypeError, ValueError):
+            results.append({"ride_id": None, "driver_id": None, "outcome": "invalid"})
+            continue
+        
+        result = {"ride_id": ride_id, "driver_id": driver_id, "outcome": "duplicate"}
+        results.append(result)
+        if ride_id in seen_rides or driver_id in seen_drivers:
+            continue
+        seen_rides.add(ride_id)
+        seen_drivers.add(driver_id)
+        valid.append((ride_id, driver_id))
+        result["outcome"] = None
+    
+    outcomes = reserve_drivers(valid) if valid else {}
+    
+    for result in results:
+        if result["outcome"] is None:
+            outcome = outcomes[result["ride_id"]]
+            result["outcome"] = "assigned" if outcome == RESERVE_OK else outcome
+    
+    # Notify drivers of the assigned rides (one SELECT, one INSERT)
+    assigned_ids = [ride_id for ride_id, outcome in outcomes.items() if outcome == RESERVE_OK]
+    rides = list(Ride.objects.filter(pk__in=assigned_ids))
+    NotificationService.notify_rides_offered(rides)
+    
+    logger.info(f" Bulk assign: {len(rides)}/{len(assignments)} rides assigned")
+    
+    return Response(
+        {
+            "success": True,
+            "assigned": len(rides),
+            "results": results
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def internal_broadcast_offer(request, ride_id):
+    """
+    Internal endpoint to offer one ride to several drivers at once
+    
+    POST /api/internal/rides/{ride_id}/broadcast-offer/
+    Body: {"driver_ids": [101, 102, 103]}
+    
+    Free drivers are reserved (busy ones skipped) and the ride moves to
+    'offered' without a driver; the first driver to accept wins.
+    409 "driver_busy" if every driver is already reserved,
+    400 "ride_unavailable" if the ride left 'requested'.
+    """
+    driver_ids = _id_list(request.data.get('driver_ids'))
+    
+    if not driver_ids or len(driver_ids) > MAX_BROADCAST_DRIVERS:
+        return Response(
+            {"detail": f"driver_ids must be a list of 1 to {MAX_BROADCAST_DRIVERS} driver ids"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    logger.info(f" Internal API call: broadcast ride {ride_id} to drivers {driver_ids}")
+    
+    outcome, offered = broadcast_offer(ride_id, driver_ids)
+    
+    if outcome == RESERVE_DRIVER_BUSY:
+        return Response(
+            {
+                "detail": "All drivers are already reserved",
+                "reason": RESERVE_DRIVER_BUSY
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    ride = get_object_or_404(Ride, pk=ride_id)
+    
+    if outcome != RESERVE_OK:
+        return Response(
+            {
+                "detail": "Ride is not in requested state",
+                "reason": outcome,
+                "current_status": ride.status
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    NotificationService.notify_ride_broadcast(ride, offered)
+    
+    logger.info(f" Ride {ride_id} broadcast to {len(offered)} drivers")
     
     return Response(
         {
             "success": True,
             "ride": RideSerializer(ride).data,
-            "message": f"Driver {driver_id} assigned to ride {ride_id}"
+            "driver_ids": offered
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def internal_pool_offer(request):
+    """
+    Internal endpoint to offer pooled rides to one driver
+    
+    POST /api/internal/rides/pool-offer/
+    Body: {"ride_ids": [12, 15], "driver_id": 105}
+    
+    The first ride is the pool id and carries the driver reservation; all
+    rides (opted in with pool=true) move to 'offered' together or none does.
+    409 "driver_busy" if the driver already holds a reservation,
+    400 "ride_unavailable" if one of the rides left 'requested'.
+    """
+    ride_ids = _id_list(request.data.get('ride_ids'))
+    try:
+        driver_id = int(request.data.get('driver_id'))
+    except (TypeError, ValueError):
+        driver_id = None
+    
+    if driver_id is None or not 2 <= len(ride_ids) <= MAX_POOL_RIDES:
+        return Response(
+            {"detail": f"driver_id and 2 to {MAX_POOL_RIDES} ride_ids are required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    logger.info(f" Internal API call: pool rides {ride_ids} for driver {driver_id}")
+    
+    outcome = offer_pool(ride_ids, driver_id)
+    
+    if outcome == RESERVE_DRIVER_BUSY:
+        return Response(
+            {
+                "detail": f"Driver {driver_id} is already reserved",
+                "reason": RESERVE_DRIVER_BUSY
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    rides = list(Ride.objects.filter(pk__in=ride_ids).order_by("id"))
+    
+    if outcome != RESERVE_OK:
+        return Response(
+            {
+                "detail": "Rides are not all in requested state",
+                "reason": outcome,
+                "current_status": {ride.id: ride.status for ride in rides}
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    NotificationService.notify_rides_offered(rides)
+    
+    logger.info(f" Pool {ride_ids} offered to driver {driver_id}")
+    
+    return Response(
+        {
+            "success": True,
+            "pool_id": ride_ids[0],
+            "rides": RideSerializer(rides, many=True).data
         },
         status=status.HTTP_200_OK
     )
@@ -108,9 +350,13 @@ def internal_update_status(request, ride_id):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    ride.status = new_status
+    ride.set_status(new_status)
     ride.save()
     
+    # Free the driver once the ride no longer holds them
+    if new_status not in ACTIVE_STATUSES:
+        release_finished_ride(ride)
+    
     logger.info(f"Ride {ride_id} status updated to {new_status}")
     
     return Response(
@@ -119,4 +365,80 @@ def internal_update_status(request, ride_id):
             "ride": RideSerializer(ride).data
         },
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def internal_release_driver(request, ride_id):
+    """
+    Internal endpoint to withdraw an unanswered offer (offer timeout)
+    
+    POST /api/internal/rides/{ride_id}/release-driver/
+    Body: {"driver_id": 105} or {"driver_ids": [101, 102]} (broadcast offer)
+    
+    Resets the ride to 'requested' only if it is still offered to one of
+    those drivers, and releases the driver reservations. For a pooled ride
+    every ride of the pool still offered to the drivers is reset.
+    """
+    if 'driver_ids' in request.data:
+        driver_ids = _id_list(request.data.get('driver_ids'))
+    else:
+        driver_ids = _id_list([request.data.get('driver_id')])
+    if not driver_ids:
+        return Response(
+            {"detail": "driver_id or driver_ids (a list of driver ids) is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    released = release_expired_offer(ride_id, driver_ids)
+    ride = get_object_or_404(Ride, pk=ride_id)
+    
+    if not released:
+        return Response(
+            {
+                "detail": f"Ride is not offered to drivers {driver_ids}",
+                "current_status": ride.status
+            },
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    logger.info(f" Ride {ride_id} offer to drivers {driver_ids} expired, drivers released")
+    
+    # versions let the caller requeue the rides with an up-to-date ride.requested
+    versions = {str(r.id): r.version for r in Ride.objects.filter(pk__in=released)}
+    return Response(
+        {
+            "success": True,
+            "version": ride.version,
+            "versions": versions,
+            "message": f"Drivers {driver_ids} released from ride {ride_id}"
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def internal_latency_report(request):
+    """
+    Ride lifecycle latency percentiles and SLOs (see rides/latency.py)
+    
+    GET /api/internal/rides/latency/?hours=24
+    GET /api/internal/rides/latency/?since=2026-03-01T00:00:00Z&until=2026-03-02T00:00:00Z
+    """
+    try:
+        until = parse_datetime(request.query_params['until']) if 'until' in request.query_params else timezone.now()
+        since = (
+            parse_datetime(request.query_params['since']) if 'since' in request.query_params
+            else until - timedelta(hours=float(request.query_params.get('hours', 24)))
+        )
+    except ValueError:
+        since = until = None
+    
+    if since is None or until is None:
+        return Response(
+            {"detail": "since / until must be ISO 8601 datetimes, hours a number"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(latency_report(since, until))
@@ -0,0 +1,101 @@
+"""
+Ride lifecycle latency: percentiles of each phase over a time window
+
+A phase runs from one transition timestamp of Ride to a later one. A ride
+counts in the window its phase ended in, so every phase is read with a
+range scan on the index of its end timestamp:
+
+    request_to_offer    created_at  -> offered_at     matching (last offer of a rematched ride)
+    offer_to_accept     offered_at  -> accepted_at    driver answer
+    request_to_accept   created_at  -> accepted_at    what the passenger waits
+    trip                accepted_at -> completed_at
+    request_to_cancel   created_at  -> cancelled_at
+
+SLO targets come from RIDE_LATENCY_SLOS ("request_to_accept.p95=120,..."
+in seconds, see settings).
+"""
+from django.conf import settings
+
+from .models import Ride
+
+PHASES = {
+    "request_to_offer": ("created_at", "offered_at"),
+    "offer_to_accept": ("offered_at", "accepted_at"),
+    "request_to_accept": ("created_at", "accepted_at"),
+    "trip": ("accepted_at", "completed_at"),
+    "request_to_cancel": ("created_at", "cancelled_at"),
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_slos(value):
+    """ "request_to_accept.p95=120,trip.p50=900" -> {("request_to_accept", "p95"): 120.0, ...} """
+    slos = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        key, _, target = item.partition("=")
+        phase, _, percentile = key.strip().partition(".")
+        if phase not in PHASES or percentile not in {f"p{p}" for p in PERCENTILES}:
+            raise ValueError(f"Unknown SLO '{key.strip()}' (phase.p50 / p90 / p95 / p99)")
+        slos[(phase, percentile)] = float(target)
+    return slos
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values"""
+    return values[min(len(values) - 1, max(0, -(-len(values) * p // 100) - 1))]
+
+
+def phase_durations(phase, since, until):
+    """Sorted durations (seconds) of the phase for the rides it ended for in [since, until)"""
+    start_field, end_field = PHASES[phase]
+    rows = (
+        Ride.objects.filter(**{
+            f"{end_field}__gte": since,
+            f"{end_field}__lt": until,
+            f"{start_field}__isnull": False,
+        })
+        .values_list(start_field, end_field)
+        .iterator(chunk_size=2000)
+    )
+    return sorted(max(0.0, (end - start).total_seconds()) for start, end in rows)
+
+
+def latency_report(since, until, slos=None):
+    """
+    Percentiles of every phase, and the SLOs met or missed
+
+    Returns:
+        dict: {"since", "until", "phases": {phase: {"count", "p50", ..., "max"}},
+               "slos": [{"phase", "percentile", "target", "actual", "met"}]}
+    """
+    slos = parse_slos(settings.RIDE_LATENCY_SLOS) if slos is None else slos
+
+    phases = {}
+    for phase in PHASES:
+        durations = phase_durations(phase, since, until)
+        stats = {"count": len(durations)}
+        for p in PERCENTILES:
+            stats[f"p{p}"] = round(percentile(durations, p), 3) if durations else None
+        stats["max"] = round(durations[-1], 3) if durations else None
+        phases[phase] = stats
+
+    results = []
+    for (phase, p), target in slos.items():
+        actual = phases[phase][p]
+        results.append({
+            "phase": phase,
+            "percentile": p,
+            "target": target,
+            "actual": actual,
+            # No ride in the window: nothing missed
+            "met": actual is None or actual <= target,
+        })
+
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "phases": phases,
+        "slos": results,
+    }
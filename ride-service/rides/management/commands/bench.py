@@ -0,0 +1,122 @@
+"""
+python manage.py bench [--rows 1000] [--save baseline.json] [--compare baseline.json]
+
+Micro-benchmarks of the ride-service hot paths (runner: tools/microbench.py).
+Runs on a throwaway test database, RabbitMQ is the in-process broker and the
+Auth-Service verify call returns a canned user: only this service's code is timed.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from ride_service import auth_middleware
+from rides import rabbitmq
+from rides.models import Notification, Ride
+from rides.notification_service import NotificationService
+from rides.serializers import NotificationSerializer, RideSerializer
+from tools import microbench
+
+suite = microbench.Suite()
+
+
+class VerifiedToken:
+    """Auth-Service stand-in: every token is passenger 1"""
+
+    exceptions = auth_middleware.requests.exceptions
+    status_code = 200
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        return self
+
+    def json(self):
+        return {"id": 1, "email": "passenger@taxi.com", "role": "passager"}
+
+
+@suite.case("jwt_verification_middleware")
+def bench_middleware(options):
+    auth_middleware.requests = VerifiedToken()
+    middleware = auth_middleware.jwt_verification_middleware(lambda request: HttpResponse())
+    request = RequestFactory().get("/api/rides/", HTTP_AUTHORIZATION="Bearer " + "x" * 240)
+    return lambda: middleware(request)
+
+
+@suite.case("RideSerializer.many")
+def bench_ride_serializer(options):
+    rides = Ride.objects.order_by("id")[:options["rows"]]
+    return lambda: RideSerializer(rides, many=True).data
+
+
+@suite.case("NotificationSerializer.many")
+def bench_notification_serializer(options):
+    notifications = Notification.objects.order_by("id")[:options["rows"]]
+    return lambda: NotificationSerializer(notifications, many=True).data
+
+
+@suite.case("publish_message")
+def bench_publish_message(options):
+    rabbitmq.RABBITMQ_URL = "memory://bench"
+    message = {"ride_id": 1, "passenger_id": 1, "origin": "Main St", "destination": "Oak Ave"}
+    return lambda: rabbitmq.publish_message("ride.accepted", message, exchange=rabbitmq.RIDE_EVENTS_EXCHANGE)
+
+
+@suite.case("NotificationService.notify_ride_requested")
+def bench_notify_ride_requested(options):
+    ride = Ride.objects.first()
+    return lambda: NotificationService.notify_ride_requested(ride)
+
+
+@suite.case("NotificationService.notify_ride_completed")
+def bench_notify_ride_completed(options):
+    ride = Ride.objects.exclude(driver=None).first()
+    return lambda: NotificationService.notify_ride_completed(ride)
+
+
+@suite.case("NotificationService.notify_ride_broadcast")
+def bench_notify_ride_broadcast(options):
+    ride = Ride.objects.first()
+    return lambda: NotificationService.notify_ride_broadcast(ride, [101, 102, 103, 104, 105])
+
+
+def create_rows(count):
+    """count rides (one in two with a driver) and one notification per ride"""
+    rides = Ride.objects.bulk_create(
+        Ride(
+            passenger=1000 + n,
+            driver=101 + n % 5 if n % 2 else None,
+            origin=f"{n} Main St",
+            destination=f"{n} Oak Ave",
+            status=Ride.STATUS_ACCEPTED if n % 2 else Ride.STATUS_REQUESTED,
+        )
+        for n in range(count)
+    )
+    Notification.objects.bulk_create(
+        Notification(
+            user_id=ride.passenger,
+            ride=ride,
+            notification_type="ride_requested",
+            title="Ride Request Received",
+            message=f"Your ride from {ride.origin} to {ride.destination} has been requested.",
+        )
+        for ride in rides
+    )
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmarks of the ride-service hot paths, with a stored baseline"
+
+    def add_arguments(self, parser):
+        microbench.add_arguments(parser)
+        parser.add_argument("--rows", type=int, default=1000, help="Rides / notifications serialized")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            create_rows(options["rows"])
+            regressions = microbench.execute(suite, options, self.stdout.write)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
@@ -0,0 +1,74 @@
+"""
+python manage.py latency_report [--hours 24] [--since ISO] [--until ISO] [--json]
+
+Percentiles of the ride lifecycle phases over a time window (see
+rides/latency.py), checked against RIDE_LATENCY_SLOS: fails (exit code 1)
+when an SLO is missed. Same data as GET /api/internal/rides/latency/.
+"""
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rides.latency import PERCENTILES, latency_report, parse_slos
+
+
+def datetime_arg(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+def seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+class Command(BaseCommand):
+    help = "Ride lifecycle latency percentiles over a time window, checked against the SLOs"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24, help="Window ending now (or at --until)")
+        parser.add_argument("--since", type=datetime_arg, help="Window start (ISO 8601)")
+        parser.add_argument("--until", type=datetime_arg, help="Window end (ISO 8601)")
+        parser.add_argument("--slo", help="SLOs instead of RIDE_LATENCY_SLOS (request_to_accept.p95=120,...)")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        until = options["until"] or timezone.now()
+        since = options["since"] or until - timedelta(hours=options["hours"])
+        try:
+            slos = parse_slos(options["slo"]) if options["slo"] is not None else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = latency_report(since, until, slos)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_report(report)
+
+        missed = [f"{slo['phase']}.{slo['percentile']}" for slo in report["slos"] if not slo["met"]]
+        if missed:
+            raise CommandError(f"{len(missed)} SLO(s) missed: {', '.join(missed)}")
+
+    def write_report(self, report):
+        self.stdout.write(f"Rides from {report['since']} to {report['until']}\n")
+        columns = [f"p{p}" for p in PERCENTILES] + ["max"]
+        self.stdout.write(f"{'Phase':<20} {'rides':>7}  " + "  ".join(f"{c:>9}" for c in columns))
+        for phase, stats in report["phases"].items():
+            self.stdout.write(
+                f"{phase:<20} {stats['count']:>7}  " + "  ".join(f"{seconds(stats[c]):>9}" for c in columns)
+            )
+
+        if report["slos"]:
+            self.stdout.write("\nSLOs")
+        for slo in report["slos"]:
+            verdict = "ok" if slo["met"] else "MISSED"
+            self.stdout.write(
+                f"{slo['phase'] + '.' + slo['percentile']:<24} target {seconds(slo['target']):>9}  "
+                f"actual {seconds(slo['actual']):>9}  {verdict}"
+            )
@@ -0,0 +1,187 @@
+"""
+python manage.py query_budget [--sizes 1 10 100] [--sql]
+
+SQL queries issued per endpoint, at several data sizes (rides / notifications
+of the user). Fails when an endpoint issues more queries than its budget, or
+more queries with more data (N+1). Runs on a throwaway test database, RabbitMQ
+is the in-process broker and bearer tokens "<role>:<id>" are accepted as is.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from ride_service import auth_middleware
+from rides import rabbitmq
+from rides.models import DriverReservation, Notification, Ride
+from rides.reservations import reserve_driver
+from tools import microbench
+
+PASSENGER = 1
+DRIVER = 101
+
+
+class TokenUser:
+    """Auth-Service stand-in: token "<role>:<id>" is that user"""
+
+    exceptions = auth_middleware.requests.exceptions
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        role, _, user_id = json["token"].partition(":")
+        return VerifiedUser({"id": int(user_id), "email": f"{role}{user_id}@taxi.com", "role": role})
+
+
+class VerifiedUser:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def create_rides(count, **fields):
+    fields = {"passenger": PASSENGER, "origin": "Main St", "destination": "Oak Ave", **fields}
+    return Ride.objects.bulk_create(Ride(**fields) for _ in range(count))
+
+
+def create_notifications(rides, user_id=PASSENGER, per_ride=1):
+    Notification.objects.bulk_create(
+        Notification(user_id=user_id, ride=ride, notification_type="ride_requested",
+                     title="Ride Request Received", message="Searching for a driver...")
+        for ride in rides
+        for _ in range(per_ride)
+    )
+
+
+# Request setups: size is the amount of data the response or the view walks through
+
+def rides_list_passenger(size):
+    create_rides(size)
+    return "get", "/api/rides/", f"passager:{PASSENGER}", None, 200
+
+
+def rides_list_driver(size):
+    create_rides(size, driver=DRIVER, status=Ride.STATUS_ACCEPTED)
+    return "get", "/api/rides/", f"chauffeur:{DRIVER}", None, 200
+
+
+def rides_create(size):
+    create_notifications(create_rides(size))
+    return "post", "/api/rides/", f"passager:{PASSENGER}", {"origin": "Main St", "destination": "Oak Ave"}, 201
+
+
+def rides_accept(size):
+    create_rides(size, driver=DRIVER + 1, status=Ride.STATUS_COMPLETED)
+    ride = create_rides(1)[0]
+    reserve_driver(ride.id, DRIVER)
+    return "post", f"/api/rides/{ride.id}/accept/", f"chauffeur:{DRIVER}", None, 200
+
+
+def rides_status(size):
+    ride = create_rides(1)[0]
+    create_notifications([ride], per_ride=size)
+    return "get", f"/api/rides/{ride.id}/status/", f"passager:{PASSENGER}", None, 200
+
+
+def notifications_list(size):
+    create_notifications(create_rides(size))
+    return "get", "/api/notifications/", f"passager:{PASSENGER}", None, 200
+
+
+def notifications_poll(size):
+    create_notifications(create_rides(size))
+    return "get", "/api/notifications/poll/", f"passager:{PASSENGER}", None, 200
+
+
+def notifications_unread(size):
+    create_notifications(create_rides(size))
+    return "get", "/api/notifications/unread/", f"passager:{PASSENGER}", None, 200
+
+
+def internal_assign(size):
+    create_rides(size, driver=DRIVER + 1, status=Ride.STATUS_COMPLETED)
+    ride = create_rides(1)[0]
+    return "post", f"/api/internal/rides/{ride.id}/assign-driver/", None, {"driver_id": DRIVER}, 200
+
+
+# Endpoint -> (query budget, setup); BEGIN / COMMIT count as queries
+ENDPOINTS = {
+    "GET /api/rides/ (passenger)": (1, rides_list_passenger),
+    "GET /api/rides/ (driver)": (1, rides_list_driver),
+    "POST /api/rides/": (2, rides_create),
+    "POST /api/rides/{id}/accept/": (8, rides_accept),
+    "GET /api/rides/{id}/status/": (2, rides_status),
+    "GET /api/notifications/": (1, notifications_list),
+    "GET /api/notifications/poll/": (1, notifications_poll),
+    "GET /api/notifications/unread/": (1, notifications_unread),
+    "POST /api/internal/rides/{id}/assign-driver/": (9, internal_assign),
+}
+
+
+def count_queries(setup, size):
+    """Queries of one request on fresh data, and their SQL"""
+    Ride.objects.all().delete()
+    DriverReservation.objects.all().delete()
+    method, path, token, body, expected = setup(size)
+
+    client = Client()
+    headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+    with microbench.quiet(), CaptureQueriesContext(connection) as queries:
+        if method == "post":
+            response = client.post(path, data=json.dumps(body or {}), content_type="application/json", **headers)
+        else:
+            response = client.get(path, **headers)
+    if response.status_code != expected:
+        raise CommandError(f"{method.upper()} {path}: {response.status_code} (expected {expected}) {response.content[:200]}")
+    return len(queries), [query["sql"] for query in queries.captured_queries]
+
+
+class Command(BaseCommand):
+    help = "Check the SQL queries per endpoint against their budget, at several data sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100])
+        parser.add_argument("--only", nargs="+", help="Endpoint name prefixes to check")
+        parser.add_argument("--sql", action="store_true", help="Print the queries of failing endpoints")
+
+    def handle(self, *args, **options):
+        auth_middleware.requests = TokenUser()
+        rabbitmq.RABBITMQ_URL = "memory://query-budget"
+        sizes = sorted(options["sizes"])
+
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            failures = self.check_endpoints(sizes, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if failures:
+            raise CommandError(f"{len(failures)} endpoint(s) over budget: {', '.join(failures)}")
+
+    def check_endpoints(self, sizes, options):
+        self.stdout.write(f"{'Endpoint':<46} {'budget':>6}  " + "  ".join(f"{f'n={n}':>6}" for n in sizes))
+        failures = []
+        for name, (budget, setup) in ENDPOINTS.items():
+            if options["only"] and not any(name.startswith(prefix) for prefix in options["only"]):
+                continue
+            counts, sql = zip(*(count_queries(setup, size) for size in sizes))
+
+            problems = []
+            if max(counts) > budget:
+                problems.append("over budget")
+            if counts[-1] > counts[0]:
+                problems.append("grows with size")
+            line = f"{name:<46} {budget:>6}  " + "  ".join(f"{count:>6}" for count in counts)
+            self.stdout.write(line + (f"  FAIL ({', '.join(problems)})" if problems else "  ok"))
+
+            if problems:
+                failures.append(name)
+                if options["sql"]:
+                    for query in sql[-1]:
+                        self.stdout.write(f"    {query[:200]}")
+        return failures
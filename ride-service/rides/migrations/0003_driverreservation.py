@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0002_alter_ride_options_alter_ride_driver_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver', models.IntegerField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='rides.ride')),
+            ],
+        ),
+    ]
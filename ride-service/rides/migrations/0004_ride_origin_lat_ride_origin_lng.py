@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0003_driverreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='origin_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='origin_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
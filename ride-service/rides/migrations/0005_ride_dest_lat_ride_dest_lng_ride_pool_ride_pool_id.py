@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0004_ride_origin_lat_ride_origin_lng'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dest_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='dest_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pool',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pool_id',
+            field=models.IntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0005_ride_dest_lat_ride_dest_lng_ride_pool_ride_pool_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='accepted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='offered_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Ride(models.Model):
     STATUS_REQUESTED = "requested"
@@ -20,14 +21,68 @@ class Ride(models.Model):
     driver = models.IntegerField(null=True, blank=True)
     origin = models.CharField(max_length=255)
     destination = models.CharField(max_length=255)
+    # Optional pickup coordinates - used by the matcher to rank drivers by distance
+    origin_lat = models.FloatField(null=True, blank=True)
+    origin_lng = models.FloatField(null=True, blank=True)
+    # Optional drop-off coordinates - required for pooling (direction, detour)
+    dest_lat = models.FloatField(null=True, blank=True)
+    dest_lng = models.FloatField(null=True, blank=True)
+    # Passenger agreed to share the vehicle with compatible rides
+    pool = models.BooleanField(default=False)
+    # Id of the first ride of the pool this ride was matched into (shared driver)
+    pool_id = models.IntegerField(null=True, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_REQUESTED)
     price = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Time of the last move into each status (a rematched ride keeps its last offer),
+    # indexed for the range scans of the latency report (rides/latency.py)
+    offered_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    accepted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    TRANSITION_FIELDS = {
+        STATUS_OFFERED: "offered_at",
+        STATUS_ACCEPTED: "accepted_at",
+        STATUS_COMPLETED: "completed_at",
+        STATUS_CANCELLED: "cancelled_at",
+    }
 
     def __str__(self):
         return f"Ride {self.id} – {self.status}"
+
+    def set_status(self, status):
+        """Move to status and stamp the transition time (saved by the caller)"""
+        self.status = status
+        field = self.TRANSITION_FIELDS.get(status)
+        if field:
+            setattr(self, field, timezone.now())
+
+    @property
+    def version(self):
+        """
+        Changes on every save (microseconds of updated_at)
+        Sent with ride.requested so the matcher can drop duplicate/stale messages
+        """
+        if not self.updated_at:
+            return 0
+        return int(self.updated_at.timestamp() * 1_000_000)
+
+    @property
+    def pickup(self):
+        """[lat, lng] of the pickup point, or None if unknown"""
+        if self.origin_lat is None or self.origin_lng is None:
+            return None
+        return [self.origin_lat, self.origin_lng]
+
+    @property
+    def dropoff(self):
+        """[lat, lng] of the drop-off point, or None if unknown"""
+        if self.dest_lat is None or self.dest_lng is None:
+            return None
+        return [self.dest_lat, self.dest_lng]
     
 
 class Notification(models.Model):
@@ -61,3 +116,17 @@ class Notification(models.Model):
     def __str__(self):
         return f"Notification for User {self.user_id} - {self.notification_type}"
 
+
+
+class DriverReservation(models.Model):
+    """
+    Reservation of a driver for a ride offer
+    The unique constraint on driver makes reserving atomic across concurrent
+    matchers: a driver can only hold one reservation at a time.
+    """
+    driver = models.IntegerField(unique=True)  # driver_id from auth-service
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='reservations')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Driver {self.driver} reserved for Ride {self.ride_id}"
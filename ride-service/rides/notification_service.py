@@ -50,6 +50,58 @@ class NotificationService:
             message=f'New ride available from {ride.origin} to {ride.destination}. Do you want to accept?'
         )
     
+    @staticmethod
+    def notify_rides_offered(rides):
+        """
+        Notify drivers about many ride offers with a single INSERT
+        """
+        notifications = [
+            Notification(
+                user_id=ride.driver,
+                ride=ride,
+                notification_type='ride_offered',
+                title='New Ride Offer',
+                message=f'New ride available from {ride.origin} to {ride.destination}. Do you want to accept?'
+            )
+            for ride in rides
+            if ride.driver
+        ]
+        return Notification.objects.bulk_create(notifications)
+    
+    @staticmethod
+    def notify_ride_broadcast(ride, driver_ids):
+        """
+        Notify every driver a ride is broadcast to with a single INSERT
+        """
+        notifications = [
+            Notification(
+                user_id=driver_id,
+                ride=ride,
+                notification_type='ride_offered',
+                title='New Ride Offer',
+                message=f'New ride available from {ride.origin} to {ride.destination}. First driver to accept gets it!'
+            )
+            for driver_id in driver_ids
+        ]
+        return Notification.objects.bulk_create(notifications)
+    
+    @staticmethod
+    def notify_offers_withdrawn(ride, driver_ids):
+        """
+        Tell the drivers who lost a broadcast ride that it is no longer available
+        """
+        notifications = [
+            Notification(
+                user_id=driver_id,
+                ride=ride,
+                notification_type='ride_cancelled',
+                title='Ride Offer Withdrawn',
+                message=f'The ride from {ride.origin} to {ride.destination} was taken by another driver.'
+            )
+            for driver_id in driver_ids
+        ]
+        return Notification.objects.bulk_create(notifications)
+    
     @staticmethod
     def notify_ride_accepted(ride):
         """
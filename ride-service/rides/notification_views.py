@@ -23,7 +23,8 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         if not user_id:
             return Notification.objects.none()
         
-        return Notification.objects.filter(user_id=user_id)
+        # ride_details: the ride of every notification in the same query
+        return Notification.objects.filter(user_id=user_id).select_related('ride')
 
     def list(self, request, *args, **kwargs):
         """
@@ -38,11 +39,13 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             is_read_bool = is_read.lower() == 'true'
             queryset = queryset.filter(is_read=is_read_bool)
         
-        serializer = self.get_serializer(queryset, many=True)
+        # One query: counts come from the fetched rows
+        notifications = list(queryset)
+        serializer = self.get_serializer(notifications, many=True)
         
         return Response({
-            "count": queryset.count(),
-            "unread_count": queryset.filter(is_read=False).count(),
+            "count": len(notifications),
+            "unread_count": sum(not notification.is_read for notification in notifications),
             "notifications": serializer.data
         })
 
@@ -90,17 +93,12 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         GET /api/notifications/unread/
         Get only unread notifications
         """
-        user_id = getattr(request, 'user_id', None)
-        
-        notifications = Notification.objects.filter(
-            user_id=user_id,
-            is_read=False
-        )
+        notifications = list(self.get_queryset().filter(is_read=False))
         
         serializer = self.get_serializer(notifications, many=True)
         
         return Response({
-            "count": notifications.count(),
+            "count": len(notifications),
             "notifications": serializer.data
         })
 
@@ -111,8 +109,6 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         Real-time polling endpoint for new notifications
         Returns notifications created after 'since' timestamp
         """
-        user_id = getattr(request, 'user_id', None)
-        
         # Get 'since' parameter (ISO format timestamp)
         since = request.query_params.get('since', None)
         
@@ -129,15 +125,14 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             since_time = timezone.now() - timedelta(minutes=5)
         
         # Get new notifications
-        new_notifications = Notification.objects.filter(
-            user_id=user_id,
+        new_notifications = list(self.get_queryset().filter(
             created_at__gt=since_time
-        ).order_by('-created_at')
+        ).order_by('-created_at'))
         
         serializer = self.get_serializer(new_notifications, many=True)
         
         return Response({
-            "count": new_notifications.count(),
+            "count": len(new_notifications),
             "notifications": serializer.data,
             "timestamp": timezone.now().isoformat()
         })
\ No newline at end of file
@@ -0,0 +1,495 @@
+"""
+Atomic driver reservation
+A driver is reserved for one ride at a time; the reservation is taken when
+the ride is offered and released on reject, cancel, completion or timeout.
+
+Broadcast offers reserve K drivers for the same ride (Ride.driver stays
+empty); the first driver to accept wins and the other offers are withdrawn.
+
+Pooled offers give several rides (Ride.pool_id = id of the first one) to
+one driver. The driver still holds a single reservation, moved to another
+ride of the pool when the ride it points to is completed or cancelled.
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, When, Value, IntegerField, Q, Exists, OuterRef
+from django.utils import timezone
+
+from .models import Ride, DriverReservation
+
+logger = logging.getLogger(__name__)
+
+RESERVE_OK = "reserved"
+RESERVE_DRIVER_BUSY = "driver_busy"
+RESERVE_RIDE_UNAVAILABLE = "ride_unavailable"
+RESERVE_RIDE_NOT_FOUND = "not_found"
+
+# Ride states during which a reservation holds the driver
+ACTIVE_STATUSES = (Ride.STATUS_OFFERED, Ride.STATUS_ACCEPTED)
+# Ride states a passenger or driver can still cancel
+CANCELLABLE_STATUSES = (Ride.STATUS_REQUESTED, Ride.STATUS_OFFERED, Ride.STATUS_ACCEPTED)
+
+
+class _RideUnavailable(Exception):
+    pass
+
+
+def _drop_stale_reservations(driver_ids):
+    """Drop reservations left behind by rides that are no longer active (call inside the transaction)"""
+    DriverReservation.objects.filter(driver__in=driver_ids).exclude(
+        ride__status__in=ACTIVE_STATUSES
+    ).delete()
+
+
+def reserve_driver(ride_id, driver_id):
+    """
+    Reserve a driver and offer the ride to them in one transaction
+
+    The reservation insert fails if the driver already holds one, and the
+    ride is only moved to 'offered' if it is still 'requested' (conditional
+    UPDATE) - no read-then-save race between matchers.
+
+    Returns:
+        str: RESERVE_OK, RESERVE_DRIVER_BUSY or RESERVE_RIDE_UNAVAILABLE
+    """
+    try:
+        with transaction.atomic():
+            _drop_stale_reservations([driver_id])
+            DriverReservation.objects.create(driver=driver_id, ride_id=ride_id)
+
+            updated = Ride.objects.filter(
+                pk=ride_id,
+                status=Ride.STATUS_REQUESTED
+            ).update(
+                driver=driver_id,
+                status=Ride.STATUS_OFFERED,
+                updated_at=timezone.now(),
+                offered_at=timezone.now()
+            )
+            if not updated:
+                raise _RideUnavailable()
+
+    except IntegrityError:
+        logger.info(f"Driver {driver_id} already reserved, cannot take ride {ride_id}")
+        return RESERVE_DRIVER_BUSY
+    except _RideUnavailable:
+        logger.info(f"Ride {ride_id} no longer requested, reservation of driver {driver_id} rolled back")
+        return RESERVE_RIDE_UNAVAILABLE
+
+    return RESERVE_OK
+
+
+def reserve_drivers(assignments):
+    """
+    Bulk version of reserve_driver, applied in a single transaction
+
+    Statements do not grow with the batch size: rides are locked with one
+    SELECT, reservations inserted with one bulk INSERT (conflicts ignored
+    and read back) and rides offered with one conditional UPDATE.
+
+    Args:
+        assignments: list of (ride_id, driver_id), at most one entry per
+                     ride and per driver
+
+    Returns:
+        dict: ride_id -> RESERVE_OK / RESERVE_DRIVER_BUSY /
+              RESERVE_RIDE_UNAVAILABLE / RESERVE_RIDE_NOT_FOUND
+    """
+    ride_ids = [ride_id for ride_id, _ in assignments]
+    driver_ids = [driver_id for _, driver_id in assignments]
+
+    with transaction.atomic():
+        _drop_stale_reservations(driver_ids)
+        statuses = dict(
+            Ride.objects.select_for_update()
+            .filter(pk__in=ride_ids)
+            .values_list("id", "status")
+        )
+        requested = [
+            (ride_id, driver_id) for ride_id, driver_id in assignments
+            if statuses.get(ride_id) == Ride.STATUS_REQUESTED
+        ]
+
+        DriverReservation.objects.bulk_create(
+            [DriverReservation(driver=driver_id, ride_id=ride_id) for ride_id, driver_id in requested],
+            ignore_conflicts=True
+        )
+        owned = set(
+            DriverReservation.objects.filter(
+                driver__in=[driver_id for _, driver_id in requested],
+                ride_id__in=[ride_id for ride_id, _ in requested]
+            ).values_list("ride_id", "driver")
+        )
+        reserved = [pair for pair in requested if pair in owned]
+
+        if reserved:
+            Ride.objects.filter(
+                pk__in=[ride_id for ride_id, _ in reserved],
+                status=Ride.STATUS_REQUESTED
+            ).update(
+                driver=Case(
+                    *[When(pk=ride_id, then=Value(driver_id)) for ride_id, driver_id in reserved],
+                    output_field=IntegerField()
+                ),
+                status=Ride.STATUS_OFFERED,
+                updated_at=timezone.now(),
+                offered_at=timezone.now()
+            )
+
+    outcomes = {}
+    for ride_id, driver_id in assignments:
+        if ride_id not in statuses:
+            outcomes[ride_id] = RESERVE_RIDE_NOT_FOUND
+        elif statuses[ride_id] != Ride.STATUS_REQUESTED:
+            outcomes[ride_id] = RESERVE_RIDE_UNAVAILABLE
+        elif (ride_id, driver_id) not in owned:
+            outcomes[ride_id] = RESERVE_DRIVER_BUSY
+        else:
+            outcomes[ride_id] = RESERVE_OK
+    return outcomes
+
+
+def release_reservation(ride_id, driver_id=None):
+    """
+    Release the reservations held for a ride (optionally for one driver only)
+
+    Returns:
+        int: Number of reservations released
+    """
+    reservations = DriverReservation.objects.filter(ride_id=ride_id)
+    if driver_id is not None:
+        reservations = reservations.filter(driver=driver_id)
+
+    released, _ = reservations.delete()
+    return released
+
+
+def release_finished_ride(ride):
+    """
+    Release the driver of a ride that no longer holds them (completed,
+    cancelled...). A pooled vehicle stays reserved while another ride of
+    the pool is active: the reservation moves to that ride.
+
+    Returns:
+        int: Number of reservations released
+    """
+    if ride.pool_id is not None:
+        remaining = (
+            Ride.objects.filter(pool_id=ride.pool_id, status__in=ACTIVE_STATUSES)
+            .exclude(pk=ride.pk)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if remaining is not None:
+            DriverReservation.objects.filter(ride_id=ride.pk).update(ride_id=remaining)
+            return 0
+
+    return release_reservation(ride.pk)
+
+
+def release_expired_offer(ride_id, driver_ids):
+    """
+    Withdraw an offer the driver(s) did not answer in time
+
+    The ride goes back to 'requested' only if it is still offered to one of
+    those drivers (directly, or by broadcast), then the reservations of the
+    ride are released. A broadcast left without any reservation (every
+    driver declined, but the ride was not rematched) is withdrawn too. A
+    pooled offer is withdrawn for every ride of the pool still offered to
+    the driver.
+
+    Returns:
+        list: ids of the rides back to 'requested' (empty if none)
+    """
+    # Subqueries rather than a join: no duplicate rows, and the row lock only
+    # applies to the ride
+    reservations = DriverReservation.objects.filter(ride_id=OuterRef("pk"))
+    offered_to = Q(driver__in=driver_ids) | Q(driver__isnull=True) & (
+        Exists(reservations.filter(driver__in=driver_ids)) | ~Exists(reservations)
+    )
+
+    with transaction.atomic():
+        pool_id = Ride.objects.filter(pk=ride_id).values_list("pool_id", flat=True).first()
+        rides = Ride.objects.filter(pool_id=pool_id) if pool_id is not None else Ride.objects.filter(pk=ride_id)
+        ride_ids = list(
+            rides.select_for_update()
+            .filter(offered_to, status=Ride.STATUS_OFFERED)
+            .values_list("id", flat=True)
+        )
+        if ride_ids:
+            Ride.objects.filter(pk__in=ride_ids).update(
+                driver=None,
+                status=Ride.STATUS_REQUESTED,
+                pool_id=None,
+                updated_at=timezone.now()
+            )
+            DriverReservation.objects.filter(ride_id__in=ride_ids).delete()
+
+    return ride_ids
+
+
+def broadcast_offer(ride_id, driver_ids):
+    """
+    Offer a requested ride to several drivers at once
+
+    Free drivers are reserved with one bulk INSERT (busy ones skipped) and
+    the ride moves requested -> offered with Ride.driver left empty.
+
+    Returns:
+        tuple: (RESERVE_OK / RESERVE_DRIVER_BUSY / RESERVE_RIDE_UNAVAILABLE,
+                list of drivers the ride is offered to)
+    """
+    try:
+        with transaction.atomic():
+            _drop_stale_reservations(driver_ids)
+            DriverReservation.objects.bulk_create(
+                [DriverReservation(driver=driver_id, ride_id=ride_id) for driver_id in driver_ids],
+                ignore_conflicts=True
+            )
+            offered = list(
+                DriverReservation.objects.filter(ride_id=ride_id, driver__in=driver_ids)
+                .values_list("driver", flat=True)
+            )
+            if not offered:
+                return RESERVE_DRIVER_BUSY, []
+
+            updated = Ride.objects.filter(
+                pk=ride_id,
+                status=Ride.STATUS_REQUESTED
+            ).update(
+                driver=None,
+                status=Ride.STATUS_OFFERED,
+                updated_at=timezone.now(),
+                offered_at=timezone.now()
+            )
+            if not updated:
+                raise _RideUnavailable()
+
+    except _RideUnavailable:
+        return RESERVE_RIDE_UNAVAILABLE, []
+
+    return RESERVE_OK, offered
+
+
+def holds_offer(ride, driver_id):
+    """True if the ride is currently offered to this driver"""
+    if ride.status != Ride.STATUS_OFFERED:
+        return False
+    if ride.driver is not None:
+        return ride.driver == driver_id
+    return ride.reservations.filter(driver=driver_id).exists()
+
+
+def accept_offer(ride_id, driver_id):
+    """
+    First-writer-wins acceptance
+
+    Only one conditional UPDATE can move the ride offered -> accepted; the
+    winner keeps its reservation and every other offer is withdrawn.
+
+    Returns:
+        tuple: (accepted, list of drivers whose offer was withdrawn)
+    """
+    with transaction.atomic():
+        updated = Ride.objects.filter(
+            Q(driver=driver_id) | Q(driver__isnull=True, reservations__driver=driver_id),
+            pk=ride_id,
+            status=Ride.STATUS_OFFERED
+        ).update(
+            driver=driver_id,
+            status=Ride.STATUS_ACCEPTED,
+            updated_at=timezone.now(),
+            accepted_at=timezone.now()
+        )
+        if not updated:
+            return False, []
+
+        losers = DriverReservation.objects.filter(ride_id=ride_id).exclude(driver=driver_id)
+        withdrawn = list(losers.values_list("driver", flat=True))
+        losers.delete()
+
+    return True, withdrawn
+
+
+def reject_offer(ride_id, driver_id):
+    """
+    A driver rejects the offer made to them alone
+
+    The ride goes back to 'requested' only if it is still offered to that
+    driver (conditional UPDATE: an accept or a cancel that won the race is
+    kept), and the reservation is released in the same transaction.
+
+    Returns:
+        bool: True if the ride went back to 'requested'
+    """
+    with transaction.atomic():
+        updated = Ride.objects.filter(
+            pk=ride_id,
+            driver=driver_id,
+            status=Ride.STATUS_OFFERED
+        ).update(
+            driver=None,
+            status=Ride.STATUS_REQUESTED,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            return False
+
+        release_reservation(ride_id, driver_id)
+
+    return True
+
+
+def cancel_ride(ride):
+    """
+    Cancel the ride in the state the caller read it
+
+    Conditional UPDATE on that status and driver: an accept (or any other
+    change) that won the race is kept, never overwritten with 'cancelled'.
+    The driver is released in the same transaction.
+
+    Returns:
+        bool: True if the ride was cancelled
+    """
+    if ride.status not in CANCELLABLE_STATUSES:
+        return False
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Ride.objects.filter(
+            pk=ride.pk,
+            status=ride.status,
+            driver=ride.driver
+        ).update(
+            status=Ride.STATUS_CANCELLED,
+            updated_at=now,
+            cancelled_at=now
+        )
+        if not updated:
+            return False
+
+        release_finished_ride(ride)
+
+    return True
+
+
+def decline_offer(ride_id, driver_id):
+    """
+    A driver declines a broadcast offer
+
+    Releases the driver; when nobody else still holds the offer the ride goes
+    back to 'requested' (conditional UPDATE) for rematching. The ride row is
+    locked first, so concurrent declines of one broadcast run one after the
+    other and the last one sees no reservation left.
+
+    Returns:
+        bool: True if the ride went back to 'requested'
+    """
+    with transaction.atomic():
+        locked = Ride.objects.select_for_update().filter(pk=ride_id).values_list("id", flat=True)
+        if not list(locked):
+            return False
+        release_reservation(ride_id, driver_id)
+
+        if DriverReservation.objects.filter(ride_id=ride_id).exists():
+            return False
+
+        updated = Ride.objects.filter(
+            pk=ride_id,
+            status=Ride.STATUS_OFFERED,
+            driver__isnull=True
+        ).update(
+            status=Ride.STATUS_REQUESTED,
+            updated_at=timezone.now()
+        )
+
+    return bool(updated)
+
+
+def offer_pool(ride_ids, driver_id):
+    """
+    Offer several pooled rides to one driver in one transaction
+
+    The driver gets a single reservation (on the first ride) and every ride
+    moves requested -> offered with pool_id = first ride id, or none does
+    (conditional UPDATE must touch every ride).
+
+    Returns:
+        str: RESERVE_OK, RESERVE_DRIVER_BUSY or RESERVE_RIDE_UNAVAILABLE
+    """
+    try:
+        with transaction.atomic():
+            _drop_stale_reservations([driver_id])
+            DriverReservation.objects.create(driver=driver_id, ride_id=ride_ids[0])
+
+            updated = Ride.objects.filter(
+                pk__in=ride_ids,
+                pool=True,
+                status=Ride.STATUS_REQUESTED
+            ).update(
+                driver=driver_id,
+                status=Ride.STATUS_OFFERED,
+                pool_id=ride_ids[0],
+                updated_at=timezone.now(),
+                offered_at=timezone.now()
+            )
+            if updated != len(ride_ids):
+                raise _RideUnavailable()
+
+    except IntegrityError:
+        logger.info(f"Driver {driver_id} already reserved, cannot take pool {ride_ids}")
+        return RESERVE_DRIVER_BUSY
+    except _RideUnavailable:
+        logger.info(f"Pool {ride_ids} no longer requested, reservation of driver {driver_id} rolled back")
+        return RESERVE_RIDE_UNAVAILABLE
+
+    return RESERVE_OK
+
+
+def accept_pool_offer(pool_id, driver_id):
+    """
+    The driver accepts a pooled offer: every ride of the pool still offered
+    to them is accepted at once
+
+    Returns:
+        list: ids of the accepted rides (empty if the offer was not theirs)
+    """
+    with transaction.atomic():
+        ride_ids = list(
+            Ride.objects.select_for_update()
+            .filter(pool_id=pool_id, driver=driver_id, status=Ride.STATUS_OFFERED)
+            .values_list("id", flat=True)
+        )
+        Ride.objects.filter(pk__in=ride_ids).update(
+            status=Ride.STATUS_ACCEPTED,
+            updated_at=timezone.now(),
+            accepted_at=timezone.now()
+        )
+
+    return ride_ids
+
+
+def decline_pool_offer(pool_id, driver_id):
+    """
+    The driver declines a pooled offer: every ride of the pool still offered
+    to them goes back to 'requested' (unpooled) and the driver is released
+
+    Returns:
+        list: ids of the rides back to 'requested'
+    """
+    with transaction.atomic():
+        ride_ids = list(
+            Ride.objects.select_for_update()
+            .filter(pool_id=pool_id, driver=driver_id, status=Ride.STATUS_OFFERED)
+            .values_list("id", flat=True)
+        )
+        Ride.objects.filter(pk__in=ride_ids).update(
+            driver=None,
+            status=Ride.STATUS_REQUESTED,
+            pool_id=None,
+            updated_at=timezone.now()
+        )
+        DriverReservation.objects.filter(driver=driver_id, ride_id__in=ride_ids).delete()
+
+    return ride_ids
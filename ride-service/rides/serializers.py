@@ -8,7 +8,8 @@ class RideSerializer(serializers.ModelSerializer):
     Important: passenger, driver, status, and price are set by the backend,
     not by user input, so they should be read_only.
     
-    Only origin and destination are writable by the user.
+    Only origin, destination (with optional coordinates) and the pool
+    opt-in are writable by the user.
     """
     
     class Meta:
@@ -19,6 +20,12 @@ class RideSerializer(serializers.ModelSerializer):
             "driver",
             "origin",
             "destination",
+            "origin_lat",
+            "origin_lng",
+            "dest_lat",
+            "dest_lng",
+            "pool",
+            "pool_id",
             "status",
             "price",
             "created_at",
@@ -30,6 +37,7 @@ class RideSerializer(serializers.ModelSerializer):
             "driver",         # Set when ride is offered/accepted
             "status",         # Managed by state transitions
             "price",          # Calculated on completion
+            "pool_id",        # Set when the matcher pools the ride
             "created_at",
             "updated_at"
         )
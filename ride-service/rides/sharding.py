@@ -0,0 +1,84 @@
+"""
+Region sharding for ride.requested
+Routes each ride to a matcher shard by pickup region using consistent hashing.
+
+The matcher worker ships an identical ring (matcher-worker/sharding.py):
+both sides must agree on RIDE_REQUEST_SHARDS for rides to reach their owner.
+"""
+import os
+import bisect
+import hashlib
+
+RIDE_REQUEST_SHARDS = int(os.getenv("RIDE_REQUEST_SHARDS", "1"))
+RIDE_REQUESTED_QUEUE = "ride.requested"
+# Lane served first by the matcher: rematches (reject / offer timeout) and retries
+PRIORITY_LANE_SUFFIX = "priority"
+DEFAULT_REGION = "default"
+
+# Virtual nodes per shard - smooths the distribution of regions
+VIRTUAL_NODES = 64
+
+
+def pickup_region(origin: str) -> str:
+    """
+    Derive the pickup region from an origin address
+
+    The last comma-separated part is the neighbourhood/district:
+        "123 Main Street, Downtown" -> "downtown"
+    """
+    if not origin:
+        return DEFAULT_REGION
+
+    region = origin.rsplit(",", 1)[-1] if "," in origin else ""
+    region = " ".join(region.lower().split())
+    return region or DEFAULT_REGION
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping regions to shard numbers
+    Adding a shard only moves ~1/N of the regions.
+    """
+
+    def __init__(self, shards: int, virtual_nodes: int = VIRTUAL_NODES):
+        self.shards = max(1, shards)
+        points = sorted(
+            (_hash(f"shard-{shard}#{vnode}"), shard)
+            for shard in range(self.shards)
+            for vnode in range(virtual_nodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, region: str) -> int:
+        if self.shards == 1:
+            return 0
+        index = bisect.bisect(self._keys, _hash(region)) % len(self._keys)
+        return self._shards[index]
+
+
+_ring = HashRing(RIDE_REQUEST_SHARDS)
+
+
+def shard_for_region(region: str) -> int:
+    """Return the shard number owning a region"""
+    return _ring.shard_for(region)
+
+
+def ride_requested_queue(region: str, rematch: bool = False) -> str:
+    """
+    Queue name for a ride.requested message
+
+    With a single shard the legacy 'ride.requested' queue is kept,
+    otherwise rides go to 'ride.requested.<shard>'.
+    Rematches go to the priority lane of that queue ('<queue>.priority').
+    """
+    if RIDE_REQUEST_SHARDS <= 1:
+        queue = RIDE_REQUESTED_QUEUE
+    else:
+        queue = f"{RIDE_REQUESTED_QUEUE}.{shard_for_region(region)}"
+    return f"{queue}.{PRIORITY_LANE_SUFFIX}" if rematch else queue
@@ -0,0 +1,179 @@
+"""
+Ride assignment races: first-accept-wins, broadcast declines, bulk assignment
+
+    python manage.py test rides
+
+RabbitMQ is the in-process broker and bearer tokens "<role>:<id>" are
+accepted as is (no Auth-Service).
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from ride_service import auth_middleware
+from rides import rabbitmq
+from rides.models import DriverReservation, Ride
+from rides.reservations import cancel_ride, reserve_driver
+
+PASSENGER = 1
+
+
+class TokenUser:
+    """Auth-Service stand-in: token "<role>:<id>" is that user"""
+
+    exceptions = auth_middleware.requests.exceptions
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        role, _, user_id = json["token"].partition(":")
+        return VerifiedUser({"id": int(user_id), "email": f"{role}{user_id}@taxi.com", "role": role})
+
+
+class VerifiedUser:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class RideAssignmentTests(TestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(auth_middleware, "requests", TokenUser()),
+            mock.patch.object(rabbitmq, "RABBITMQ_URL", "memory://tests"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_ride(self):
+        return Ride.objects.create(passenger=PASSENGER, origin="Main St", destination="Oak Ave")
+
+    def post(self, path, data=None, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        return self.client.post(path, data or {}, content_type="application/json", **headers)
+
+    def driver_action(self, ride, action, driver_id):
+        return self.post(f"/api/rides/{ride.id}/{action}/", token=f"chauffeur:{driver_id}")
+
+    def broadcast(self, ride, driver_ids):
+        response = self.post(f"/api/internal/rides/{ride.id}/broadcast-offer/", {"driver_ids": driver_ids})
+        self.assertEqual(response.status_code, 200)
+
+    def reserved_drivers(self, ride):
+        return set(DriverReservation.objects.filter(ride=ride).values_list("driver", flat=True))
+
+    # First accept wins
+
+    def test_second_accept_of_a_broadcast_gets_409(self):
+        ride = self.create_ride()
+        self.broadcast(ride, [101, 102])
+
+        self.assertEqual(self.driver_action(ride, "accept", 101).status_code, 200)
+        self.assertEqual(self.driver_action(ride, "accept", 102).status_code, 409)
+
+        ride.refresh_from_db()
+        self.assertEqual((ride.status, ride.driver), (Ride.STATUS_ACCEPTED, 101))
+        self.assertEqual(self.reserved_drivers(ride), {101})
+
+    def test_accept_of_a_ride_offered_to_another_driver_gets_409(self):
+        ride = self.create_ride()
+        reserve_driver(ride.id, 101)
+
+        self.assertEqual(self.driver_action(ride, "accept", 101).status_code, 200)
+        self.assertEqual(self.driver_action(ride, "accept", 102).status_code, 409)
+
+    # Broadcast declines
+
+    def test_declining_a_broadcast_leaves_the_other_offers_live(self):
+        ride = self.create_ride()
+        self.broadcast(ride, [101, 102, 103])
+
+        response = self.driver_action(ride, "reject", 101)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["detail"], "Ride offer declined")
+        ride.refresh_from_db()
+        self.assertEqual((ride.status, ride.driver), (Ride.STATUS_OFFERED, None))
+        self.assertEqual(self.reserved_drivers(ride), {102, 103})
+
+        self.assertEqual(self.driver_action(ride, "accept", 102).status_code, 200)
+
+    def test_last_decline_of_a_broadcast_requeues_the_ride(self):
+        ride = self.create_ride()
+        self.broadcast(ride, [101, 102])
+
+        self.driver_action(ride, "reject", 101)
+        response = self.driver_action(ride, "reject", 102)
+
+        self.assertEqual(response.status_code, 200)
+        ride.refresh_from_db()
+        self.assertEqual(ride.status, Ride.STATUS_REQUESTED)
+        self.assertEqual(self.reserved_drivers(ride), set())
+
+    # Cancel
+
+    def test_cancel_does_not_overwrite_a_concurrent_accept(self):
+        ride = self.create_ride()
+        reserve_driver(ride.id, 101)
+        read_before_accept = Ride.objects.get(pk=ride.id)
+        self.driver_action(ride, "accept", 101)
+
+        self.assertFalse(cancel_ride(read_before_accept))
+        ride.refresh_from_db()
+        self.assertEqual((ride.status, ride.driver), (Ride.STATUS_ACCEPTED, 101))
+
+    def test_cancel_of_a_finished_ride_gets_409(self):
+        ride = self.create_ride()
+        token = f"passager:{PASSENGER}"
+
+        self.assertEqual(self.post(f"/api/rides/{ride.id}/cancel/", token=token).status_code, 200)
+        self.assertEqual(self.post(f"/api/rides/{ride.id}/cancel/", token=token).status_code, 409)
+
+    # Bulk assignment
+
+    def test_bulk_assign_reports_every_outcome(self):
+        first, second = self.create_ride(), self.create_ride()
+        missing = second.id + 1000
+
+        response = self.post("/api/internal/rides/assign-drivers/", {"assignments": [
+            {"ride_id": first.id, "driver_id": 101},
+            {"ride_id": first.id, "driver_id": 102},
+            {"ride_id": second.id, "driver_id": 101},
+            {"ride_id": missing, "driver_id": 103},
+            {"ride_id": "x", "driver_id": 104},
+        ]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["assigned"], 1)
+        self.assertEqual(
+            [result["outcome"] for result in response.json()["results"]],
+            ["assigned", "duplicate", "duplicate", "not_found", "invalid"],
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.driver), (Ride.STATUS_OFFERED, 101))
+        self.assertEqual(second.status, Ride.STATUS_REQUESTED)
+
+    def test_bulk_assign_reports_a_busy_driver(self):
+        taken, other = self.create_ride(), self.create_ride()
+        reserve_driver(taken.id, 101)
+
+        response = self.post("/api/internal/rides/assign-drivers/", {"assignments": [
+            {"ride_id": other.id, "driver_id": 101},
+        ]})
+
+        self.assertEqual(response.json()["results"][0]["outcome"], "driver_busy")
+
+    # Request validation
+
+    def test_assign_driver_rejects_a_non_integer_driver_id(self):
+        ride = self.create_ride()
+        response = self.post(f"/api/internal/rides/{ride.id}/assign-driver/", {"driver_id": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_release_driver_rejects_driver_ids_that_are_not_a_list(self):
+        ride = self.create_ride()
+        response = self.post(f"/api/internal/rides/{ride.id}/release-driver/", {"driver_ids": "12"})
+        self.assertEqual(response.status_code, 400)
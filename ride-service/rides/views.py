@@ -5,13 +5,27 @@ from rest_framework.decorators import action
 
 from django.shortcuts import get_object_or_404
 
-from .models import Ride , Notification
+from .models import Ride
 from .serializers import RideSerializer, NotificationSerializer
 from .rabbitmq import publish_message
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 from .notification_service import NotificationService
+from django.db.models import Q
+from .reservations import (
+    RESERVE_OK,
+    RESERVE_DRIVER_BUSY,
+    reserve_driver,
+    release_finished_ride,
+    holds_offer,
+    accept_offer,
+    reject_offer,
+    cancel_ride,
+    decline_offer,
+    accept_pool_offer,
+    decline_pool_offer,
+)
 import logging
 from .rabbitmq import (
     publish_ride_requested,
@@ -21,6 +35,23 @@ from .rabbitmq import (
 )
 
 AUTH_VERIFY_URL = settings.AUTH_VERIFY_URL
+
+
+def parse_coordinates(lat, lng):
+    """
+    (lat, lng) as floats, or (None, None) if both are missing
+    Raises ValueError if only one is given or they are out of range
+    """
+    if (lat is None) != (lng is None):
+        raise ValueError("lat and lng go together")
+    if lat is None:
+        return None, None
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("coordinates out of range")
+    return lat, lng
+
+
 def get_user_from_token(request):
 
     token = request.headers.get("Authorization", "").replace("Bearer ", "")
@@ -54,7 +85,11 @@ class RideViewSet(viewsets.ModelViewSet):
         if user_role in ["passager", "passenger"]:
             return Ride.objects.filter(passenger=user_id)
         elif user_role in ["chauffeur", "driver"]:
-            return Ride.objects.filter(driver=user_id)
+            # Own rides + rides currently broadcast to this driver
+            return Ride.objects.filter(
+                Q(driver=user_id) |
+                Q(status=Ride.STATUS_OFFERED, reservations__driver=user_id)
+            ).distinct()
         
         return Ride.objects.none()
 
@@ -95,12 +130,45 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Optional pickup / drop-off coordinates (both or none)
+        try:
+            origin_lat, origin_lng = parse_coordinates(
+                request.data.get('origin_lat'), request.data.get('origin_lng')
+            )
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "origin_lat and origin_lng must both be valid coordinates"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            dest_lat, dest_lng = parse_coordinates(
+                request.data.get('dest_lat'), request.data.get('dest_lng')
+            )
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "dest_lat and dest_lng must both be valid coordinates"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Opt-in ride sharing: the matcher needs both points to pool rides
+        pool = str(request.data.get('pool', False)).lower() in ("true", "1")
+        if pool and (origin_lat is None or dest_lat is None):
+            return Response(
+                {"detail": "Pooled rides need origin and destination coordinates"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
             # 1. Create ride in database
             ride = Ride.objects.create(
                 passenger=user_id,
                 origin=origin,
                 destination=destination,
+                origin_lat=origin_lat,
+                origin_lng=origin_lng,
+                dest_lat=dest_lat,
+                dest_lng=dest_lng,
+                pool=pool,
                 status=Ride.STATUS_REQUESTED
             )
             
@@ -115,7 +183,11 @@ class RideViewSet(viewsets.ModelViewSet):
                 ride_id=ride.id,
                 passenger_id=user_id,
                 origin=origin,
-                destination=destination
+                destination=destination,
+                version=ride.version,
+                pickup=ride.pickup,
+                pool=ride.pool,
+                dropoff=ride.dropoff
             )
             
             if publish_success:
@@ -156,10 +228,22 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update ride
-        ride.driver = driver_id
-        ride.status = Ride.STATUS_OFFERED
-        ride.save()
+        # Reserve driver + update ride atomically
+        outcome = reserve_driver(ride.id, driver_id)
+        
+        if outcome == RESERVE_DRIVER_BUSY:
+            return Response(
+                {"detail": f"Driver {driver_id} is already reserved"},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        if outcome != RESERVE_OK:
+            return Response(
+                {"detail": "Ride not available for offer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ride.refresh_from_db()
         
         # Notify driver
         NotificationService.notify_ride_offered(ride)
@@ -173,6 +257,9 @@ class RideViewSet(viewsets.ModelViewSet):
         """
         Driver accepts the ride offer
          NOW WITH RABBITMQ INTEGRATION
+        
+        First writer wins: with a broadcast offer only one driver gets the
+        ride, the others get 409 and their offers are withdrawn.
         """
         user_id = getattr(request, 'user_id', None)
         user_role = getattr(request, 'user_role', None)
@@ -185,21 +272,38 @@ class RideViewSet(viewsets.ModelViewSet):
 
         ride = get_object_or_404(Ride, pk=pk)
 
+        if ride.status == Ride.STATUS_ACCEPTED and ride.driver != user_id:
+            return Response(
+                {"detail": "Ride was already accepted by another driver"},
+                status=status.HTTP_409_CONFLICT
+            )
+
         if ride.status != Ride.STATUS_OFFERED:
             return Response(
                 {"detail": "Ride is not in offered state"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if ride.driver != user_id:
+        if ride.pool_id is not None:
+            return self._accept_pool(ride, user_id)
+        
+        # Atomic offered -> accepted, withdraws the other broadcast offers
+        accepted, withdrawn = accept_offer(ride.id, user_id)
+        ride.refresh_from_db()
+
+        if not accepted:
+            if ride.status == Ride.STATUS_ACCEPTED:
+                return Response(
+                    {"detail": "Ride was already accepted by another driver"},
+                    status=status.HTTP_409_CONFLICT
+                )
             return Response(
                 {"detail": "This ride was not offered to you"},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Update ride
-        ride.status = Ride.STATUS_ACCEPTED
-        ride.save()
+        if withdrawn:
+            NotificationService.notify_offers_withdrawn(ride, withdrawn)
 
         # Notify passenger
         NotificationService.notify_ride_accepted(ride)
@@ -208,13 +312,36 @@ class RideViewSet(viewsets.ModelViewSet):
         publish_ride_accepted(
             ride_id=ride.id,
             driver_id=user_id,
-            passenger_id=ride.passenger
+            passenger_id=ride.passenger,
+            withdrawn=withdrawn
         )
         
         logger.info(f" Ride {ride.id} accepted by driver {user_id}")
 
         return Response(RideSerializer(ride).data)
 
+    def _accept_pool(self, ride, driver_id):
+        """Pooled offer: the driver takes every ride of the pool at once"""
+        accepted_ids = accept_pool_offer(ride.pool_id, driver_id)
+        if ride.id not in accepted_ids:
+            return Response(
+                {"detail": "This ride was not offered to you"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        for pooled in Ride.objects.filter(pk__in=accepted_ids):
+            NotificationService.notify_ride_accepted(pooled)
+            publish_ride_accepted(
+                ride_id=pooled.id,
+                driver_id=driver_id,
+                passenger_id=pooled.passenger
+            )
+
+        logger.info(f" Pool {ride.pool_id} (rides {accepted_ids}) accepted by driver {driver_id}")
+
+        ride.refresh_from_db()
+        return Response(RideSerializer(ride).data)
+
     @action(detail=True, methods=["post"])
     def reject(self, request, pk=None):
         """Driver rejects the ride offer"""
@@ -235,16 +362,33 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if ride.driver != user_id:
+        if not holds_offer(ride, user_id):
             return Response(
                 {"detail": "This ride was not offered to you"},
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Reset to requested (for re-matching)
-        ride.driver = None
-        ride.status = Ride.STATUS_REQUESTED
-        ride.save()
+        if ride.pool_id is not None:
+            return self._decline_pool(ride, user_id)
+
+        if ride.driver is None:
+            # Broadcast offer - only rematch once every driver declined
+            if not decline_offer(ride.id, user_id):
+                logger.info(f" Driver {user_id} declined broadcast ride {ride.id}")
+                return Response(
+                    {"detail": "Ride offer declined"},
+                    status=status.HTTP_200_OK
+                )
+            ride.refresh_from_db()
+        else:
+            # Reset to requested (for re-matching) and free the driver, unless
+            # an accept or a cancel changed the ride meanwhile
+            if not reject_offer(ride.id, user_id):
+                return Response(
+                    {"detail": "Ride offer is no longer pending"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            ride.refresh_from_db()
 
         # Notify passenger
         NotificationService.notify_ride_rejected(ride)
@@ -254,7 +398,12 @@ class RideViewSet(viewsets.ModelViewSet):
             ride_id=ride.id,
             passenger_id=ride.passenger,
             origin=ride.origin,
-            destination=ride.destination
+            destination=ride.destination,
+            version=ride.version,
+            excluded_drivers=[user_id],
+            pickup=ride.pickup,
+            pool=ride.pool,
+            dropoff=ride.dropoff
         )
         
         logger.info(f" Ride {ride.id} rejected, re-queued for matching")
@@ -264,6 +413,29 @@ class RideViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    def _decline_pool(self, ride, driver_id):
+        """Pooled offer: every ride of the pool is unpooled and re-queued"""
+        for pooled in Ride.objects.filter(pk__in=decline_pool_offer(ride.pool_id, driver_id)):
+            NotificationService.notify_ride_rejected(pooled)
+            publish_ride_requested(
+                ride_id=pooled.id,
+                passenger_id=pooled.passenger,
+                origin=pooled.origin,
+                destination=pooled.destination,
+                version=pooled.version,
+                excluded_drivers=[driver_id],
+                pickup=pooled.pickup,
+                pool=pooled.pool,
+                dropoff=pooled.dropoff
+            )
+
+        logger.info(f" Pool {ride.pool_id} rejected by driver {driver_id}, re-queued for matching")
+
+        return Response(
+            {"detail": "Ride rejected, searching for another driver"},
+            status=status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=["post"])
     def complete(self, request, pk=None):
         """
@@ -287,8 +459,9 @@ class RideViewSet(viewsets.ModelViewSet):
 
         # Calculate price
         ride.price = 10.00  # TODO: Dynamic pricing
-        ride.status = Ride.STATUS_COMPLETED
+        ride.set_status(Ride.STATUS_COMPLETED)
         ride.save()
+        release_finished_ride(ride)
 
         # Notify both parties
         NotificationService.notify_ride_completed(ride)
@@ -320,8 +493,17 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        ride.status = Ride.STATUS_CANCELLED
-        ride.save()
+        # Conditional update: a concurrent accept is kept, the cancel gets 409
+        if not cancel_ride(ride):
+            ride.refresh_from_db()
+            return Response(
+                {
+                    "detail": "Ride can no longer be cancelled",
+                    "current_status": ride.status
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        ride.refresh_from_db()
 
         # Notify the other party
         NotificationService.notify_ride_cancelled(ride, user_id)
@@ -331,7 +513,8 @@ class RideViewSet(viewsets.ModelViewSet):
         publish_ride_cancelled(
             ride_id=ride.id,
             cancelled_by=user_id,
-            reason=reason
+            reason=reason,
+            driver_id=ride.driver
         )
         
         logger.info(f" Ride {ride.id} cancelled by user {user_id}")
@@ -352,8 +535,8 @@ class RideViewSet(viewsets.ModelViewSet):
         
         # Get recent notifications (last 5 minutes)
         recent_time = timezone.now() - timedelta(minutes=5)
-        recent_notifications = Notification.objects.filter(
-            ride=ride,
+        # Through the related manager: notification.ride is this ride, no query each
+        recent_notifications = ride.notifications.filter(
             user_id=user_id,
             created_at__gte=recent_time
         )
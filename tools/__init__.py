@@ -0,0 +1,6 @@
+"""
+Dev-only helpers shared by the services and the matcher worker
+
+Imported as the `tools` package, with the repository root on sys.path (see
+common/__init__.py).
+"""
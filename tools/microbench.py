@@ -0,0 +1,165 @@
+"""
+Micro-benchmarks of hot code paths, with a stored baseline
+
+A Suite holds named cases. A case is a setup function receiving the
+command options and returning the zero-argument callable to time; setup
+and data creation are not timed. Every call is timed on its own (median and
+p99 in microseconds), with stdout and INFO logging silenced. A case stops
+after --runs calls or --max-seconds (at least MIN_RUNS calls).
+
+    --save FILE         write the results as the new baseline
+    --compare FILE      compare with a baseline, fail if a median grew by
+                        more than --threshold (0.20 = 20 %)
+
+Dev-only, one copy for the whole repository: ride-service and auth-service
+(python manage.py bench / query_budget) and the matcher worker
+(bench_hotpaths.py) put tools/ on sys.path and import it from here.
+"""
+import contextlib
+import json
+import logging
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+DEFAULT_RUNS = 1000
+DEFAULT_MAX_SECONDS = 3.0
+MIN_RUNS = 10
+DEFAULT_THRESHOLD = 0.20
+
+
+class Suite:
+    """Named benchmark cases of one service"""
+
+    def __init__(self):
+        self.cases = {}
+
+    def case(self, name):
+        def register(setup):
+            self.cases[name] = setup
+            return setup
+        return register
+
+    def run(self, options, write=print):
+        """Run the selected cases, returns {name: {median_us, p99_us, runs}}"""
+        only = options.get("only") or []
+        runs = options.get("runs") or DEFAULT_RUNS
+        max_seconds = options.get("max_seconds") or DEFAULT_MAX_SECONDS
+        results = {}
+        for name, setup in self.cases.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            with quiet():
+                results[name] = measure(setup(options), runs, max_seconds)
+            write(format_result(name, results[name]))
+        return results
+
+
+@contextlib.contextmanager
+def quiet():
+    """The timed code prints and logs per call: keep that out of the output"""
+    logging.disable(logging.INFO)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def measure(fn, runs, max_seconds=DEFAULT_MAX_SECONDS):
+    """Warm up on a tenth of the runs / time budget, then time each call"""
+    deadline = time.perf_counter() + max_seconds / 10
+    for _ in range(max(1, runs // 10)):
+        fn()
+        if time.perf_counter() > deadline:
+            break
+
+    timings = []
+    deadline = time.perf_counter() + max_seconds
+    while len(timings) < runs:
+        start = time.perf_counter()
+        fn()
+        end = time.perf_counter()
+        timings.append((end - start) * 1_000_000)
+        if end > deadline and len(timings) >= MIN_RUNS:
+            break
+    timings.sort()
+    return {
+        "median_us": timings[len(timings) // 2],
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "runs": len(timings),
+    }
+
+
+def format_result(name, result):
+    return (f"{name:<48} median {result['median_us']:>10.1f} us   p99 {result['p99_us']:>10.1f} us"
+            f"   ({result['runs']} runs)")
+
+
+# Baselines
+
+def save_baseline(path, results):
+    baseline = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """
+    Rows (name, baseline median, median, relative change, regressed) for
+    the cases of both; regressed when the median grew by more than threshold
+    """
+    rows = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        change = result["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+        rows.append((name, before["median_us"], result["median_us"], change, change > threshold))
+    return rows
+
+
+# Command line (argparse or a Django management command parser)
+
+def add_arguments(parser):
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Timed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS, help="Time budget per case")
+    parser.add_argument("--only", nargs="+", help="Case name prefixes to run")
+    parser.add_argument("--save", metavar="FILE", help="Write the results as the baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Baseline to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Median growth counted as a regression (0.20 = 20%%)")
+
+
+def execute(suite, options, write=print):
+    """Run, save and compare as the options say; returns the regressed case names"""
+    results = suite.run(options, write)
+
+    if options.get("save"):
+        save_baseline(options["save"], results)
+        write(f"\nBaseline written to {options['save']}")
+
+    regressions = []
+    if options.get("compare"):
+        baseline = load_baseline(options["compare"])
+        write(f"\nCompared with {options['compare']} ({baseline['meta']['created_at']}, "
+              f"threshold +{100 * options['threshold']:.0f}%)")
+        for name, before, after, change, regressed in compare(baseline, results, options["threshold"]):
+            flag = "REGRESSION" if regressed else ""
+            write(f"{name:<48} {before:>10.1f} -> {after:>10.1f} us  {100 * change:>+7.1f}%  {flag}")
+            if regressed:
+                regressions.append(name)
+    return regressions